@@ -2,51 +2,102 @@
 Модуль умной аналитики с поддержкой фильтров категорий
 """
 from datetime import datetime, timedelta
-from typing import Dict, List
-from database import Database
+from typing import TYPE_CHECKING, Dict, List, Optional
+from database import get_database
+from periods import Period
 
-db = Database()
+if TYPE_CHECKING:
+    from timeseries import SpendingHistory
 
+db = get_database()
 
-def apply_category_filters(user_id: int, expenses_by_category: Dict, 
-                          income_by_source: Dict = None) -> tuple:
+
+def get_filter_spec(user_id: int) -> Optional[Dict]:
+    """
+    Фильтры категорий для запросов статистики (только у Premium)
+
+    Загружается один раз на запрос вместе с AnalyticsSnapshot: фильтрация
+    идёт в SQL, а не по готовым словарям.
+    """
     try:
         from subscription import subscription_manager
         from category_filter import category_filter
-        if not subscription_manager.is_premium(user_id):
-            return expenses_by_category, income_by_source, False
-        filtered_expenses = category_filter.apply_filters(user_id, expenses_by_category, 'expense')
-        filtered_income = income_by_source
-        
-        if income_by_source:
-            filtered_income = category_filter.apply_filters(user_id, income_by_source, 'income')
-        filters_applied = (filtered_expenses != expenses_by_category) or \
-                         (income_by_source and filtered_income != income_by_source)
-        
-        return filtered_expenses, filtered_income, filters_applied
-        
     except ImportError:
-        return expenses_by_category, income_by_source, False
+        return None
+    if not subscription_manager.is_premium(user_id):
+        return None
+    return category_filter.get_all_filters(user_id)
+
+
+class AnalyticsSnapshot:
+    """
+    Все периоды, нужные аналитике, за один запрос к БД
 
+    week/month - последние 7 и 30 дней, previous_month - 30 дней до month;
+    каждый период в формате db.get_period_summary() (с фильтрами категорий
+    пользователя, итоги без фильтров в 'unfiltered'). Итоги за всё время -
+    в lifetime() из счётчиков db.get_user_totals(), без чтения всей истории.
+    Советы, инсайты, прогноз, сравнение и достижения считаются из одного
+    снимка; его можно передать в функции модуля через snapshot=, чтобы
+    обработчик, которому нужно несколько из них, читал БД один раз.
+    Операции по отдельности (необычные траты, прогноз) - в history().
+    """
+    
+    def __init__(self, user_id: int, filters: Optional[Dict] = None, now: datetime = None):
+        self.user_id = user_id
+        self.filters = filters
+        self.now = now or datetime.now()
+        month = Period.rolling(30, self.now)
+        summaries = db.get_window_summaries(user_id, {
+            'week': Period.rolling(7, self.now),
+            'month': month,
+            'previous_month': month.previous(self.now)
+        }, filters=filters)
+        self.week = summaries['week']
+        self.month = summaries['month']
+        self.previous_month = summaries['previous_month']
+        self._lifetime = None
+        self._history = None
+    
+    @classmethod
+    def load(cls, user_id: int, use_filters: bool = True) -> 'AnalyticsSnapshot':
+        """Снимок с фильтрами категорий пользователя (если use_filters и есть Premium)"""
+        return cls(user_id, get_filter_spec(user_id) if use_filters else None)
+    
+    def lifetime(self) -> Dict:
+        """Счётчики за всё время (db.get_user_totals, загружаются один раз на снимок)"""
+        if self._lifetime is None:
+            self._lifetime = db.get_user_totals(self.user_id)
+        return self._lifetime
+    
+    def history(self) -> 'SpendingHistory':
+        """Расходы за timeseries.HISTORY_DAYS массивами NumPy (загружаются один раз на снимок)"""
+        if self._history is None:
+            # NumPy импортируется при первой аналитике, а не при запуске бота
+            from timeseries import SpendingHistory
+            self._history = SpendingHistory.load(self.user_id, now=self.now)
+        return self._history
+    
+    def expense_mask(self):
+        """Строки history(), проходящие фильтры категорий снимка"""
+        return self.history().category_mask(self.filters)
 
-def get_spending_insights(user_id: int, use_filters: bool = True) -> Dict:
+
+def get_spending_insights(user_id: int, use_filters: bool = True,
+                          snapshot: AnalyticsSnapshot = None) -> Dict:
     """Получить инсайты о тратах пользователя"""
-    stats_30 = db.get_statistics(user_id, 30)
-    stats_7 = db.get_statistics(user_id, 7)
+    return _spending_insights(snapshot or AnalyticsSnapshot.load(user_id, use_filters))
+
+
+def _spending_insights(snapshot: AnalyticsSnapshot) -> Dict:
+    stats_30 = snapshot.month
+    stats_7 = snapshot.week
     
-    if use_filters:
-        filtered_exp_30, _, filters_applied = apply_category_filters(
-            user_id, stats_30['expenses_by_category']
-        )
-        filtered_exp_7, _, _ = apply_category_filters(
-            user_id, stats_7['expenses_by_category']
-        )
-    else:
-        filtered_exp_30 = stats_30['expenses_by_category']
-        filtered_exp_7 = stats_7['expenses_by_category']
-        filters_applied = False
-    total_expenses_30 = sum(filtered_exp_30.values())
-    total_expenses_7 = sum(filtered_exp_7.values())
+    filtered_exp_30 = stats_30['expenses_by_category']
+    filters_applied = stats_30['filters_applied']
+    total_expenses_30 = stats_30['total_expenses']
+    total_expenses_7 = stats_7['total_expenses']
+    expenses_count_30 = stats_30['unfiltered']['expenses_count']
     
     insights = {
         'daily_average': 0,
@@ -58,7 +109,7 @@ def get_spending_insights(user_id: int, use_filters: bool = True) -> Dict:
         'filters_applied': filters_applied
     }
     
-    if stats_30['expenses_count'] > 0 and total_expenses_30 > 0:
+    if expenses_count_30 > 0 and total_expenses_30 > 0:
         insights['daily_average'] = total_expenses_30 / 30
     if total_expenses_7 > 0 and total_expenses_30 > 0:
         weekly_avg = total_expenses_30 / 4.3
@@ -72,35 +123,28 @@ def get_spending_insights(user_id: int, use_filters: bool = True) -> Dict:
         insights['top_category'] = top_cat[0]
         if total_expenses_30 > 0:
             insights['top_category_percent'] = (top_cat[1] / total_expenses_30) * 100
-    if stats_30['expenses'] and total_expenses_30 > 0:
-        avg_expense = total_expenses_30 / stats_30['expenses_count']
-        for exp in stats_30['expenses'][:10]:
-
-            if use_filters and exp['category'] not in filtered_exp_30:
-                continue
-            if exp['amount'] > avg_expense * 3:
-                insights['unusual_spending'].append({
-                    'amount': exp['amount'],
-                    'category': exp['category'],
-                    'date': exp['date']
-                })
-    
-    balance = stats_30['total_income'] - total_expenses_30
+    if expenses_count_30 > 0 and total_expenses_30 > 0:
+        # Каждая трата за 30 дней против статистики своей категории (category_stats)
+        insights['unusual_spending'] = snapshot.history().anomalies(
+            snapshot.now - timedelta(days=30), snapshot.expense_mask(),
+            baseline=db.get_category_stats(snapshot.user_id)
+        )
+    
+    balance = stats_30['unfiltered']['total_income'] - total_expenses_30
     if balance < 0:
         insights['savings_potential'] = abs(balance) * 0.2
     
     return insights
 
 
-def generate_smart_tips(user_id: int) -> List[str]:
+def generate_smart_tips(user_id: int, snapshot: AnalyticsSnapshot = None) -> List[str]:
     """Генерировать умные советы на основе анализа"""
-    insights = get_spending_insights(user_id, use_filters=True)
-    stats = db.get_statistics(user_id, 30)
+    snapshot = snapshot or AnalyticsSnapshot.load(user_id)
+    insights = _spending_insights(snapshot)
+    stats = snapshot.month
 
-    filtered_exp, _, filters_applied = apply_category_filters(
-        user_id, stats['expenses_by_category']
-    )
-    total_expenses = sum(filtered_exp.values())
+    filters_applied = stats['filters_applied']
+    total_expenses = stats['total_expenses']
     
     tips = []
     
@@ -110,7 +154,7 @@ def generate_smart_tips(user_id: int) -> List[str]:
             "Анализ учитывает только выбранные категории."
         )
     
-    balance = stats['total_income'] - total_expenses
+    balance = stats['unfiltered']['total_income'] - total_expenses
     if balance < 0:
         tips.append(
             f"⚠️ Твой баланс отрицательный: {abs(balance):.0f} руб.\n"
@@ -142,11 +186,11 @@ def generate_smart_tips(user_id: int) -> List[str]:
     if insights['unusual_spending']:
         large_expense = insights['unusual_spending'][0]
         tips.append(
-            f"💸 Обнаружена крупная трата: {large_expense['amount']:.0f} руб. на {large_expense['category']}.\n"
-            "Это в 3+ раза больше твоего среднего чека!"
+            f"💸 Обнаружена необычная трата: {large_expense['amount']:.0f} руб. на {large_expense['category']}.\n"
+            f"Обычно такие траты около {large_expense['typical']:.0f} руб."
         )
     
-    if stats['expenses_count'] < 10:
+    if stats['unfiltered']['expenses_count'] < 10:
         tips.append(
             "💡 Добавь больше операций для более точной аналитики.\n"
             "Рекомендуем записывать все расходы ежедневно!"
@@ -161,81 +205,46 @@ def generate_smart_tips(user_id: int) -> List[str]:
     return tips
 
 
-def predict_monthly_expenses(user_id: int) -> Dict:
-    """Предсказать расходы на конец месяца с учетом фильтров"""
-    stats_7 = db.get_statistics(user_id, 7)
-    stats_30 = db.get_statistics(user_id, 30)
-    
-    filtered_exp_7, _, filters_applied = apply_category_filters(
-        user_id, stats_7['expenses_by_category']
-    )
-    filtered_exp_30, _, _ = apply_category_filters(
-        user_id, stats_30['expenses_by_category']
-    )
-    
-    total_expenses_7 = sum(filtered_exp_7.values())
-    total_expenses_30 = sum(filtered_exp_30.values())
-    
-    current_day = datetime.now().day
-    days_in_month = 30
-    
-    weekly_avg = total_expenses_7
-    weeks_remaining = (days_in_month - current_day) / 7
-    predicted_from_week = total_expenses_30 + (weekly_avg * weeks_remaining)
-    
-    if current_day > 0:
-        daily_avg = total_expenses_30 / current_day
-        predicted_from_daily = daily_avg * days_in_month
-    else:
-        predicted_from_daily = predicted_from_week
-    
-    prediction = (predicted_from_week + predicted_from_daily) / 2
-    
-    return {
-        'current_expenses': total_expenses_30,
-        'predicted_total': prediction,
-        'predicted_remaining': prediction - total_expenses_30,
-        'daily_average': total_expenses_30 / max(current_day, 1),
-        'days_passed': current_day,
-        'days_remaining': days_in_month - current_day,
-        'filters_applied': filters_applied
-    }
+def predict_monthly_expenses(user_id: int, snapshot: AnalyticsSnapshot = None) -> Dict:
+    """
+    Предсказать расходы на конец календарного месяца с учетом фильтров
 
+    Потрачено с 1-го числа плюс дневной темп последних недель на оставшиеся
+    дни месяца (см. SpendingHistory.month_end_projection).
+    """
+    snapshot = snapshot or AnalyticsSnapshot.load(user_id)
+    forecast = snapshot.history().month_end_projection(snapshot.expense_mask())
+    forecast['filters_applied'] = snapshot.month['filters_applied']
+    return forecast
 
-def compare_periods(user_id: int) -> Dict:
-    """Сравнить текущий месяц с предыдущим с учетом фильтров"""
-    current = db.get_statistics(user_id, 30)
-    
-    filtered_exp_curr, filtered_inc_curr, filters_applied = apply_category_filters(
-        user_id, current['expenses_by_category'], current['income_by_source']
-    )
-    
-    expenses_prev = db.get_expenses(user_id, 60)
-    income_prev = db.get_income(user_id, 60)
-    
-    cutoff = datetime.now() - timedelta(days=30)
-    
-    expenses_prev = [e for e in expenses_prev if datetime.fromisoformat(e['date'].replace('Z', '+00:00')) < cutoff]
-    income_prev = [i for i in income_prev if datetime.fromisoformat(i['date'].replace('Z', '+00:00')) < cutoff]
-    
-    prev_exp_by_cat = {}
-    for e in expenses_prev:
-        cat = e['category']
-        prev_exp_by_cat[cat] = prev_exp_by_cat.get(cat, 0) + e['amount']
-    
-    prev_inc_by_src = {}
-    for i in income_prev:
-        src = i['source']
-        prev_inc_by_src[src] = prev_inc_by_src.get(src, 0) + i['amount']
+
+def compare_periods(user_id: int, snapshot: AnalyticsSnapshot = None,
+                    period: Period = None) -> Dict:
+    """
+    Сравнить период с предыдущим с учетом фильтров
+
+    По умолчанию - последние 30 дней из снимка и 30 дней до них. С period
+    (например, Period.calendar_month()) сравнивается он и period.previous()
+    отдельным запросом.
+    """
+    if period is not None:
+        periods = {'current': period, 'previous': period.previous()}
+        summaries = db.get_window_summaries(user_id, periods, filters=get_filter_spec(user_id))
+        current = summaries['current']
+        previous = summaries['previous']
+    else:
+        snapshot = snapshot or AnalyticsSnapshot.load(user_id)
+        current = snapshot.month
+        previous = snapshot.previous_month
+        periods = {'current': Period.rolling(30, snapshot.now)}
+        periods['previous'] = periods['current'].previous(snapshot.now)
     
-    filtered_exp_prev, filtered_inc_prev, _ = apply_category_filters(
-        user_id, prev_exp_by_cat, prev_inc_by_src
-    )
-    curr_total_exp = sum(filtered_exp_curr.values())
-    prev_total_exp = sum(filtered_exp_prev.values())
+    filters_applied = current['filters_applied']
+    curr_total_exp = current['total_expenses']
+    prev_total_exp = previous['total_expenses']
     
-    curr_total_inc = sum(filtered_inc_curr.values()) if filtered_inc_curr else 0
-    prev_total_inc = sum(filtered_inc_prev.values()) if filtered_inc_prev else 0
+    curr_total_inc = current['total_income']
+    prev_total_inc = previous['total_income']
     
     curr_balance = curr_total_inc - curr_total_exp
     prev_balance = prev_total_inc - prev_total_exp
@@ -255,12 +264,14 @@ def compare_periods(user_id: int) -> Dict:
         'current': {
             'total_expenses': curr_total_exp,
             'total_income': curr_total_inc,
-            'balance': curr_balance
+            'balance': curr_balance,
+            'label': periods['current'].label
         },
         'previous': {
             'total_expenses': prev_total_exp,
             'total_income': prev_total_inc,
-            'balance': prev_balance
+            'balance': prev_balance,
+            'label': periods['previous'].label
         },
         'changes': {
             'expenses': expenses_change,
@@ -271,10 +282,12 @@ def compare_periods(user_id: int) -> Dict:
     }
 
 
-def get_achievements(user_id: int) -> Dict:
+def get_achievements(user_id: int, snapshot: AnalyticsSnapshot = None) -> Dict:
     """Получить достижения пользователя"""
-    stats_all = db.get_statistics(user_id, None)
-    stats_30 = db.get_statistics(user_id, 30)
+    # Достижения и факты считаются без фильтров категорий
+    snapshot = snapshot or AnalyticsSnapshot(user_id)
+    stats_all = snapshot.lifetime()
+    stats_30 = snapshot.month['unfiltered']
     
     achievements = []
     
@@ -309,17 +322,20 @@ def get_achievements(user_id: int) -> Dict:
 
     facts = []
     
-    if stats_all['total_expenses'] > 0:
-        facts.append(f"💸 Всего потрачено: {stats_all['total_expenses']:,.0f} руб.")
+    if stats_all['expenses_total'] > 0:
+        facts.append(f"💸 Всего потрачено: {stats_all['expenses_total']:,.0f} руб.")
+    
+    if stats_all['income_total'] > 0:
+        facts.append(f"💰 Всего заработано: {stats_all['income_total']:,.0f} руб.")
     
-    if stats_all['total_income'] > 0:
-        facts.append(f"💰 Всего заработано: {stats_all['total_income']:,.0f} руб.")
+    if stats_all['first_at']:
+        facts.append(f"📅 Ведёшь учёт с {stats_all['first_at']:%d.%m.%Y}")
     
     if stats_30['expenses_by_category']:
         top_cat = max(stats_30['expenses_by_category'].items(), key=lambda x: x[1])
         facts.append(f"🎯 Любимая категория: {top_cat[0]}")
     
-    avg_expense = stats_all['total_expenses'] / stats_all['expenses_count'] if stats_all['expenses_count'] > 0 else 0
+    avg_expense = stats_all['expenses_total'] / stats_all['expenses_count'] if stats_all['expenses_count'] > 0 else 0
     if avg_expense > 0:
         facts.append(f"📊 Средний чек: {avg_expense:,.0f} руб.")
     
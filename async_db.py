@@ -0,0 +1,209 @@
+"""
+Асинхронный доступ к базе данных для обработчиков бота
+
+Операции Database, которые ждут обработчики (запись и удаление операций,
+сводки, статистика, страницы, поиск), выполняются в event loop на
+асинхронном пуле psycopg 3 (AsyncDatabase): медленный запрос одного
+пользователя не останавливает обработку остальных апдейтов и не занимает
+поток. Размер пула - DB_POOL_MIN и DB_ASYNC_POOL_MAX (по умолчанию DB_POOL_MAX),
+ожидание соединения - DB_POOL_TIMEOUT.
+
+Остальные запросы (менеджеры, выгрузки) по-прежнему синхронные и
+выполняются в отдельном пуле потоков (run_sync, AsyncProxy). Потоков по
+умолчанию вдвое меньше, чем соединений синхронного пула (DB_POOL_MAX):
+некоторые методы менеджеров берут второе соединение, пока держат первое, и
+потоки не должны разбирать весь пул. Число потоков можно задать DB_EXECUTOR_WORKERS.
+"""
+import asyncio
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from psycopg.rows import dict_row, tuple_row
+from psycopg_pool import AsyncConnectionPool
+
+from database import COMMIT, Database, get_database
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = int(os.getenv(
+                    "DB_EXECUTOR_WORKERS", max(get_database().pool_max // 2, 1)
+                ))
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+    return _executor
+
+
+async def run_sync(func: Callable, *args, **kwargs) -> Any:
+    """Выполнить синхронную функцию, работающую с БД, не блокируя event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+class AsyncProxy:
+    """
+    Асинхронная обёртка над менеджером: запросы выполняются в пуле потоков
+
+    Любой метод обёрнутого объекта становится корутиной:
+    `await async_balance_manager.get_balance(user_id)`.
+    """
+
+    def __init__(self, target):
+        self._target = target
+
+    @property
+    def sync(self):
+        """Исходный синхронный объект"""
+        return self._target
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            return await run_sync(attr, *args, **kwargs)
+
+        return method
+
+
+class AsyncDatabase:
+    """
+    Асинхронный Database на пуле psycopg 3
+
+    Операции Database, записанные через database.transaction, выполняются
+    тем же кодом, что и синхронно, но соединение и запросы ждутся в event
+    loop: `await get_async_database().record_expense(...)`. Для остальных
+    методов Database - run_sync(db.sync.method, ...).
+
+    Пул открывается open() при запуске бота (или при первом запросе) в
+    текущем event loop и закрывается close() при остановке. Автоматическая
+    подготовка запросов отключена (prepare_threshold=None): как и с
+    psycopg2, план строится под значения параметров каждого вызова, что
+    важно для секционированных expenses/income.
+    """
+
+    def __init__(self, database: Database):
+        self._database = database
+        self._pool: Optional[AsyncConnectionPool] = None
+        self._pool_lock = asyncio.Lock()
+
+    @property
+    def sync(self) -> Database:
+        """Исходный синхронный Database"""
+        return self._database
+
+    async def _get_pool(self) -> AsyncConnectionPool:
+        if self._pool is None:
+            async with self._pool_lock:
+                if self._pool is None:
+                    database = self._database
+                    pool = AsyncConnectionPool(
+                        kwargs={**Database.connection_params(), 'prepare_threshold': None},
+                        min_size=database.pool_min,
+                        max_size=int(os.getenv("DB_ASYNC_POOL_MAX", database.pool_max)),
+                        timeout=database.pool_timeout,
+                        name="async_db",
+                        open=False
+                    )
+                    await pool.open()
+                    self._pool = pool
+        return self._pool
+
+    async def open(self):
+        """Открыть пул заранее, чтобы первые апдейты не ждали соединений"""
+        await self._get_pool()
+
+    async def run(self, method, *args, **kwargs):
+        """Выполнить операцию transaction (метод Database или функцию от db) в event loop"""
+        steps = method.steps(self._database, *args, **kwargs)
+        conn = None
+        try:
+            reply = None
+            while True:
+                try:
+                    query = steps.send(reply)
+                except StopIteration as stop:
+                    if conn is not None:
+                        await conn.commit()
+                    return stop.value
+                # Соединение берётся только под первый запрос
+                if conn is None:
+                    conn = await (await self._get_pool()).getconn()
+                if query is COMMIT:
+                    await conn.commit()
+                    reply = None
+                    continue
+                async with conn.cursor(row_factory=dict_row if query.dict_rows else tuple_row) as cursor:
+                    await cursor.execute(query.sql, query.params)
+                    if query.fetch == 'one':
+                        reply = await cursor.fetchone()
+                    elif query.fetch == 'all':
+                        reply = await cursor.fetchall()
+                    else:
+                        reply = None
+        except Exception as e:
+            if conn is not None:
+                await conn.rollback()
+            if method.error:
+                logger.error(f"{method.error}: {e}")
+            if method.reraise:
+                raise
+            return None
+        finally:
+            if conn is not None:
+                await self._pool.putconn(conn)
+
+    def __getattr__(self, name: str):
+        method = getattr(Database, name, None)
+        if not hasattr(method, 'steps'):
+            raise AttributeError(f"Database.{name} has no async version, use run_sync(db.sync.{name}, ...)")
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+
+        return call
+
+    def get_pool_stats(self) -> Dict:
+        """Статистика асинхронного пула (см. AsyncConnectionPool.get_stats)"""
+        if self._pool is None:
+            return {'initialized': False}
+        return {'initialized': True, **self._pool.get_stats()}
+
+    async def close(self):
+        """Закрыть асинхронный пул (при завершении бота)"""
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await pool.close()
+
+
+_async_database: Optional[AsyncDatabase] = None
+
+
+def get_async_database() -> AsyncDatabase:
+    """Асинхронный вариант get_database() для обработчиков"""
+    global _async_database
+    if _async_database is None:
+        _async_database = AsyncDatabase(get_database())
+    return _async_database
+
+
+def shutdown_executor():
+    """Остановить пул потоков (при завершении бота)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
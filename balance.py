@@ -4,55 +4,21 @@
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
 from typing import Dict, Optional
-from database import Database
+from database import get_database
+from async_db import AsyncProxy
+from cache import balance_cache
 
-db = Database()
+db = get_database()
 
 
 class BalanceManager:
     """Управление виртуальным балансом пользователя"""
     
-    def __init__(self):
-        self._init_tables()
-    
-    def _init_tables(self):
-        """Инициализация таблиц баланса"""
-        conn = db.get_connection()
-        try:
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_balance (
-                    user_id BIGINT PRIMARY KEY,
-                    balance REAL DEFAULT 0,
-                    hidden_balance REAL DEFAULT 0,
-                    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS hidden_transactions (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    amount REAL NOT NULL,
-                    operation_type TEXT NOT NULL,
-                    reason TEXT,
-                    date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            print(f"Error initializing balance tables: {e}")
-        finally:
-            cursor.close()
-            db.return_connection(conn)
-    
     def get_balance(self, user_id: int) -> Dict:
-        """Получить баланс пользователя"""
+        """Получить баланс пользователя (кэшируется до изменения баланса, см. cache.py)"""
+        return balance_cache.get_or_load(user_id, lambda: self._load_balance(user_id))
+    
+    def _load_balance(self, user_id: int) -> Dict:
         conn = db.get_connection()
         try:
             cursor = conn.cursor(cursor_factory=RealDictCursor)
@@ -96,6 +62,8 @@ class BalanceManager:
                 ON CONFLICT (user_id) DO NOTHING
             """, (user_id,))
             conn.commit()
+            if cursor.rowcount:
+                balance_cache.invalidate(user_id)
         finally:
             cursor.close()
             db.return_connection(conn)
@@ -128,6 +96,7 @@ class BalanceManager:
                 """, (amount, user_id))
             
             conn.commit()
+            balance_cache.invalidate(user_id)
         except Exception as e:
             conn.rollback()
             print(f"Error updating balance: {e}")
@@ -167,6 +136,7 @@ class BalanceManager:
             """, (user_id, amount, reason))
             
             conn.commit()
+            balance_cache.invalidate(user_id)
             return True
         except Exception as e:
             conn.rollback()
@@ -208,6 +178,7 @@ class BalanceManager:
             """, (user_id, amount, reason))
             
             conn.commit()
+            balance_cache.invalidate(user_id)
             return True
         except Exception as e:
             conn.rollback()
@@ -274,6 +245,7 @@ class BalanceManager:
             """, (user_id, main_balance, hidden_balance))
             
             conn.commit()
+            balance_cache.invalidate(user_id)
             
             print(f"Balance recalculated for user {user_id}:")
             print(f"  Income: {total_income}")
@@ -317,4 +289,5 @@ class BalanceManager:
                 db.return_connection(conn)
 
 
-balance_manager = BalanceManager()
\ No newline at end of file
+balance_manager = BalanceManager()
+async_balance_manager = AsyncProxy(balance_manager)
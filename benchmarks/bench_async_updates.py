@@ -0,0 +1,142 @@
+"""
+Бенчмарк: сколько апдейтов в секунду бот обрабатывает конкурентно
+
+Каждый "апдейт" повторяет то, что делает обработчик после добавления расхода:
+статистика за 30 дней, баланс, проверка бюджета и (опционально) медленный
+запрос, имитирующий тяжёлый отчёт. Перед замером каждый режим прогревается
+(--warmup апдейтов): пулы соединений доходят до рабочего размера, как у
+давно запущенного бота. Сравниваются три режима:
+
+  sync    - обработчики вызывают синхронные методы прямо в event loop
+  threads - все запросы через run_sync в пуле потоков, на psycopg2
+  async   - обработчики ждут async_db (пул psycopg 3) и async_*_manager
+
+Запуск (нужен PostgreSQL, параметры берутся из DB_* переменных окружения):
+    python benchmarks/bench_async_updates.py --users 20 --updates 400 --slow-query-ms 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Query, get_database, transaction  # noqa: E402
+from async_db import get_async_database, run_sync, shutdown_executor  # noqa: E402
+from balance import balance_manager, async_balance_manager  # noqa: E402
+from budgets import budget_manager, async_budget_manager  # noqa: E402
+
+BASE_USER_ID = 990_000_000
+
+
+@transaction()
+def slow_query(db, ms: int):
+    if ms > 0:
+        yield Query("SELECT pg_sleep(%s)", (ms / 1000,))
+
+
+def seed(users: int, rows_per_user: int):
+    db = get_database()
+    now = datetime.now()
+    for i in range(users):
+        user_id = BASE_USER_ID + i
+        db.add_user(user_id, f"bench{i}", "bench")
+        db.add_expenses_bulk(user_id, [
+            {
+                'amount': 100 + (j % 50),
+                'category': f"cat{j % 8}",
+                'date': now - timedelta(hours=j)
+            }
+            for j in range(rows_per_user)
+        ])
+        budget_manager.set_budget(user_id, "cat0", 10_000)
+
+
+def cleanup(users: int):
+    db = get_database()
+    ids = [BASE_USER_ID + i for i in range(users)]
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        for table in ("expenses", "income", "daily_totals", "category_stats", "user_totals",
+                      "search_terms", "budgets", "user_balance"):
+            cursor.execute(f"DELETE FROM {table} WHERE user_id = ANY(%s)", (ids,))
+        cursor.execute("DELETE FROM users WHERE user_id = ANY(%s)", (ids,))
+        conn.commit()
+        cursor.close()
+    finally:
+        db.return_connection(conn)
+
+
+async def update_sync(user_id: int, slow_ms: int):
+    db = get_database()
+    db.get_summary(user_id, 30)
+    balance_manager.get_balance(user_id)
+    budget_manager.check_budget_alerts(user_id, "cat0")
+    slow_query(db, slow_ms)
+
+
+async def update_threads(user_id: int, slow_ms: int):
+    db = get_database()
+    await run_sync(db.get_summary, user_id, 30)
+    await async_balance_manager.get_balance(user_id)
+    await async_budget_manager.check_budget_alerts(user_id, "cat0")
+    await run_sync(slow_query, db, slow_ms)
+
+
+async def update_async(user_id: int, slow_ms: int):
+    db = get_async_database()
+    await db.get_summary(user_id, 30)
+    await async_balance_manager.get_balance(user_id)
+    await async_budget_manager.check_budget_alerts(user_id, "cat0")
+    await db.run(slow_query, slow_ms)
+
+
+async def run_mode(handler, users: int, updates: int, slow_ms: int, warmup: int) -> float:
+    try:
+        await asyncio.gather(*(
+            handler(BASE_USER_ID + n % users, slow_ms) for n in range(warmup)
+        ))
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            handler(BASE_USER_ID + n % users, slow_ms) for n in range(updates)
+        ))
+        return updates / (time.perf_counter() - started)
+    finally:
+        # Пул psycopg 3 работает в event loop этого asyncio.run
+        await get_async_database().close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=500, help="расходов на пользователя")
+    parser.add_argument("--updates", type=int, default=400)
+    parser.add_argument("--slow-query-ms", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=100, help="апдейтов до замера")
+    args = parser.parse_args()
+
+    cleanup(args.users)
+    seed(args.users, args.rows)
+    try:
+        sync_rate, threads_rate, async_rate = [
+            asyncio.run(run_mode(handler, args.users, args.updates, args.slow_query_ms, args.warmup))
+            for handler in (update_sync, update_threads, update_async)
+        ]
+    finally:
+        shutdown_executor()
+        cleanup(args.users)
+
+    print(f"users={args.users} rows/user={args.rows} updates={args.updates} "
+          f"slow_query={args.slow_query_ms}ms pool_max={get_database().pool_max}")
+    print(f"  sync    (blocking event loop): {sync_rate:8.1f} updates/s")
+    print(f"  threads (run_sync, psycopg2):  {threads_rate:8.1f} updates/s")
+    print(f"  async   (psycopg 3 pool):      {async_rate:8.1f} updates/s")
+    print(f"  speedup vs sync: x{async_rate / sync_rate:.1f}, vs threads: x{async_rate / threads_rate:.1f}")
+    print(f"  pool: {get_database().get_pool_stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Проверка сброса кэшей между процессами (cache_sync, LISTEN/NOTIFY)
+
+Два процесса-воркера работают с одним пользователем: writer меняет баланс
+через BalanceManager, reader всё время читает баланс через кэш и сверяет его
+с БД. Reader печатает долю устаревших чтений, задержку доставки сбросов и
+счётчики потерь. С --no-sync видно, что без обмена сбросами reader видит
+старый баланс до истечения CACHE_TTL.
+
+Запуск (нужен PostgreSQL, параметры из DB_*):
+    python benchmarks/bench_cache_sync.py --writes 500
+    python benchmarks/bench_cache_sync.py --writes 500 --no-sync
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+USER_ID = 990_200_000
+
+
+def _start(sync: bool):
+    from cache_sync import start_cache_sync
+    if sync:
+        start_cache_sync()
+        time.sleep(0.5)  # LISTEN успел выполниться
+
+
+def writer(writes: int, interval: float, sync: bool, ready, done):
+    from balance import balance_manager
+    from cache_sync import stop_cache_sync
+    _start(sync)
+    ready.wait()
+    for _ in range(writes):
+        balance_manager.update_balance(USER_ID, 1, True)
+        time.sleep(interval)
+    stop_cache_sync()
+    done.set()
+
+
+def reader(sync: bool, ready, done, results):
+    from balance import balance_manager
+    from cache_sync import get_cache_sync_stats, stop_cache_sync
+    _start(sync)
+    balance_manager.get_balance(USER_ID)
+    ready.set()
+    reads = stale = 0
+    while not done.is_set():
+        cached = balance_manager.get_balance(USER_ID)['balance']
+        # Изменение могло случиться между двумя чтениями - сверяем дважды
+        actual = balance_manager._load_balance(USER_ID)['balance']
+        if cached != actual:
+            time.sleep(0.05)
+            if balance_manager.get_balance(USER_ID)['balance'] != balance_manager._load_balance(USER_ID)['balance']:
+                stale += 1
+        reads += 1
+        time.sleep(0.005)
+    time.sleep(0.3)
+    final_ok = balance_manager.get_balance(USER_ID)['balance'] == balance_manager._load_balance(USER_ID)['balance']
+    results.put({'reads': reads, 'stale': stale, 'final_ok': final_ok, 'sync': get_cache_sync_stats()})
+    stop_cache_sync()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writes", type=int, default=500)
+    parser.add_argument("--interval-ms", type=float, default=5)
+    parser.add_argument("--no-sync", action="store_true", help="без LISTEN/NOTIFY (для сравнения)")
+    args = parser.parse_args()
+    sync = not args.no_sync
+
+    from database import get_database
+    db = get_database()
+    db.add_user(USER_ID, "bench_sync")
+
+    ctx = multiprocessing.get_context("spawn")
+    ready, done, results = ctx.Event(), ctx.Event(), ctx.Queue()
+    procs = [
+        ctx.Process(target=reader, args=(sync, ready, done, results)),
+        ctx.Process(target=writer, args=(args.writes, args.interval_ms / 1000, sync, ready, done)),
+    ]
+    started = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    result = results.get(timeout=120)
+    for proc in procs:
+        proc.join()
+    elapsed = time.perf_counter() - started
+
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM user_balance WHERE user_id = %s", (USER_ID,))
+        cursor.execute("DELETE FROM users WHERE user_id = %s", (USER_ID,))
+        conn.commit()
+        cursor.close()
+    finally:
+        db.return_connection(conn)
+        db.close_all_connections()
+
+    stats = result['sync']
+    print(f"cache sync: {'on' if sync else 'off'}, writes={args.writes}, {elapsed:.1f} s")
+    print(f"  reader: {result['reads']} reads, stale after 50 ms: {result['stale']}, "
+          f"consistent at the end: {result['final_ok']}")
+    if stats.get('enabled'):
+        print(f"  received {stats['received_events']} invalidations in {stats['received_notifies']} notifies")
+        print(f"  lag ms: avg {stats['lag_ms_avg']:.2f}, max {stats['lag_ms_max']:.2f}")
+        print(f"  dropped events: {stats['dropped_events']}, resyncs: {stats['resyncs']}")
+
+
+if __name__ == '__main__':
+    main()
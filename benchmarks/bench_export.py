@@ -0,0 +1,136 @@
+"""
+Бенчмарк экспорта в Excel на историях из 10 000 - 500 000 операций
+
+Пользователю бенчмарка записываются расходы (и десятая часть доходов) за
+два года, затем экспорт за всё время строится двумя способами:
+export.export_to_excel (write-only книга, строки серверным курсором
+порциями) и прежним - get_statistics целиком в память, обычная книга,
+подбор ширины по всем ячейкам. Для каждого - время и пик памяти Python
+(tracemalloc; буфер результата libpq у прежнего способа сюда не входит,
+так что его пик занижен), размер файла.
+
+Запуск (нужен PostgreSQL с применёнными миграциями, параметры из DB_*):
+    python benchmarks/bench_export.py --sizes 10000 100000 500000
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook  # noqa: E402
+from openpyxl.utils import get_column_letter  # noqa: E402
+
+from database import get_database  # noqa: E402
+from export import export_to_excel  # noqa: E402
+
+USER_ID = 990_300_001
+CATEGORIES = ["Еда", "Транспорт", "Покупки", "Здоровье", "Жилье", "Развлечения", "Кафе", "Спорт"]
+
+
+def fill(db, rows: int):
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        cleanup(cursor)
+        cursor.execute("INSERT INTO users (user_id, username) VALUES (%s, 'bench')", (USER_ID,))
+        cursor.execute("""
+            INSERT INTO expenses (user_id, amount, category, description, date)
+            SELECT %s, round((exp(4 + random() * 3))::numeric, 2),
+                   (%s::text[])[1 + g %% array_length(%s::text[], 1)],
+                   CASE WHEN g %% 3 = 0 THEN 'покупка номер ' || g END,
+                   now() - random() * interval '730 days'
+            FROM generate_series(1, %s) AS g
+        """, (USER_ID, CATEGORIES, CATEGORIES, rows))
+        cursor.execute("""
+            INSERT INTO income (user_id, amount, source, date)
+            SELECT %s, round((exp(9 + random()))::numeric, 2), 'Зарплата',
+                   now() - random() * interval '730 days'
+            FROM generate_series(1, %s)
+        """, (USER_ID, max(rows // 10, 1)))
+        conn.commit()
+    finally:
+        cursor.close()
+        db.return_connection(conn)
+    # Строки вставлены в обход add_expense: дневные итоги и счётчики пересчитываются
+    db.rebuild_rollups(USER_ID)
+
+
+def legacy_export(db, user_id: int) -> int:
+    """Прежний способ: все строки в память, обычная книга, ширины по всем ячейкам"""
+    stats = db.get_statistics(user_id, None)
+    wb = Workbook()
+    ws = wb.active
+    ws.append(["Доходы:", f"{stats['total_income']:,.2f} руб."])
+    ws.append(["Расходы:", f"{stats['total_expenses']:,.2f} руб."])
+    for kind, field in (('expenses', 'category'), ('income', 'source')):
+        for row in sorted(stats[kind], key=lambda x: x['date'], reverse=True):
+            ws.append([row['date'].strftime('%d.%m.%Y %H:%M'), row[field], row['amount'],
+                       row.get('description') or ''])
+    for column in ws.columns:
+        width = max(len(str(cell.value)) for cell in column)
+        ws.column_dimensions[get_column_letter(column[0].column)].width = min(width + 2, 50)
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return len(buffer.getvalue())
+
+
+def streaming_export(db, user_id: int) -> int:
+    with export_to_excel(db, user_id, None) as file:
+        file.seek(0, os.SEEK_END)
+        return file.tell()
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = func(*args)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, size
+
+
+def cleanup(cursor):
+    cursor.execute("""
+        SELECT table_name FROM information_schema.columns
+        WHERE column_name = 'user_id' AND table_schema = 'public' AND table_name <> 'users'
+          AND table_name IN (SELECT table_name FROM information_schema.tables WHERE table_type = 'BASE TABLE')
+    """)
+    for (table,) in cursor.fetchall():
+        cursor.execute(f"DELETE FROM {table} WHERE user_id = %s", (USER_ID,))
+    cursor.execute("DELETE FROM users WHERE user_id = %s", (USER_ID,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 500_000])
+    parser.add_argument("--skip-legacy", action="store_true", help="не замерять прежний способ")
+    args = parser.parse_args()
+
+    db = get_database()
+    try:
+        print(f"{'строк':>9} {'способ':<10} {'время, с':>9} {'пик памяти, МБ':>15} {'файл, КБ':>9}")
+        for rows in args.sizes:
+            fill(db, rows)
+            variants = [("потоковый", streaming_export)]
+            if not args.skip_legacy:
+                variants.append(("прежний", legacy_export))
+            for label, func in variants:
+                elapsed, peak, size = measure(func, db, USER_ID)
+                print(f"{rows:>9,} {label:<10} {elapsed:>9.2f} {peak / 2 ** 20:>15.1f} {size / 1024:>9.0f}")
+    finally:
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cleanup(cursor)
+        conn.commit()
+        cursor.close()
+        db.return_connection(conn)
+        db.close_all_connections()
+
+
+if __name__ == '__main__':
+    main()
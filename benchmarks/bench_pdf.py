@@ -0,0 +1,129 @@
+"""
+Бенчмарк PDF-отчёта на историях из 1 000 - 100 000 операций
+
+Пользователю бенчмарка записываются операции (как в bench_export.py), затем
+отчёт за всё время строится:
+- прежним способом: шрифты регистрируются заново, get_statistics загружает
+  все операции, в отчёт попадают 20 последних;
+- export.export_to_pdf(summary_only=True) - только итоги;
+- export.export_to_pdf - все операции таблицами по PDF_TABLE_ROWS строк.
+Для каждого - время (медиана), число страниц, размер и, с --memory, пик
+памяти Python (tracemalloc, заметно замедляет замер). Отдельно - стоимость
+регистрации шрифтов, которую export_to_pdf платит один раз на процесс.
+
+Запуск (нужен PostgreSQL с применёнными миграциями, параметры из DB_*):
+    python benchmarks/bench_pdf.py --sizes 1000 10000 100000
+"""
+import argparse
+import io
+import os
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reportlab.lib import colors  # noqa: E402
+from reportlab.lib.pagesizes import A4  # noqa: E402
+from reportlab.lib.styles import getSampleStyleSheet  # noqa: E402
+from reportlab.lib.units import mm  # noqa: E402
+from reportlab.pdfbase import pdfmetrics  # noqa: E402
+from reportlab.pdfbase.ttfonts import TTFont  # noqa: E402
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Table, TableStyle  # noqa: E402
+
+from bench_export import USER_ID, cleanup, fill  # noqa: E402
+from database import get_database  # noqa: E402
+from export import PDF_FONT_PATHS, export_to_pdf  # noqa: E402
+from utils import format_currency  # noqa: E402
+
+
+def legacy_pdf(db, user_id: int) -> bytes:
+    """Прежний способ: регистрация шрифтов на каждый отчёт, все строки в память, 20 последних"""
+    for name, path in PDF_FONT_PATHS.items():
+        pdfmetrics.registerFont(TTFont(name, path))
+    stats = db.get_statistics(user_id, None)
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+    style = TableStyle([
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey), ('FONTNAME', (0, 0), (-1, -1), 'DejaVu')
+    ])
+    story = [Paragraph("Финансовый отчет", getSampleStyleSheet()['Title'])]
+    for kind, field in (('expenses', 'category'), ('income', 'source')):
+        rows = [
+            [row['date'].strftime('%d.%m.%Y %H:%M'), row[field],
+             f"{format_currency(row['amount'])} руб.", row.get('description') or '']
+            for row in sorted(stats[kind], key=lambda x: x['date'], reverse=True)[:20]
+        ]
+        if rows:
+            story.append(Table(rows, colWidths=[35 * mm, 40 * mm, 25 * mm, 50 * mm], style=style))
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def new_pdf(db, user_id: int, summary_only: bool) -> bytes:
+    return export_to_pdf(db, user_id, None, summary_only).getvalue()
+
+
+def measure(func, repeats: int, memory: bool):
+    samples = []
+    peak = None
+    data = b""
+    for attempt in range(repeats):
+        if memory and attempt == 0:
+            tracemalloc.start()
+        started = time.perf_counter()
+        data = func()
+        elapsed = time.perf_counter() - started
+        if memory and attempt == 0:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            samples.append(elapsed)
+    return statistics.median(samples or [elapsed]), peak, data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--memory", action="store_true", help="замерить пик памяти (первый прогон)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    for name, path in PDF_FONT_PATHS.items():
+        TTFont(name, path)
+    print(f"Регистрация шрифтов: {(time.perf_counter() - started) * 1000:.0f} мс на отчёт прежде, "
+          f"теперь один раз на процесс\n")
+
+    db = get_database()
+    try:
+        print(f"{'строк':>9} {'способ':<14} {'время, с':>9} {'страниц':>8} {'файл, КБ':>9} {'пик, МБ':>8}")
+        for rows in args.sizes:
+            fill(db, rows)
+            # Первый отчёт процесса регистрирует шрифты, в замер не входит
+            new_pdf(db, USER_ID, True)
+            variants = [
+                ("прежний (20)", lambda: legacy_pdf(db, USER_ID)),
+                ("итоги", lambda: new_pdf(db, USER_ID, True)),
+                ("все операции", lambda: new_pdf(db, USER_ID, False)),
+            ]
+            for label, func in variants:
+                repeats = 1 if label == "все операции" and rows >= 100_000 else args.repeats
+                elapsed, peak, data = measure(func, repeats + (1 if args.memory else 0), args.memory)
+                pages = len(re.findall(rb"/Type /Page\b", data))
+                memory = f"{peak / 2 ** 20:>8.1f}" if peak is not None else f"{'-':>8}"
+                print(f"{rows:>9,} {label:<14} {elapsed:>9.2f} {pages:>8} {len(data) / 1024:>9.0f} {memory}")
+    finally:
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cleanup(cursor)
+        conn.commit()
+        cursor.close()
+        db.return_connection(conn)
+        db.close_all_connections()
+
+
+if __name__ == '__main__':
+    main()
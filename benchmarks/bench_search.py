@@ -0,0 +1,181 @@
+"""
+Бенчмарк поиска операций на пользователе со 100 000 транзакций
+
+Сравниваются старый запрос (LOWER(...) LIKE LOWER('%q%') по каждой таблице,
+без индекса) и Database.search_transactions (pg_trgm + btree_gin, страницы по
+ключу (date, id), похожие слова): первая, вторая и сотая страница. Кроме пользователя бенчмарка в таблицы добавляются строки других
+пользователей, чтобы индекс не выигрывал только за счёт маленькой таблицы.
+
+Запуск (нужен PostgreSQL с применёнными миграциями, параметры из DB_*):
+    python benchmarks/bench_search.py --rows 100000 --other-rows 200000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_database  # noqa: E402
+from partitions import ensure_partitions  # noqa: E402
+
+BASE_USER_ID = 990_100_000
+OTHER_USERS = 20
+
+CATEGORIES = ["Еда", "Транспорт", "Покупки", "Здоровье", "Жилье", "Развлечения", "Связь", "Одежда"]
+WORDS = [
+    "продукты", "кофе", "такси", "метро", "аптека", "кино", "обед", "ужин", "подарок",
+    "интернет", "телефон", "бензин", "парковка", "кроссовки", "куртка", "аренда",
+    "коммуналка", "ресторан", "доставка", "книги", "спортзал", "стрижка", "ремонт"
+]
+SOURCES = ["Зарплата", "Фриланс", "Инвестиции", "Бизнес", "Подарки", "Прочее"]
+
+QUERIES = [
+    ("частое слово", "продукты"),
+    ("подстрока", "рест"),
+    ("редкое слово", "стрижка салон"),
+    ("опечатка", "продуктв"),
+    ("категория", "транспорт"),
+]
+
+
+def seed(user_id: int, rows: int, cursor):
+    cursor.execute("""
+        INSERT INTO users (user_id, username) VALUES (%s, 'bench')
+        ON CONFLICT (user_id) DO NOTHING
+    """, (user_id,))
+    cursor.execute("""
+        INSERT INTO expenses (user_id, amount, category, description, date)
+        SELECT %s, 50 + (g * 37) %% 5000,
+               (%s::text[])[1 + g %% array_length(%s::text[], 1)],
+               (%s::text[])[1 + (g * 7) %% array_length(%s::text[], 1)] || ' ' ||
+               (%s::text[])[1 + (g * 13) %% array_length(%s::text[], 1)],
+               now() - (g %% 1500) * interval '1 day' - (g %% 24) * interval '1 hour'
+        FROM generate_series(1, %s) AS g
+    """, (user_id, CATEGORIES, CATEGORIES, WORDS, WORDS, WORDS, WORDS, rows * 9 // 10))
+    cursor.execute("""
+        INSERT INTO income (user_id, amount, source, description, date)
+        SELECT %s, 1000 + (g * 53) %% 90000,
+               (%s::text[])[1 + g %% array_length(%s::text[], 1)],
+               'платёж ' || g,
+               now() - (g %% 1500) * interval '1 day'
+        FROM generate_series(1, %s) AS g
+    """, (user_id, SOURCES, SOURCES, rows - rows * 9 // 10))
+    # Строки вставлены в обход Database, словарь заполняется как в миграции 0004
+    cursor.execute("""
+        INSERT INTO search_terms (user_id, term)
+        SELECT DISTINCT %s, term
+        FROM (
+            SELECT regexp_split_to_table(lower(category || ' ' || COALESCE(description, '')), '[^[:alnum:]]+') AS term
+            FROM expenses WHERE user_id = %s
+            UNION ALL
+            SELECT regexp_split_to_table(lower(source || ' ' || COALESCE(description, '')), '[^[:alnum:]]+')
+            FROM income WHERE user_id = %s
+        ) AS words
+        WHERE length(term) >= 3 AND term !~ '^[0-9]+$'
+        ON CONFLICT DO NOTHING
+    """, (user_id, user_id, user_id))
+
+
+def cleanup(cursor):
+    ids = [BASE_USER_ID + i for i in range(OTHER_USERS + 1)]
+    for table in ("expenses", "income", "daily_totals", "search_terms"):
+        cursor.execute(f"DELETE FROM {table} WHERE user_id = ANY(%s)", (ids,))
+    cursor.execute("DELETE FROM users WHERE user_id = ANY(%s)", (ids,))
+
+
+def legacy_search(cursor, user_id: int, query: str, limit: int = 15):
+    """Запрос, который search_transactions выполнял раньше"""
+    pattern = f"%{query}%"
+    cursor.execute("""
+        SELECT * FROM expenses
+        WHERE user_id = %s
+        AND (LOWER(category) LIKE LOWER(%s)
+             OR LOWER(description) LIKE LOWER(%s))
+        ORDER BY date DESC
+        LIMIT %s
+    """, (user_id, pattern, pattern, limit))
+    found = cursor.fetchall()
+    cursor.execute("""
+        SELECT * FROM income
+        WHERE user_id = %s
+        AND (LOWER(source) LIKE LOWER(%s)
+             OR LOWER(description) LIKE LOWER(%s))
+        ORDER BY date DESC
+        LIMIT %s
+    """, (user_id, pattern, pattern, limit))
+    return len(found) + len(cursor.fetchall())
+
+
+def timed(func, repeats: int):
+    samples = []
+    result = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+def deep_page_ms(db, user_id: int, query: str, page: int, repeats: int) -> float:
+    """Время страницы номер page (ключ берётся из предыдущих страниц), nan - если столько нет"""
+    next_args = {}
+    for _ in range(page - 1):
+        next_args = db.search_transactions(user_id, query, **next_args)["next"]
+        if next_args is None:
+            return float("nan")
+    return timed(lambda: db.search_transactions(user_id, query, **next_args), repeats)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="транзакций у пользователя бенчмарка")
+    parser.add_argument("--other-rows", type=int, default=200_000, help="транзакций у остальных пользователей")
+    parser.add_argument("--repeats", type=int, default=7)
+    args = parser.parse_args()
+
+    db = get_database()
+    user_id = BASE_USER_ID
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        cleanup(cursor)
+        seed(user_id, args.rows, cursor)
+        for i in range(1, OTHER_USERS + 1):
+            seed(user_id + i, args.other_rows // OTHER_USERS, cursor)
+        conn.commit()
+        # Строки за прошлые годы попадают в DEFAULT - разносим их по месяцам
+        ensure_partitions(db=db)
+        # Как в рабочей базе после autovacuum: карта видимости и статистика готовы
+        conn.autocommit = True
+        cursor.execute("VACUUM ANALYZE expenses")
+        cursor.execute("VACUUM ANALYZE income")
+        cursor.execute("VACUUM ANALYZE search_terms")
+        conn.autocommit = False
+
+        print(f"user rows={args.rows} other rows={args.other_rows} (median of {args.repeats})")
+        print(f"  {'запрос':<28} {'LIKE, мс':>10} {'найдено':>8} {'trgm, мс':>10} {'найдено':>8} "
+              f"{'стр.2, мс':>10} {'стр.100, мс':>12}")
+        for label, query in QUERIES:
+            legacy_ms, legacy_found = timed(lambda: legacy_search(cursor, user_id, query), args.repeats)
+            conn.rollback()
+            new_ms, page = timed(lambda: db.search_transactions(user_id, query), args.repeats)
+            next_args = page["next"] or {}
+            next_ms, _ = timed(lambda: db.search_transactions(user_id, query, **next_args), args.repeats)
+            new_found = len(page["expenses"]) + len(page["income"])
+            deep_ms = f"{deep_page_ms(db, user_id, query, 100, args.repeats):>12.1f}"
+            print(f"  {label + ' «' + query + '»':<28} {legacy_ms:>10.1f} {legacy_found:>8} "
+                  f"{new_ms:>10.1f} {new_found:>8} {next_ms:>10.1f} {deep_ms}")
+    finally:
+        conn.rollback()
+        cursor = conn.cursor()
+        cleanup(cursor)
+        conn.commit()
+        cursor.close()
+        db.return_connection(conn)
+        db.close_all_connections()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""
+Бенчмарк timeseries.SpendingHistory на историях из 10 000 - 1 000 000 расходов
+
+Для каждого размера строится синтетическая история (12 категорий, суммы с
+логнормальным разбросом, несколько подложенных крупных трат) и считаются
+дневной ряд за год, скользящие 7-дневные среднее и отклонение, необычные
+траты за 30 дней и прогноз на конец месяца - векторно и тем же алгоритмом
+циклом по списку словарей (как строки RealDictCursor). Результаты сверяются.
+
+С --db история того же размера записывается пользователю бенчмарка, и
+сравнивается загрузка: SpendingHistory.load (COPY BINARY в массивы) против
+SELECT * через RealDictCursor.
+
+Запуск (для --db нужен PostgreSQL с применёнными миграциями, параметры из DB_*):
+    python benchmarks/bench_timeseries.py --sizes 10000 100000 1000000
+    python benchmarks/bench_timeseries.py --sizes 10000 100000 --db
+"""
+import argparse
+import calendar
+import math
+import os
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from timeseries import (  # noqa: E402
+    ANOMALY_MIN_COUNT, ANOMALY_MIN_SPREAD, ANOMALY_Z, HISTORY_DAYS, RATE_DAYS, RATE_HALF_LIFE,
+    SpendingHistory, rolling_mean, rolling_std, to_seconds
+)
+
+USER_ID = 990_300_000
+CATEGORIES = [
+    "Еда", "Транспорт", "Покупки", "Здоровье", "Жилье", "Развлечения",
+    "Связь", "Одежда", "Кафе", "Подарки", "Спорт", "Путешествия"
+]
+
+
+def synthetic(rows: int, now: datetime, seed: int = 1) -> SpendingHistory:
+    """История из rows расходов за HISTORY_DAYS дней до now"""
+    rng = np.random.default_rng(seed)
+    end = to_seconds(now)
+    seconds = np.sort(rng.integers(end - HISTORY_DAYS * 86400, end, rows))
+    codes = rng.integers(0, len(CATEGORIES), rows).astype(np.int32)
+    amounts = np.round(rng.lognormal(5 + codes * 0.15, 0.5), 2)
+    # Крупные траты последнего месяца
+    recent = np.flatnonzero(seconds >= end - 30 * 86400)
+    planted = rng.choice(recent, size=min(5, recent.size), replace=False)
+    amounts[planted] *= 40
+    return SpendingHistory(seconds, amounts, codes, CATEGORIES, now)
+
+
+def as_rows(history: SpendingHistory):
+    epoch = datetime(1970, 1, 1)
+    return [
+        {'date': epoch + timedelta(seconds=int(s)), 'amount': float(a), 'category': CATEGORIES[c]}
+        for s, a, c in zip(history.seconds, history.amounts, history.codes)
+    ]
+
+
+# ---- Тот же алгоритм циклами по строкам ----
+
+def loop_daily(rows, now: datetime, days: int):
+    first = now.date() - timedelta(days=days - 1)
+    series = [0.0] * days
+    for row in rows:
+        index = (row['date'].date() - first).days
+        if 0 <= index < days:
+            series[index] += row['amount']
+    return series
+
+
+def loop_rolling(series, window: int):
+    means, stds = [], []
+    for i in range(len(series) - window + 1):
+        chunk = series[i:i + window]
+        mean = sum(chunk) / window
+        means.append(mean)
+        stds.append(math.sqrt(sum((x - mean) ** 2 for x in chunk) / window))
+    return means, stds
+
+
+def loop_anomalies(rows, since: datetime):
+    groups = defaultdict(list)
+    for row in rows:
+        groups[row['category']].append(row['amount'])
+    stats = {}
+    for name, values in groups.items():
+        mean = sum(values) / len(values)
+        stats[name] = (len(values), mean, sum((x - mean) ** 2 for x in values))
+    amounts = [row['amount'] for row in rows]
+    all_mean = sum(amounts) / len(amounts)
+    everything = (len(amounts), all_mean, sum((x - all_mean) ** 2 for x in amounts))
+
+    def without(value, count, mean, m2):
+        others = count - 1
+        if others < 1:
+            return 0.0, 0.0, others
+        delta = value - mean
+        others_mean = mean - delta / others
+        others_m2 = m2 - delta * delta * count / others
+        std = math.sqrt(max(others_m2, 0.0) / (others - 1)) if others > 1 else 0.0
+        return others_mean, std, others
+
+    found = []
+    for row in rows:
+        if row['date'] < since:
+            continue
+        own_mean, own_std, own_others = without(row['amount'], *stats[row['category']])
+        all_mean, all_std, all_others = without(row['amount'], *everything)
+        own = own_others >= ANOMALY_MIN_COUNT
+        baseline = own_mean if own else all_mean
+        spread = max(own_std if own else all_std, baseline * ANOMALY_MIN_SPREAD)
+        if (own or all_others >= ANOMALY_MIN_COUNT) and spread > 0:
+            score = (row['amount'] - baseline) / spread
+            if score >= ANOMALY_Z:
+                found.append((score, row))
+    found.sort(key=lambda item: -item[0])
+    return [row for _, row in found]
+
+
+def loop_projection(rows, now: datetime):
+    days_in_month = calendar.monthrange(now.year, now.month)[1]
+    days_passed = now.day
+    series = loop_daily(rows, now, max(RATE_DAYS + 1, days_passed))
+    spent = sum(series[-days_passed:])
+    rate_days = min(RATE_DAYS, (now.date() - rows[0]['date'].date()).days)
+    window = series[-rate_days - 1:-1]
+    weights = [0.5 ** ((rate_days - 1 - i) / RATE_HALF_LIFE) for i in range(rate_days)]
+    rate = sum(w * x for w, x in zip(weights, window)) / sum(weights)
+    return spent + rate * (days_in_month - days_passed)
+
+
+def timed(func, repeats: int):
+    samples = []
+    result = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+def bench_compute(rows: int, now: datetime, repeats: int):
+    history = synthetic(rows, now)
+    records = as_rows(history)
+    since = now - timedelta(days=30)
+    loop_repeats = max(1, repeats // 3) if rows >= 1_000_000 else repeats
+
+    cases = [
+        ("дневной ряд, 365 дн.",
+         lambda: history.daily_series(365),
+         lambda: loop_daily(records, now, 365),
+         lambda a, b: np.allclose(a, b)),
+        ("скользящие 7 дн.",
+         lambda: (rolling_mean(history.daily_series(365), 7), rolling_std(history.daily_series(365), 7)),
+         lambda: loop_rolling(loop_daily(records, now, 365), 7),
+         lambda a, b: np.allclose(a[0], b[0]) and np.allclose(a[1], b[1])),
+        ("необычные траты",
+         lambda: history.anomalies(since),
+         lambda: loop_anomalies(records, since),
+         lambda a, b: [x['amount'] for x in a] == [x['amount'] for x in b]),
+        ("прогноз на месяц",
+         lambda: history.month_end_projection(),
+         lambda: loop_projection(records, now),
+         lambda a, b: math.isclose(a['predicted_total'], b, rel_tol=1e-9)),
+    ]
+    print(f"rows={rows:,} (median of {repeats}, loops: {loop_repeats})")
+    print(f"  {'расчёт':<22} {'NumPy, мс':>10} {'цикл, мс':>10} {'ускорение':>10} {'совпадает':>10}")
+    for label, vectorized, loop, same in cases:
+        numpy_ms, numpy_result = timed(vectorized, repeats)
+        loop_ms, loop_result = timed(loop, loop_repeats)
+        print(f"  {label:<22} {numpy_ms:>10.2f} {loop_ms:>10.1f} "
+              f"{loop_ms / max(numpy_ms, 1e-6):>9.0f}x {str(same(numpy_result, loop_result)):>10}")
+
+
+def bench_load(rows: int, repeats: int):
+    from database import get_database
+    from psycopg2.extras import RealDictCursor
+
+    db = get_database()
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        cleanup(cursor)
+        cursor.execute("INSERT INTO users (user_id, username) VALUES (%s, 'bench')", (USER_ID,))
+        cursor.execute("""
+            INSERT INTO expenses (user_id, amount, category, date)
+            SELECT %s, round((exp(5 + random() * 2))::numeric, 2),
+                   (%s::text[])[1 + g %% array_length(%s::text[], 1)],
+                   now() - random() * %s * interval '1 day'
+            FROM generate_series(1, %s) AS g
+        """, (USER_ID, CATEGORIES, CATEGORIES, HISTORY_DAYS - 1, rows))
+        # Строки вставлены в обход Database, дневные итоги считаются как в миграции 0002
+        cursor.execute("""
+            INSERT INTO daily_totals (user_id, day, kind, category, total, count)
+            SELECT user_id, date::date, 'expense', category, SUM(amount), COUNT(*)
+            FROM expenses WHERE user_id = %s
+            GROUP BY user_id, date::date, category
+        """, (USER_ID,))
+        conn.commit()
+        conn.autocommit = True
+        cursor.execute("VACUUM ANALYZE expenses")
+        cursor.execute("VACUUM ANALYZE daily_totals")
+        conn.autocommit = False
+
+        def select_rows():
+            dict_cursor = conn.cursor(cursor_factory=RealDictCursor)
+            dict_cursor.execute("SELECT * FROM expenses WHERE user_id = %s ORDER BY date", (USER_ID,))
+            result = dict_cursor.fetchall()
+            dict_cursor.close()
+            conn.rollback()
+            return len(result)
+
+        select_ms, selected = timed(select_rows, repeats)
+        load_ms, history = timed(lambda: SpendingHistory.load(USER_ID), repeats)
+        print(f"  загрузка из БД: SELECT * {select_ms:.1f} мс ({selected:,} строк), "
+              f"COPY -> NumPy {load_ms:.1f} мс ({len(history):,} строк, "
+              f"{history.seconds.nbytes + history.amounts.nbytes + history.codes.nbytes:,} байт)")
+    finally:
+        conn.rollback()
+        cursor = conn.cursor()
+        cleanup(cursor)
+        conn.commit()
+        cursor.close()
+        db.return_connection(conn)
+
+
+def cleanup(cursor):
+    for table in ("expenses", "daily_totals"):
+        cursor.execute(f"DELETE FROM {table} WHERE user_id = %s", (USER_ID,))
+    cursor.execute("DELETE FROM users WHERE user_id = %s", (USER_ID,))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--db", action="store_true", help="также замерить загрузку из PostgreSQL")
+    args = parser.parse_args()
+
+    now = datetime.now().replace(microsecond=0)
+    for rows in args.sizes:
+        bench_compute(rows, now, args.repeats)
+        if args.db:
+            bench_load(rows, args.repeats)
+    if args.db:
+        from database import get_database
+        get_database().close_all_connections()
+
+
+if __name__ == '__main__':
+    main()
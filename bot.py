@@ -1,4 +1,21 @@
+"""
+Запуск бота
+
+python bot.py - обычный запуск (polling).
+python bot.py --profile-startup - время импорта модулей, проверки схемы и
+регистрации обработчиков и число соединений с БД после запуска, без polling.
+Тяжёлые библиотеки (matplotlib, openpyxl, reportlab, NumPy) при запуске не
+загружаются: диаграммы импортируют их в процессах пула, экспорт и аналитика -
+при первом вызове.
+"""
+import argparse
+import json
 import logging
+import os
+import subprocess
+import sys
+import time
+from typing import Dict
 from telegram import Update
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, CallbackQueryHandler,
@@ -6,6 +23,14 @@ from telegram.ext import (
 )
 from config import BOT_TOKEN
 from config import WAITING_FOR_BULK_DATA, WAITING_FOR_BULK_TYPE
+from database import get_database
+from async_db import get_async_database, shutdown_executor
+from chart_service import get_chart_stats, shutdown_chart_service, start_chart_service
+from migrate import check_schema_version, SchemaVersionError
+from partitions import start_partition_maintenance
+from cache import get_cache_stats
+from cache_sync import start_cache_sync, stop_cache_sync, get_cache_sync_stats
+from subscription import start_premium_sweeper
 
 from handlers.common import start, cancel
 from handlers.expenses import (
@@ -17,7 +42,7 @@ from handlers.income import (
     delete_income_callback, income_page_callback
 )
 from handlers.bulk import bulk_add_handler, bulk_delete_handler
-from handlers.search import search_handler
+from handlers.search import search_handler, search_more_callback
 from handlers.statistics import (
     show_statistics_menu, show_last_3_days, show_export_menu,
     show_pdf_export_menu, show_statistics, handle_export,
@@ -75,13 +100,25 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-def main():
-    if not BOT_TOKEN:
-        print("❌ ОШИБКА: Не найден BOT_TOKEN в переменных окружения!")
-        print("Создай файл .env и добавь туда: BOT_TOKEN=твой_токен_бота")
-        return
-    
-    application = Application.builder().token(BOT_TOKEN).build()
+async def on_startup(application: Application):
+    """Фоновые задачи: секции наперёд, сброс кэшей между процессами, истёкший Premium, пул диаграмм"""
+    await get_async_database().open()
+    start_partition_maintenance()
+    start_cache_sync()
+    start_premium_sweeper()
+    start_chart_service()
+
+
+async def on_shutdown(application: Application):
+    """Закрыть асинхронный пул БД в том же event loop, где он работал"""
+    async_database = get_async_database()
+    logger.info(f"Async DB pool stats: {async_database.get_pool_stats()}")
+    await async_database.close()
+
+
+def build_application(token: str) -> Application:
+    """Приложение со всеми обработчиками (без запуска polling)"""
+    application = Application.builder().token(token).post_init(on_startup).post_shutdown(on_shutdown).build()
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", start))
@@ -146,6 +183,7 @@ def main():
     application.add_handler(bulk_add_handler)
     application.add_handler(bulk_delete_handler)
     application.add_handler(search_handler)
+    application.add_handler(search_more_callback)
     application.add_handler(MessageHandler(filters.Regex("^💡 Умные советы$"), show_smart_tips))
     application.add_handler(MessageHandler(filters.Regex("^🏆 Достижения$"), show_achievements))
     application.add_handler(MessageHandler(filters.Regex("^📊 Сравнить месяцы$"), show_period_comparison))
@@ -171,11 +209,131 @@ def main():
     application.add_handler(CallbackQueryHandler(chart_period_selected, pattern="^chart_period_"))
     application.add_handler(chart_filters_conversation)
     application.add_handler(CallbackQueryHandler(chart_filtered_type_selected, pattern="^chart_filtered_"))
+    return application
+
+
+# Тяжёлые библиотеки, которых не должно быть в процессе бота после запуска
+HEAVY_MODULES = ('matplotlib', 'openpyxl', 'reportlab', 'numpy')
+
+
+def _startup_probe():
+    """
+    Замер в дочернем процессе profile_startup (после import bot)
+
+    Печатает JSON: время проверки схемы и регистрации обработчиков, число
+    открытых соединений пула, загруженные тяжёлые библиотеки.
+    """
+    result = {}
+    started = time.perf_counter()
+    try:
+        check_schema_version()
+    except Exception as e:
+        result['schema_error'] = str(e)
+    result['schema_ms'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    build_application(BOT_TOKEN or "0:profile")
+    result['handlers_ms'] = (time.perf_counter() - started) * 1000
+
+    pool = get_database().get_pool_stats()
+    result['connections'] = pool['idle'] + pool['in_use']
+    result['heavy_modules'] = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(json.dumps(result))
+
+
+def _parse_importtime(output: str) -> Dict[str, float]:
+    """Накопительное время импорта (мс) по модулям из вывода python -X importtime"""
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative) / 1000
+    return times
+
+
+def profile_startup(top: int = 15):
+    """
+    Отчёт о запуске: python -X importtime в отдельном процессе
+
+    Модули бота и сторонние пакеты верхнего уровня по накопительному времени
+    импорта, затем замеры _startup_probe.
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import bot; bot._startup_probe()"],
+        capture_output=True, text=True, cwd=root
+    )
+    if completed.returncode != 0:
+        print(completed.stderr)
+        return
+    times = _parse_importtime(completed.stderr)
+    probe = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    own = {
+        name: ms for name, ms in times.items()
+        if os.path.exists(os.path.join(root, name.split('.')[0] + ".py"))
+        or os.path.isdir(os.path.join(root, name.split('.')[0]))
+    }
+    external = {
+        name: ms for name, ms in times.items()
+        if '.' not in name and name not in own and not name.startswith('_')
+    }
+
+    print(f"Импорт bot: {times.get('bot', 0.0):.0f} мс, модулей: {len(times)}")
+    print("\nМодули бота (накопительно, мс):")
+    for name, ms in sorted(own.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {ms:8.1f}  {name}")
+    print("\nОстальные пакеты верхнего уровня (накопительно, мс):")
+    for name, ms in sorted(external.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {ms:8.1f}  {name}")
+
+    print()
+    if 'schema_error' in probe:
+        print(f"Проверка схемы: ошибка ({probe['schema_error']})")
+    print(f"Проверка схемы: {probe['schema_ms']:.0f} мс")
+    print(f"Регистрация обработчиков: {probe['handlers_ms']:.0f} мс")
+    print(f"Соединений с БД после запуска: {probe['connections']}")
+    print(f"Тяжёлые библиотеки загружены: {', '.join(probe['heavy_modules']) or 'нет'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="показать время запуска по модулям и выйти")
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        profile_startup()
+        return
+
+    if not BOT_TOKEN:
+        print("❌ ОШИБКА: Не найден BOT_TOKEN в переменных окружения!")
+        print("Создай файл .env и добавь туда: BOT_TOKEN=твой_токен_бота")
+        return
+
+    try:
+        check_schema_version()
+    except SchemaVersionError as e:
+        print(f"❌ ОШИБКА: {e}")
+        return
+    
+    application = build_application(BOT_TOKEN)
     
     print("=" * 80)
     print("✅ Бот успешно запущен!")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
 
+    logger.info(f"Chart stats: {get_chart_stats()}")
+    shutdown_chart_service()
+    shutdown_executor()
+    stop_cache_sync()
+    db = get_database()
+    logger.info(f"DB pool stats: {db.get_pool_stats()}")
+    logger.info(f"Cache stats: {get_cache_stats()}")
+    logger.info(f"Cache sync stats: {get_cache_sync_stats()}")
+    db.close_all_connections()
+
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,9 +1,35 @@
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
 from typing import Dict, List, Optional
-from database import Database
+from database import get_database
+from periods import Period
+from async_db import AsyncProxy
+from cache import budgets_cache
 
-db = Database()
+db = get_database()
+
+
+def budget_alert(category: str, limit_amount: float, spent: float) -> Optional[Dict]:
+    """Предупреждение по бюджету: превышен (>= 100%) или почти исчерпан (>= 80%)"""
+    percent_used = (spent / limit_amount * 100) if limit_amount > 0 else 0
+    if percent_used >= 100:
+        return {
+            'type': 'exceeded',
+            'category': category,
+            'limit': limit_amount,
+            'spent': spent,
+            'over': spent - limit_amount
+        }
+    if percent_used >= 80:
+        return {
+            'type': 'warning',
+            'category': category,
+            'limit': limit_amount,
+            'spent': spent,
+            'remaining': limit_amount - spent,
+            'percent': percent_used
+        }
+    return None
 
 
 class BudgetManager:
@@ -21,6 +47,7 @@ class BudgetManager:
             ''', (user_id, category, amount, period, amount))
             
             conn.commit()
+            budgets_cache.invalidate(user_id)
             return True
         except Exception as e:
             conn.rollback()
@@ -32,6 +59,24 @@ class BudgetManager:
     
     def get_budgets(self, user_id: int) -> List[Dict]:
         """Получить все бюджеты пользователя"""
+        # Кэшируются только лимиты, потраченное считается на каждый вызов
+        budgets = budgets_cache.get_or_load(user_id, lambda: self._load_budgets(user_id))
+        if not budgets:
+            return budgets
+        
+        # Потраченное - за текущий календарный период бюджета (день, неделя с
+        # понедельника, месяц), все периоды одним запросом
+        periods = {budget['period']: Period.for_budget(budget['period']) for budget in budgets}
+        stats = db.get_window_summaries(user_id, periods)
+        for budget in budgets:
+            spent = stats[budget['period']]['expenses_by_category'].get(budget['category'], 0)
+            budget['spent'] = spent
+            budget['remaining'] = budget['limit_amount'] - spent
+            budget['percent_used'] = (spent / budget['limit_amount'] * 100) if budget['limit_amount'] > 0 else 0
+        
+        return budgets
+    
+    def _load_budgets(self, user_id: int) -> List[Dict]:
         conn = db.get_connection()
         try:
             cursor = conn.cursor(cursor_factory=RealDictCursor)
@@ -42,16 +87,7 @@ class BudgetManager:
                 ORDER BY category
             ''', (user_id,))
             
-            budgets = [dict(row) for row in cursor.fetchall()]
-            
-            stats = db.get_statistics(user_id, 30)
-            for budget in budgets:
-                spent = stats['expenses_by_category'].get(budget['category'], 0)
-                budget['spent'] = spent
-                budget['remaining'] = budget['limit_amount'] - spent
-                budget['percent_used'] = (spent / budget['limit_amount'] * 100) if budget['limit_amount'] > 0 else 0
-            
-            return budgets
+            return [dict(row) for row in cursor.fetchall()]
         finally:
             cursor.close()
             db.return_connection(conn)
@@ -68,6 +104,7 @@ class BudgetManager:
             ''', (user_id, category))
             
             conn.commit()
+            budgets_cache.invalidate(user_id)
             deleted = cursor.rowcount > 0
             return deleted
         finally:
@@ -80,23 +117,7 @@ class BudgetManager:
         
         for budget in budgets:
             if budget['category'].lower() == category.lower():
-                if budget['percent_used'] >= 100:
-                    return {
-                        'type': 'exceeded',
-                        'category': category,
-                        'limit': budget['limit_amount'],
-                        'spent': budget['spent'],
-                        'over': budget['spent'] - budget['limit_amount']
-                    }
-                elif budget['percent_used'] >= 80:
-                    return {
-                        'type': 'warning',
-                        'category': category,
-                        'limit': budget['limit_amount'],
-                        'spent': budget['spent'],
-                        'remaining': budget['remaining'],
-                        'percent': budget['percent_used']
-                    }
+                return budget_alert(category, budget['limit_amount'], budget['spent'])
         
         return None
     
@@ -122,4 +143,5 @@ class BudgetManager:
         }
 
 
-budget_manager = BudgetManager()
\ No newline at end of file
+budget_manager = BudgetManager()
+async_budget_manager = AsyncProxy(budget_manager)
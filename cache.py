@@ -0,0 +1,171 @@
+"""
+Кэш часто читаемых данных пользователя в памяти процесса
+
+Баланс, подписка, фильтры категорий, пользовательские категории, настройки
+уведомлений и лимиты бюджетов читаются почти на каждое сообщение, а меняются только записью
+самого пользователя. Каждый такой набор лежит в своём TTLCache: LRU с
+ограничением размера (CACHE_MAX_ENTRIES) и временем жизни записи (CACHE_TTL,
+секунды) - TTL страхует от изменений в обход менеджеров (ручные правки в БД,
+другие процессы).
+
+Методы записи сбрасывают ключ после commit. Загрузка, начатая до сброса,
+результат в кэш не кладёт, поэтому после своей записи пользователь никогда
+не увидит старые данные. Сброс передаётся остальным процессам бота через
+cache_sync (LISTEN/NOTIFY), чужие сбросы применяются через evict().
+"""
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+class _Load:
+    """Загрузка значения из БД, которая ещё не завершилась"""
+    __slots__ = ("stale",)
+
+    def __init__(self):
+        self.stale = False
+
+
+class TTLCache:
+    """Потокобезопасный LRU-кэш с TTL и счётчиками попаданий/промахов"""
+
+    def __init__(self, name: str, max_entries: int = None, ttl: float = None):
+        self.name = name
+        self.max_entries = max_entries or int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("CACHE_TTL", "300"))
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._loads: Dict[Hashable, List[_Load]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Вернуть копию значения из кэша или загрузить его через loader()"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            self.misses += 1
+            load = _Load()
+            self._loads.setdefault(key, []).append(load)
+
+        try:
+            value = loader()
+        finally:
+            with self._lock:
+                loads = self._loads[key]
+                loads.remove(load)
+                if not loads:
+                    del self._loads[key]
+
+        with self._lock:
+            if not load.stale and self.ttl > 0:
+                self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        """Записать известное после commit значение без повторной загрузки из БД"""
+        with self._lock:
+            for load in self._loads.get(key, ()):
+                load.stale = True
+            if self.ttl > 0:
+                self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Сбросить ключ; вызывать после commit записи"""
+        self.evict(key)
+        if _on_invalidate is not None:
+            _on_invalidate(self.name, key)
+
+    def evict(self, key: Hashable):
+        """Сбросить ключ только в этом процессе (сброс, пришедший от другого процесса)"""
+        with self._lock:
+            self._entries.pop(key, None)
+            for load in self._loads.get(key, ()):
+                load.stale = True
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for loads in self._loads.values():
+                for load in loads:
+                    load.stale = True
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+# Вызывается при каждом invalidate(cache_name, key); ставит cache_sync
+_on_invalidate: Optional[Callable[[str, Hashable], None]] = None
+
+
+def set_invalidation_hook(hook: Optional[Callable[[str, Hashable], None]]):
+    global _on_invalidate
+    _on_invalidate = hook
+
+
+balance_cache = TTLCache("balance")
+subscription_cache = TTLCache("subscription")
+filters_cache = TTLCache("category_filters")
+categories_cache = TTLCache("custom_categories")
+settings_cache = TTLCache("notification_settings")
+budgets_cache = TTLCache("budgets")
+# user_id -> premium_until: Premium проверяется по этой карте без запросов к БД.
+# Срок действия сравнивается с текущим временем на каждой проверке, поэтому
+# запись живёт долго (PREMIUM_MAP_TTL) и меняется только покупкой Premium.
+premium_cache = TTLCache("premium", ttl=float(os.getenv("PREMIUM_MAP_TTL", "86400")))
+# user_id -> {хэш данных диаграммы: file_id фото в Telegram} (см. chart_service).
+# Ключ - хэш содержимого, поэтому устаревшей записи не бывает; сброс при
+# изменении операций только освобождает память.
+chart_cache = TTLCache("charts", ttl=float(os.getenv("CHART_CACHE_TTL", "86400")))
+
+_CACHES = (
+    balance_cache, subscription_cache, filters_cache, categories_cache, settings_cache,
+    budgets_cache, premium_cache, chart_cache
+)
+
+
+def get_cache(name: str) -> Optional[TTLCache]:
+    for cache in _CACHES:
+        if cache.name == name:
+            return cache
+    return None
+
+
+def get_cache_stats() -> List[Dict]:
+    """Статистика всех кэшей (размер, попадания, промахи, вытеснения)"""
+    return [cache.stats() for cache in _CACHES]
+
+
+def clear_caches():
+    for cache in _CACHES:
+        cache.clear()
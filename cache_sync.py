@@ -0,0 +1,286 @@
+"""
+Сброс кэшей между процессами бота через PostgreSQL LISTEN/NOTIFY
+
+Каждый процесс держит свой кэш (cache.py). Когда запись обрабатывает другой
+процесс, локальный кэш об этом не знает, поэтому каждый TTLCache.invalidate()
+ещё и публикуется в канал CACHE_SYNC_CHANNEL, а все процессы слушают его и
+сбрасывают у себя те же ключи.
+
+Публикация не блокирует запись: событие кладётся в очередь, фоновый поток
+пачкой отправляет его через pg_notify. Уведомление компактное:
+    {"o": процесс, "s": номер, "t": время сброса, "e": [[кэш, ключ], ...]}
+По номеру получатель видит пропуски. Если сбросы потерялись (переполнилась
+очередь у отправителя - тогда он шлёт {"r": 1}, оборвалось соединение),
+процесс очищает свои кэши целиком: старые данные хуже лишнего промаха.
+
+Задержка доставки и потери видны в get_cache_sync_stats().
+"""
+import json
+import logging
+import os
+import queue
+import select
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, Hashable, List, Optional
+
+import psycopg2
+from psycopg2 import sql
+
+from cache import clear_caches, get_cache, set_invalidation_hook
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = os.getenv("CACHE_SYNC_CHANNEL", "cache_invalidation")
+QUEUE_SIZE = int(os.getenv("CACHE_SYNC_QUEUE", "10000"))
+# Лимит payload у NOTIFY - 8000 байт
+MAX_PAYLOAD = 7900
+RECONNECT_DELAY = 5
+
+
+def _decode_key(key) -> Hashable:
+    # JSON превращает составные ключи (user_id, type) в списки
+    return tuple(key) if isinstance(key, list) else key
+
+
+class CacheSync:
+    """Публикация своих сбросов кэша и применение чужих"""
+
+    def __init__(self, channel: str = CHANNEL, queue_size: int = QUEUE_SIZE):
+        self.channel = channel
+        self.origin = uuid.uuid4().hex[:12]
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._seq = 0
+        self._overflow = False
+        self._last_seq: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'connected': False,
+            'published_events': 0,
+            'published_notifies': 0,
+            'received_notifies': 0,
+            'received_events': 0,
+            'lag_ms_last': 0.0,
+            'lag_ms_max': 0.0,
+            'lag_ms_total': 0.0,
+            'dropped_queue_full': 0,
+            'dropped_publish_errors': 0,
+            'dropped_remote': 0,
+            'resyncs': 0,
+            'reconnects': 0
+        }
+
+    def publish(self, cache_name: str, key: Hashable):
+        """Хук cache.set_invalidation_hook: поставить сброс в очередь на отправку"""
+        try:
+            self._queue.put_nowait((cache_name, key, time.time()))
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped_queue_full'] += 1
+                self._overflow = True
+            return
+        try:
+            self._wake_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass  # поток и так проснётся: в сокете уже есть байты
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        set_invalidation_hook(self.publish)
+        self._thread = threading.Thread(target=self._run, name="cache-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        """Отправить то, что осталось в очереди, и остановить поток"""
+        set_invalidation_hook(None)
+        self._stop.set()
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        db = get_database()
+        first = True
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**db.connection_params())
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.channel)))
+                with self._lock:
+                    self._stats['connected'] = True
+                    if not first:
+                        self._stats['reconnects'] += 1
+                if not first:
+                    # Пока соединения не было, чужие сбросы не приходили
+                    self._resync()
+                first = False
+                self._serve(conn)
+            except Exception as e:
+                logger.warning(f"Cache sync connection lost: {e}")
+            finally:
+                with self._lock:
+                    self._stats['connected'] = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            if not self._stop.is_set():
+                self._stop.wait(RECONNECT_DELAY)
+
+    def _serve(self, conn):
+        while True:
+            stopping = self._stop.is_set()
+            self._flush(conn)
+            if stopping:
+                return
+            ready, _, _ = select.select([conn, self._wake_r], [], [], 1.0)
+            if self._wake_r in ready:
+                try:
+                    while self._wake_r.recv(4096):
+                        pass
+                except BlockingIOError:
+                    pass
+            conn.poll()
+            while conn.notifies:
+                self._receive(conn.notifies.pop(0))
+
+    def _flush(self, conn):
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            overflow, self._overflow = self._overflow, False
+        if not events and not overflow:
+            return
+
+        # [(время первого сброса, события)], каждая пачка укладывается в MAX_PAYLOAD
+        batches: List[List] = []
+        size = MAX_PAYLOAD
+        for name, key, invalidated_at in events:
+            event = [name, list(key) if isinstance(key, tuple) else key]
+            event_size = len(json.dumps(event, ensure_ascii=False).encode()) + 1
+            if size + event_size > MAX_PAYLOAD - 80:
+                batches.append([invalidated_at, []])
+                size = 0
+            batches[-1][1].append(event)
+            size += event_size
+        if overflow:
+            # Часть сбросов не попала в очередь: пусть получатели очистят всё
+            batches.append([time.time(), None])
+
+        with conn.cursor() as cursor:
+            for i, (invalidated_at, batch) in enumerate(batches):
+                self._seq += 1
+                message = {'o': self.origin, 's': self._seq, 't': round(invalidated_at, 4)}
+                if batch is None:
+                    message['r'] = 1
+                else:
+                    message['e'] = batch
+                payload = json.dumps(message, ensure_ascii=False, separators=(',', ':'))
+                try:
+                    cursor.execute("SELECT pg_notify(%s, %s)", (self.channel, payload))
+                except Exception:
+                    # Номер уже занят: получатели увидят пропуск и сбросят кэши
+                    with self._lock:
+                        self._stats['dropped_publish_errors'] += sum(len(b or ()) for _, b in batches[i:])
+                    raise
+                with self._lock:
+                    self._stats['published_notifies'] += 1
+                    self._stats['published_events'] += len(batch or ())
+
+    def _receive(self, notify):
+        try:
+            message = json.loads(notify.payload)
+            origin, seq, sent_at = message['o'], message['s'], message['t']
+            events = message.get('e', ())
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Bad cache sync payload: {notify.payload[:200]}")
+            return
+        if origin == self.origin:
+            return
+
+        lag_ms = max(0.0, (time.time() - sent_at) * 1000)
+        last = self._last_seq.get(origin)
+        self._last_seq[origin] = seq
+        with self._lock:
+            self._stats['received_notifies'] += 1
+            self._stats['received_events'] += len(events)
+            self._stats['lag_ms_last'] = lag_ms
+            self._stats['lag_ms_max'] = max(self._stats['lag_ms_max'], lag_ms)
+            self._stats['lag_ms_total'] += lag_ms
+            if last is not None and seq > last + 1:
+                self._stats['dropped_remote'] += seq - last - 1
+
+        if message.get('r') or (last is not None and seq > last + 1):
+            self._resync()
+            return
+        for name, key in events:
+            cache = get_cache(name)
+            if cache is not None:
+                cache.evict(_decode_key(key))
+
+    def _resync(self):
+        """Часть сбросов потеряна - очистить все кэши процесса"""
+        clear_caches()
+        with self._lock:
+            self._stats['resyncs'] += 1
+        logger.warning("Cache sync: invalidations were lost, local caches cleared")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        received = stats.pop('received_notifies')
+        lag_total = stats.pop('lag_ms_total')
+        stats['received_notifies'] = received
+        stats['lag_ms_avg'] = lag_total / received if received else 0.0
+        stats['queued'] = self._queue.qsize()
+        stats['dropped_events'] = (
+            stats['dropped_queue_full'] + stats['dropped_publish_errors'] + stats['dropped_remote']
+        )
+        return stats
+
+
+_cache_sync: Optional[CacheSync] = None
+
+
+def start_cache_sync() -> Optional[CacheSync]:
+    """Включить обмен сбросами кэша (один раз на процесс; CACHE_SYNC=0 - выключить)"""
+    global _cache_sync
+    if os.getenv("CACHE_SYNC", "1") == "0":
+        return None
+    if _cache_sync is None:
+        _cache_sync = CacheSync()
+    _cache_sync.start()
+    return _cache_sync
+
+
+def stop_cache_sync():
+    if _cache_sync is not None:
+        _cache_sync.stop()
+
+
+def get_cache_sync_stats() -> Dict:
+    """Задержка доставки, число отправленных/полученных и потерянных сбросов"""
+    if _cache_sync is None:
+        return {'enabled': False}
+    return {'enabled': True, **_cache_sync.get_stats()}
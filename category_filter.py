@@ -1,8 +1,10 @@
 from psycopg2.extras import RealDictCursor
 from typing import List, Dict
-from database import Database
+from database import get_database
+from async_db import AsyncProxy
+from cache import filters_cache
 
-db = Database()
+db = get_database()
 
 
 class CategoryFilter:
@@ -24,6 +26,7 @@ class CategoryFilter:
             ''', (user_id, category, 1 if is_excluded else 0, filter_type, 1 if is_excluded else 0))
             
             conn.commit()
+            filters_cache.invalidate(user_id)
             return True
         except Exception as e:
             conn.rollback()
@@ -45,6 +48,7 @@ class CategoryFilter:
             ''', (user_id, category, filter_type))
             
             conn.commit()
+            filters_cache.invalidate(user_id)
             deleted = cursor.rowcount > 0
             return deleted
         finally:
@@ -53,40 +57,17 @@ class CategoryFilter:
     
     def get_excluded_categories(self, user_id: int, filter_type: str = 'expense') -> List[str]:
         """Получить список исключенных категорий"""
-        conn = db.get_connection()
-        try:
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT category FROM category_filters
-                WHERE user_id = %s AND filter_type = %s AND is_excluded = 1
-            ''', (user_id, filter_type))
-            
-            categories = [row[0] for row in cursor.fetchall()]
-            return categories
-        finally:
-            cursor.close()
-            db.return_connection(conn)
+        return self.get_all_filters(user_id).get(f"{filter_type}_excluded", [])
     
     def get_included_categories(self, user_id: int, filter_type: str = 'expense') -> List[str]:
         """Получить список включенных категорий (только они учитываются)"""
-        conn = db.get_connection()
-        try:
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT category FROM category_filters
-                WHERE user_id = %s AND filter_type = %s AND is_excluded = 0
-            ''', (user_id, filter_type))
-            
-            categories = [row[0] for row in cursor.fetchall()]
-            return categories
-        finally:
-            cursor.close()
-            db.return_connection(conn)
+        return self.get_all_filters(user_id).get(f"{filter_type}_included", [])
     
     def get_all_filters(self, user_id: int) -> Dict:
-        """Получить все фильтры пользователя"""
+        """Получить все фильтры пользователя (кэшируются до изменения фильтров)"""
+        return filters_cache.get_or_load(user_id, lambda: self._load_filters(user_id))
+    
+    def _load_filters(self, user_id: int) -> Dict:
         conn = db.get_connection()
         try:
             cursor = conn.cursor(cursor_factory=RealDictCursor)
@@ -128,6 +109,7 @@ class CategoryFilter:
             ''', (user_id,))
             
             conn.commit()
+            filters_cache.invalidate(user_id)
             deleted = cursor.rowcount > 0
             return deleted
         finally:
@@ -146,8 +128,9 @@ class CategoryFilter:
         Returns:
             Отфильтрованный словарь
         """
-        excluded = self.get_excluded_categories(user_id, filter_type)
-        included = self.get_included_categories(user_id, filter_type)
+        filters = self.get_all_filters(user_id)
+        excluded = filters.get(f"{filter_type}_excluded", [])
+        included = filters.get(f"{filter_type}_included", [])
         
         if included:
             return {k: v for k, v in data.items() if k in included}
@@ -158,4 +141,5 @@ class CategoryFilter:
         return data
 
 
-category_filter = CategoryFilter()
\ No newline at end of file
+category_filter = CategoryFilter()
+async_category_filter = AsyncProxy(category_filter)
@@ -0,0 +1,264 @@
+"""
+Построение диаграмм в пуле процессов
+
+matplotlib держит GIL на всё время отрисовки, поэтому диаграммы строятся не в
+потоках event loop, а в отдельных процессах (CHART_WORKERS, по умолчанию до 2).
+Функции charts/charts_improved возвращают PNG в памяти, bytes сразу уходят в
+reply_photo. Обработчики передают функцию по имени ("charts.create_statistics_chart"):
+её модуль импортируется только в процессе пула, и бот не загружает matplotlib.
+
+Очередь ограничена: не больше CHART_QUEUE_LIMIT диаграмм одновременно на
+процесс бота и не больше CHART_USER_LIMIT на пользователя. Сверх лимита
+render_chart выбрасывает ChartBusyError - пользователь, нажимающий кнопки
+подряд, не занимает пул за всех. Глубина очереди и время построения - в
+get_chart_stats().
+
+reply_chart отправляет диаграмму и запоминает file_id фото в Telegram по
+хэшу функции и её аргументов (данных диаграммы) и CHART_STYLE_VERSION.
+Такая же диаграмма потом уходит по file_id - без построения и загрузки.
+"""
+import asyncio
+import functools
+import hashlib
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional, Union
+
+from cache import chart_cache
+
+logger = logging.getLogger(__name__)
+
+# Увеличить при изменении внешнего вида диаграмм: старые file_id перестанут совпадать
+CHART_STYLE_VERSION = 1
+# Сколько разных диаграмм на пользователя помнить (самые давние вытесняются)
+CHART_CACHE_PER_USER = int(os.getenv("CHART_CACHE_PER_USER", "32"))
+
+
+class ChartBusyError(RuntimeError):
+    """Диаграмму сейчас не построить: у пользователя или у бота занята очередь"""
+
+    def __init__(self, user_limit: bool):
+        super().__init__("user chart limit reached" if user_limit else "chart queue is full")
+        self.user_limit = user_limit
+
+    @property
+    def text(self) -> str:
+        """Сообщение пользователю"""
+        if self.user_limit:
+            return "⏳ Предыдущая диаграмма ещё строится, подожди пару секунд."
+        return "⏳ Сейчас строится много диаграмм, попробуй через минуту."
+
+
+def _warm_up():
+    """Импорт matplotlib в процессе пула заранее, а не на первой диаграмме"""
+    import charts_improved  # noqa: F401
+    return os.getpid()
+
+
+def _call_chart(name: str, args, kwargs):
+    """Вызвать функцию диаграммы по имени "модуль.функция" (в процессе пула)"""
+    module, _, func = name.rpartition('.')
+    return getattr(importlib.import_module(module), func)(*args, **kwargs)
+
+
+def _chart_name(func: Union[str, Callable]) -> str:
+    return func if isinstance(func, str) else f"{func.__module__}.{func.__qualname__}"
+
+
+class ChartRenderer:
+    """
+    Пул процессов для диаграмм с лимитами очереди
+
+    Счётчики меняются только из event loop, поэтому обходятся без блокировок.
+    """
+
+    def __init__(self, workers: int = None, queue_limit: int = None, user_limit: int = None):
+        self.workers = workers or int(os.getenv("CHART_WORKERS", min(2, os.cpu_count() or 1)))
+        self.queue_limit = queue_limit or int(os.getenv("CHART_QUEUE_LIMIT", "16"))
+        self.user_limit = user_limit or int(os.getenv("CHART_USER_LIMIT", "1"))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+        self._per_user: Dict[int, int] = {}
+        self._latencies = deque(maxlen=500)
+        self._stats = {
+            'rendered': 0,
+            'failed': 0,
+            'rejected_user': 0,
+            'rejected_queue': 0,
+            'pool_restarts': 0,
+            'file_id_hits': 0,
+            'file_id_misses': 0
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: процессы не наследуют потоки и соединения с БД родителя
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def start(self):
+        """Запустить процессы пула (в on_startup, чтобы первая диаграмма не ждала запуска)"""
+        executor = self._get_executor()
+        for _ in range(self.workers):
+            executor.submit(_warm_up)
+
+    async def render(self, user_id: int, func: Union[str, Callable], *args, **kwargs):
+        """
+        Выполнить func(*args, **kwargs) в пуле и вернуть результат (PNG или None)
+
+        func - имя "модуль.функция" или сама функция уровня модуля; аргументы
+        передаются в процесс через pickle (обычные словари/строки).
+        """
+        if self._per_user.get(user_id, 0) >= self.user_limit:
+            self._stats['rejected_user'] += 1
+            raise ChartBusyError(user_limit=True)
+        if self._in_flight >= self.queue_limit:
+            self._stats['rejected_queue'] += 1
+            logger.warning(f"Chart queue is full ({self._in_flight} in flight)")
+            raise ChartBusyError(user_limit=False)
+
+        self._in_flight += 1
+        self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        started = time.perf_counter()
+        executor = self._get_executor()
+        try:
+            loop = asyncio.get_running_loop()
+            if isinstance(func, str):
+                call = functools.partial(_call_chart, func, args, kwargs)
+            else:
+                call = functools.partial(func, *args, **kwargs)
+            result = await loop.run_in_executor(executor, call)
+            self._stats['rendered'] += 1
+            self._latencies.append((time.perf_counter() - started) * 1000)
+            return result
+        except BrokenProcessPool:
+            # Процесс пула упал (например, OOM): следующая диаграмма создаст новый пул.
+            # Остальные задачи сломанного пула получат ту же ошибку - пул
+            # сбрасывается только если его ещё не заменили
+            self._stats['failed'] += 1
+            if self._executor is executor:
+                self._executor = None
+                self._stats['pool_restarts'] += 1
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        except Exception:
+            self._stats['failed'] += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            remaining = self._per_user[user_id] - 1
+            if remaining:
+                self._per_user[user_id] = remaining
+            else:
+                del self._per_user[user_id]
+
+    @staticmethod
+    def chart_key(func: Union[str, Callable], *args, **kwargs) -> str:
+        """Хэш диаграммы: функция, её аргументы (данные и подписи), версия стиля и dpi"""
+        payload = json.dumps(
+            [_chart_name(func), args, kwargs,
+             CHART_STYLE_VERSION, os.getenv("CHART_DPI")],
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def reply_chart(self, message, user_id: int, caption: str,
+                          func: Union[str, Callable], *args, **kwargs) -> bool:
+        """
+        Ответить на message фото диаграммы func(*args, **kwargs)
+
+        Если такая диаграмма уже отправлялась, фото уходит по file_id, иначе
+        строится в пуле (render) и file_id запоминается. False - данных для
+        диаграммы нет (func вернула None). ChartBusyError - см. render.
+        """
+        key = self.chart_key(func, *args, **kwargs)
+        charts = chart_cache.get_or_load(user_id, dict)
+        file_id = charts.get(key)
+        if file_id is not None:
+            self._stats['file_id_hits'] += 1
+            await message.reply_photo(photo=file_id, caption=caption)
+            self._remember(user_id, key, file_id)
+            return True
+
+        self._stats['file_id_misses'] += 1
+        chart = await self.render(user_id, func, *args, **kwargs)
+        if not chart:
+            return False
+        sent = await message.reply_photo(photo=chart, caption=caption)
+        if sent.photo:
+            self._remember(user_id, key, sent.photo[-1].file_id)
+        return True
+
+    @staticmethod
+    def _remember(user_id: int, key: str, file_id: str):
+        """Записать file_id последним (LRU внутри пользователя)"""
+        charts = chart_cache.get_or_load(user_id, dict)
+        charts.pop(key, None)
+        charts[key] = file_id
+        while len(charts) > CHART_CACHE_PER_USER:
+            charts.pop(next(iter(charts)))
+        chart_cache.put(user_id, charts)
+
+    def get_stats(self) -> Dict:
+        latencies = sorted(self._latencies)
+        return {
+            'workers': self.workers,
+            'in_flight': self._in_flight,
+            'queued': max(self._in_flight - self.workers, 0),
+            'users_waiting': len(self._per_user),
+            **self._stats,
+            'latency_ms_avg': sum(latencies) / len(latencies) if latencies else 0.0,
+            'latency_ms_p95': latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+            'latency_ms_max': latencies[-1] if latencies else 0.0
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+_renderer: Optional[ChartRenderer] = None
+
+
+def get_chart_renderer() -> ChartRenderer:
+    global _renderer
+    if _renderer is None:
+        _renderer = ChartRenderer()
+    return _renderer
+
+
+async def render_chart(user_id: int, func: Union[str, Callable], *args, **kwargs):
+    """Построить диаграмму func(*args, **kwargs) в пуле процессов (см. ChartRenderer.render)"""
+    return await get_chart_renderer().render(user_id, func, *args, **kwargs)
+
+
+async def reply_chart(message, user_id: int, caption: str, func: Union[str, Callable],
+                      *args, **kwargs) -> bool:
+    """Отправить диаграмму по file_id или построив её (см. ChartRenderer.reply_chart)"""
+    return await get_chart_renderer().reply_chart(message, user_id, caption, func, *args, **kwargs)
+
+
+def start_chart_service():
+    get_chart_renderer().start()
+
+
+def get_chart_stats() -> Dict:
+    return get_chart_renderer().get_stats()
+
+
+def shutdown_chart_service():
+    """Остановить процессы пула (при завершении бота)"""
+    global _renderer
+    if _renderer is not None:
+        _renderer.shutdown()
+        _renderer = None
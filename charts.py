@@ -1,10 +1,29 @@
+"""
+Диаграммы статистики
+
+Рисуются через объектный API (matplotlib.figure.Figure) без глобального
+состояния pyplot, поэтому функции можно вызывать из любого потока или
+процесса (см. chart_service). Результат - PNG в памяти (bytes), без временных
+файлов.
+"""
+import io
 import os
-import uuid
 from typing import Dict, Optional
 
 import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+
+matplotlib.rcParams['font.family'] = 'DejaVu Sans'
+
+# Telegram сжимает фото до 1280 px по большей стороне; 12 дюймов * 120 dpi уже больше
+CHART_DPI = int(os.getenv("CHART_DPI", "120"))
+
+
+def figure_to_png(fig: Figure) -> bytes:
+    """PNG фигуры в памяти"""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=CHART_DPI, bbox_inches='tight')
+    return buffer.getvalue()
 
 
 def _prepare_chart_data(data: Dict[str, float]):
@@ -22,7 +41,7 @@ def _prepare_chart_data(data: Dict[str, float]):
     return labels, values
 
 
-def create_statistics_chart(stats: Dict, period_text: str = "30 дней") -> Optional[str]:
+def create_statistics_chart(stats: Dict, period_text: str = "30 дней") -> Optional[bytes]:
     """
     Создает диаграмму статистики за указанный период
     
@@ -31,7 +50,7 @@ def create_statistics_chart(stats: Dict, period_text: str = "30 дней") -> Op
         period_text: Текстовое описание периода (например, "30 дней" или "все время")
     
     Returns:
-        Путь к файлу с диаграммой или None
+        PNG диаграммы или None
     """
     expenses = stats.get('expenses_by_category', {})
     income = stats.get('income_by_source', {})
@@ -41,13 +60,13 @@ def create_statistics_chart(stats: Dict, period_text: str = "30 дней") -> Op
     
     charts_count = 2 if expenses and income else 1
     figsize = (12, 6) if charts_count == 2 else (6, 6)
-    fig, axes = plt.subplots(1, charts_count, figsize=figsize)
+    fig = Figure(figsize=figsize)
+    axes = fig.subplots(1, charts_count)
     
     if charts_count == 1:
         axes = [axes]
     else:
         axes = list(axes)
-    plt.rcParams['font.family'] = 'DejaVu Sans'
     
     if expenses:
         labels, values = _prepare_chart_data(expenses)
@@ -71,16 +90,10 @@ def create_statistics_chart(stats: Dict, period_text: str = "30 дней") -> Op
         ax.pie(values, labels=labels, autopct='%1.1f%%', startangle=140, textprops={'fontsize': 9})
         ax.set_title(f'Доходы по источникам ({period_text})', fontsize=12)
     
-    plt.tight_layout()
-    
-    filename = f"stats_chart_{uuid.uuid4().hex}.png"
-    filepath = os.path.join(os.getcwd(), filename)
+    fig.tight_layout()
     
     try:
-        fig.savefig(filepath, dpi=200, bbox_inches='tight')
-        plt.close(fig)
-        return filepath
+        return figure_to_png(fig)
     except Exception as e:
         print(f"Error saving chart: {e}")
-        plt.close(fig)
-        return None
\ No newline at end of file
+        return None
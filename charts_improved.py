@@ -1,11 +1,9 @@
-import os
-import uuid
 from typing import Dict, Optional, List
 
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
+from matplotlib.figure import Figure
+
+from charts import figure_to_png
 
 
 def _prepare_chart_data(data: Dict[str, float], excluded_categories: List[str] = None):
@@ -37,15 +35,15 @@ def _prepare_chart_data(data: Dict[str, float], excluded_categories: List[str] =
     return labels, values, colors_list
 
 
-def create_pie_chart(data: Dict[str, float], title: str, excluded_categories: List[str] = None) -> Optional[str]:
+def create_pie_chart(data: Dict[str, float], title: str, excluded_categories: List[str] = None) -> Optional[bytes]:
     """Круговая диаграмма с легендой в углу"""
     labels, values, colors = _prepare_chart_data(data, excluded_categories)
     
     if not values or (len(values) == 1 and labels[0] == "Нет данных"):
         return None
     
-    fig, ax = plt.subplots(figsize=(10, 7))
-    plt.rcParams['font.family'] = 'DejaVu Sans'
+    fig = Figure(figsize=(10, 7))
+    ax = fig.subplots()
     
     wedges, texts, autotexts = ax.pie(
         values, 
@@ -67,23 +65,19 @@ def create_pie_chart(data: Dict[str, float], title: str, excluded_categories: Li
     
     ax.set_title(title, fontsize=14, weight='bold', pad=20)
     
-    plt.tight_layout()
-    filename = f"pie_chart_{uuid.uuid4().hex}.png"
-    filepath = os.path.join(os.getcwd(), filename)
-    fig.savefig(filepath, dpi=200, bbox_inches='tight')
-    plt.close(fig)
-    return filepath
+    fig.tight_layout()
+    return figure_to_png(fig)
 
 
-def create_bar_chart(data: Dict[str, float], title: str, excluded_categories: List[str] = None) -> Optional[str]:
+def create_bar_chart(data: Dict[str, float], title: str, excluded_categories: List[str] = None) -> Optional[bytes]:
     """Столбчатая диаграмма с легендой"""
     labels, values, colors = _prepare_chart_data(data, excluded_categories)
     
     if not values or (len(values) == 1 and labels[0] == "Нет данных"):
         return None
     
-    fig, ax = plt.subplots(figsize=(12, 7))
-    plt.rcParams['font.family'] = 'DejaVu Sans'
+    fig = Figure(figsize=(12, 7))
+    ax = fig.subplots()
     
     bars = ax.bar(range(len(labels)), values, color=colors, edgecolor='black', linewidth=0.5)
     
@@ -112,16 +106,12 @@ def create_bar_chart(data: Dict[str, float], title: str, excluded_categories: Li
     ax.grid(axis='y', linestyle='--', alpha=0.3)
     ax.set_axisbelow(True)
     
-    plt.tight_layout()
-    filename = f"bar_chart_{uuid.uuid4().hex}.png"
-    filepath = os.path.join(os.getcwd(), filename)
-    fig.savefig(filepath, dpi=200, bbox_inches='tight')
-    plt.close(fig)
-    return filepath
+    fig.tight_layout()
+    return figure_to_png(fig)
 
 
 def create_line_chart(expenses_data: Dict[str, float], income_data: Dict[str, float], 
-                     title: str, excluded_categories: List[str] = None) -> Optional[str]:
+                     title: str, excluded_categories: List[str] = None) -> Optional[bytes]:
     """Линейная диаграмма для сравнения расходов и доходов"""
     
     exp_labels, exp_values, exp_colors = _prepare_chart_data(expenses_data, excluded_categories)
@@ -131,8 +121,8 @@ def create_line_chart(expenses_data: Dict[str, float], income_data: Dict[str, fl
        (not inc_values or (len(inc_values) == 1 and inc_labels[0] == "Нет данных")):
         return None
     
-    fig, ax = plt.subplots(figsize=(12, 7))
-    plt.rcParams['font.family'] = 'DejaVu Sans'
+    fig = Figure(figsize=(12, 7))
+    ax = fig.subplots()
     
     x_exp = range(len(exp_labels))
     x_inc = range(len(inc_labels))
@@ -179,17 +169,13 @@ def create_line_chart(expenses_data: Dict[str, float], income_data: Dict[str, fl
     ax.grid(True, linestyle='--', alpha=0.3)
     ax.set_axisbelow(True)
     
-    plt.tight_layout()
-    filename = f"line_chart_{uuid.uuid4().hex}.png"
-    filepath = os.path.join(os.getcwd(), filename)
-    fig.savefig(filepath, dpi=200, bbox_inches='tight')
-    plt.close(fig)
-    return filepath
+    fig.tight_layout()
+    return figure_to_png(fig)
 
 
 def create_statistics_chart(stats: Dict, period_text: str = "30 дней", 
                            chart_type: str = "pie",
-                           excluded_categories: List[str] = None) -> Optional[str]:
+                           excluded_categories: List[str] = None) -> Optional[bytes]:
     """
     Создает диаграмму статистики за указанный период
     
@@ -212,8 +198,8 @@ def create_statistics_chart(stats: Dict, period_text: str = "30 дней",
     if chart_type == "pie":
         charts_count = 2 if expenses and income else 1
         figsize = (18, 7) if charts_count == 2 else (10, 7)
-        fig, axes = plt.subplots(1, charts_count, figsize=figsize)
-        plt.rcParams['font.family'] = 'DejaVu Sans'
+        fig = Figure(figsize=figsize)
+        axes = fig.subplots(1, charts_count)
         
         if charts_count == 1:
             axes = [axes]
@@ -244,8 +230,8 @@ def create_statistics_chart(stats: Dict, period_text: str = "30 дней",
                      loc="upper left", bbox_to_anchor=(1, 0, 0.5, 1), fontsize=8)
             ax.set_title(f'Доходы по источникам{title_suffix}', fontsize=12, weight='bold')
         
-        plt.tight_layout()
-        filename = f"stats_pie_{uuid.uuid4().hex}.png"
+        fig.tight_layout()
+        return figure_to_png(fig)
         
     elif chart_type == "bar":
         return create_bar_chart(expenses, f'Расходы по категориям{title_suffix}', excluded_categories)
@@ -254,9 +240,4 @@ def create_statistics_chart(stats: Dict, period_text: str = "30 дней",
         return create_line_chart(expenses, income, f'Сравнение расходов и доходов{title_suffix}', excluded_categories)
     
     else:
-        return None
-    
-    filepath = os.path.join(os.getcwd(), filename)
-    fig.savefig(filepath, dpi=200, bbox_inches='tight')
-    plt.close(fig)
-    return filepath
\ No newline at end of file
+        return None
\ No newline at end of file
@@ -3,9 +3,11 @@
 """
 from psycopg2.extras import RealDictCursor
 from typing import List, Dict
-from database import Database
+from database import get_database
+from async_db import AsyncProxy
+from cache import categories_cache
 
-db = Database()
+db = get_database()
 
 
 class CustomCategoryManager:
@@ -19,43 +21,6 @@ class CustomCategoryManager:
         "🏪 Бизнес", "🎁 Подарки", "💰 Прочее"
     ]
     
-    def __init__(self):
-        self._init_tables()
-    
-    def _init_tables(self):
-        """Инициализация таблиц"""
-        conn = db.get_connection()
-        try:
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS custom_categories (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    category_name TEXT NOT NULL,
-                    category_type TEXT NOT NULL,
-                    icon TEXT,
-                    is_favorite INTEGER DEFAULT 0,
-                    use_count INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user_id, category_name, category_type),
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_custom_categories_user 
-                ON custom_categories (user_id, category_type)
-            """)
-            
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            print(f"Error initializing custom categories: {e}")
-        finally:
-            cursor.close()
-            db.return_connection(conn)
-    
     def add_category(self, user_id: int, category_name: str, 
                     category_type: str = 'expense', icon: str = None) -> bool:
         """
@@ -79,6 +44,7 @@ class CustomCategoryManager:
             """, (user_id, category_name, category_type, icon))
             
             conn.commit()
+            categories_cache.invalidate((user_id, category_type))
             return cursor.rowcount > 0
         except Exception as e:
             conn.rollback()
@@ -96,6 +62,11 @@ class CustomCategoryManager:
             user_id: ID пользователя
             category_type: 'expense' или 'income'
         """
+        return categories_cache.get_or_load(
+            (user_id, category_type), lambda: self._load_categories(user_id, category_type)
+        )
+    
+    def _load_categories(self, user_id: int, category_type: str) -> List[Dict]:
         conn = db.get_connection()
         try:
             cursor = conn.cursor(cursor_factory=RealDictCursor)
@@ -149,6 +120,7 @@ class CustomCategoryManager:
             """, (user_id, category_name, category_type))
             
             conn.commit()
+            categories_cache.invalidate((user_id, category_type))
             return cursor.rowcount > 0
         except Exception as e:
             conn.rollback()
@@ -172,6 +144,7 @@ class CustomCategoryManager:
             """, (user_id, category_name, category_type))
             
             conn.commit()
+            categories_cache.invalidate((user_id, category_type))
         finally:
             cursor.close()
             db.return_connection(conn)
@@ -191,6 +164,8 @@ class CustomCategoryManager:
             """, (user_id, clean_name, category_type))
             
             conn.commit()
+            if cursor.rowcount:
+                categories_cache.invalidate((user_id, category_type))
         except Exception as e:
             print(f"Error incrementing use count: {e}")
         finally:
@@ -225,4 +200,5 @@ class CustomCategoryManager:
             db.return_connection(conn)
 
 
-category_manager = CustomCategoryManager()
\ No newline at end of file
+category_manager = CustomCategoryManager()
+async_category_manager = AsyncProxy(category_manager)
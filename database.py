@@ -1,415 +1,861 @@
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from psycopg2 import pool
+from cache import balance_cache, chart_cache
+from periods import Period, day_start
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Union
+from typing import List, Dict, Optional, Tuple, Union
+import functools
+import io
+import math
 import os
+import re
+import time
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Слова короче трёх букв не дают осмысленной trigram-похожести
+SEARCH_TERM_MIN_LENGTH = 3
+_SEARCH_TERM_RE = re.compile(r"[^\W_]+")
+# Точные совпадения сначала ищутся за столько дней до начала страницы
+SEARCH_RECENT_DAYS = 90
+# Наибольшее значение типа REAL (amount в expenses/income)
+REAL_MAX = 3.4e38
+# Постоянная времени скорости трат в category_stats, дней (как в миграции 0005)
+CATEGORY_RATE_DAYS = 30
+# Трата необычна, если больше среднего своей категории на ANOMALY_Z отклонений
+ANOMALY_Z = float(os.getenv("ANOMALY_Z", "3"))
+# Сколько других трат категории нужно, чтобы сравнивать с ними
+ANOMALY_MIN_COUNT = 5
+# Отклонение не меньше этой доли среднего: у одинаковых трат разброс нулевой
+ANOMALY_MIN_SPREAD = 0.25
+# Сколько строк за раз читает серверный курсор iter_operations
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "2000"))
+
+
+class Query:
+    """
+    Запрос операции, записанной через transaction
+
+    fetch: None - результат не нужен, 'one' - одна строка (None, если строк
+    нет), 'all' - список строк. dict_rows - строки словарями (как
+    RealDictCursor), иначе кортежами.
+    """
+    __slots__ = ('sql', 'params', 'fetch', 'dict_rows')
+
+    def __init__(self, sql: str, params=(), fetch: str = None, dict_rows: bool = False):
+        self.sql = sql
+        self.params = params
+        self.fetch = fetch
+        self.dict_rows = dict_rows
+
+
+# Шаг операции: зафиксировать транзакцию сейчас (дальше - сброс кэшей и разбор результата)
+COMMIT = object()
+
+
+def transaction(error: str = None, reraise: bool = True):
+    """
+    Декоратор операции Database, записанной генератором запросов
+
+    Операция не берёт соединение сама, а отдаёт Query и получает их
+    результат, поэтому один и тот же код выполняется и синхронно
+    (Database._run, пул psycopg2), и в event loop (async_db.AsyncDatabase,
+    пул psycopg 3). Все запросы идут в одной транзакции: commit после
+    последнего шага или на COMMIT, при ошибке - rollback, запись error в
+    лог и проброс ошибки (reraise=False - операция возвращает None).
+
+    Генератор доступен как method.steps - так одна операция вызывает другую
+    в своей транзакции: yield from self.get_summary.steps(self, ...).
+    """
+    def decorator(steps):
+        @functools.wraps(steps)
+        def method(self, *args, **kwargs):
+            return self._run(method, steps(self, *args, **kwargs))
+        method.steps = steps
+        method.error = error
+        method.reraise = reraise
+        return method
+    return decorator
+
+
+def values_list(rows) -> Tuple[str, list]:
+    """Плейсхолдеры многострочного VALUES и плоский список параметров к ним"""
+    row_sql = "(" + ", ".join(["%s"] * len(rows[0])) + ")"
+    return ", ".join([row_sql] * len(rows)), [value for row in rows for value in row]
+
 
 class Database:
     def __init__(self):
         self.connection_pool = None
-        self._init_connection_pool()
-        self.init_database()
+        self.pool_min = int(os.getenv("DB_POOL_MIN", "1"))
+        self.pool_max = int(os.getenv("DB_POOL_MAX", "20"))
+        self.pool_timeout = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+        self._pool_lock = threading.Lock()
+        self._ready = False
+        self._pool_cond = threading.Condition()
+        self._in_use = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'peak_in_use': 0,
+            'total_wait_ms': 0.0
+        }
+
+    @staticmethod
+    def connection_params() -> Dict:
+        """Параметры подключения из DB_* (для пула и отдельных соединений вроде LISTEN)"""
+        return {
+            'dbname': os.getenv("DB_NAME", "finance_bot"),
+            'user': os.getenv("DB_USER", "finance_user"),
+            'password': os.getenv("DB_PASSWORD", "h72ivh-19"),
+            'host': os.getenv("DB_HOST", "finance_bot_db"),
+            'port': os.getenv("DB_PORT", "5432")
+        }
 
     def _init_connection_pool(self):
         """Инициализация пула соединений"""
         try:
-            self.connection_pool = psycopg2.pool.SimpleConnectionPool(
-                1, 20,
-                dbname=os.getenv("DB_NAME", "finance_bot"),
-                user=os.getenv("DB_USER", "finance_user"),
-                password=os.getenv("DB_PASSWORD", "h72ivh-19"),
-                host=os.getenv("DB_HOST", "finance_bot_db"),
-                port=os.getenv("DB_PORT", "5432")
+            self.connection_pool = psycopg2.pool.ThreadedConnectionPool(
+                self.pool_min, self.pool_max, **self.connection_params()
+            )
+            logger.info(
+                f"Connection pool created successfully (min={self.pool_min}, max={self.pool_max})"
             )
-            logger.info("Connection pool created successfully")
         except Exception as e:
             logger.error(f"Error creating connection pool: {e}")
             raise
 
+    def _ensure_pool(self):
+        """
+        Ленивое создание пула при первом обращении
+
+        Схема здесь не создаётся: её ведут миграции (migrate.py).
+        """
+        if self._ready:
+            return
+        with self._pool_lock:
+            if self._ready:
+                return
+            self._init_connection_pool()
+            self._ready = True
+
     def get_connection(self):
-        """Получить соединение из пула"""
+        """Получить соединение из пула (ждёт освобождения не дольше DB_POOL_TIMEOUT)"""
+        self._ensure_pool()
+        started = time.monotonic()
+        with self._pool_cond:
+            if self._in_use >= self.pool_max:
+                self._stats['waits'] += 1
+                acquired = self._pool_cond.wait_for(
+                    lambda: self._in_use < self.pool_max, timeout=self.pool_timeout
+                )
+                if not acquired:
+                    self._stats['timeouts'] += 1
+                    logger.error(
+                        f"Connection pool exhausted: {self._in_use}/{self.pool_max} in use "
+                        f"after {self.pool_timeout}s"
+                    )
+                    raise pool.PoolError("connection pool exhausted")
+            self._in_use += 1
+            self._stats['checkouts'] += 1
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._in_use)
+            self._stats['total_wait_ms'] += (time.monotonic() - started) * 1000
         try:
             return self.connection_pool.getconn()
         except Exception as e:
+            self._release_slot()
             logger.error(f"Error getting connection: {e}")
             raise
 
     def return_connection(self, conn):
         """Вернуть соединение в пул"""
         if conn:
-            self.connection_pool.putconn(conn)
+            try:
+                self.connection_pool.putconn(conn)
+            finally:
+                self._release_slot()
 
-    def init_database(self):
-        """Инициализация базы данных"""
-        conn = self.get_connection()
+    def _release_slot(self):
+        with self._pool_cond:
+            self._in_use = max(self._in_use - 1, 0)
+            self._pool_cond.notify()
+
+    def get_pool_stats(self) -> Dict:
+        """Статистика использования пула (для подбора DB_POOL_MIN/DB_POOL_MAX)"""
+        with self._pool_cond:
+            stats = dict(self._stats)
+            in_use = self._in_use
+        idle = len(self.connection_pool._pool) if self.connection_pool else 0
+        checkouts = stats['checkouts']
+        return {
+            'initialized': self.connection_pool is not None,
+            'min': self.pool_min,
+            'max': self.pool_max,
+            'timeout': self.pool_timeout,
+            'in_use': in_use,
+            'idle': idle,
+            'peak_in_use': stats['peak_in_use'],
+            'checkouts': checkouts,
+            'waits': stats['waits'],
+            'timeouts': stats['timeouts'],
+            'avg_wait_ms': stats['total_wait_ms'] / checkouts if checkouts else 0.0
+        }
+
+    def _run(self, method, steps):
+        """Выполнить операцию-генератор (см. transaction) на соединении из пула"""
+        conn = None
+        cursors = {}
         try:
-            cursor = conn.cursor()
+            reply = None
+            while True:
+                try:
+                    query = steps.send(reply)
+                except StopIteration as stop:
+                    if conn is not None:
+                        conn.commit()
+                    return stop.value
+                # Соединение берётся только под первый запрос
+                if conn is None:
+                    conn = self.get_connection()
+                if query is COMMIT:
+                    conn.commit()
+                    reply = None
+                    continue
+                cursor = cursors.get(query.dict_rows)
+                if cursor is None:
+                    cursor = cursors[query.dict_rows] = conn.cursor(
+                        cursor_factory=RealDictCursor if query.dict_rows else None
+                    )
+                cursor.execute(query.sql, query.params)
+                if query.fetch == 'one':
+                    reply = cursor.fetchone()
+                elif query.fetch == 'all':
+                    reply = cursor.fetchall()
+                else:
+                    reply = None
+        except Exception as e:
+            if conn is not None:
+                conn.rollback()
+            if method.error:
+                logger.error(f"{method.error}: {e}")
+            if method.reraise:
+                raise
+            return None
+        finally:
+            for cursor in cursors.values():
+                cursor.close()
+            self.return_connection(conn)
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id BIGINT PRIMARY KEY,
-                    username TEXT,
-                    first_name TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS expenses (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    amount REAL NOT NULL,
-                    category TEXT NOT NULL,
-                    description TEXT,
-                    date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
+    @transaction("Error adding user", reraise=False)
+    def add_user(self, user_id: int, username: str = None, first_name: str = None):
+        """Добавить пользователя"""
+        yield Query("""
+            INSERT INTO users (user_id, username, first_name)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (user_id) DO NOTHING
+        """, (user_id, username, first_name))
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS hidden_money (
-                           id SERIAL PRIMARY KEY,
-                           user_id BIGINT NOT NULL,
-                           amount REAL NOT NULL,
-                           reason TEXT) 
-                           """)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS income (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    amount REAL NOT NULL,
-                    source TEXT NOT NULL,
-                    description TEXT,
-                    date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
+    def _normalize_date(self, date_value):
+        """Нормализация даты"""
+        if isinstance(date_value, datetime):
+            return date_value
+        if isinstance(date_value, str):
+            return datetime.fromisoformat(date_value.replace('Z', '+00:00'))
+        return None
 
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_expenses_user_date 
-                ON expenses (user_id, date DESC)
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_income_user_date 
-                ON income (user_id, date DESC)
-            """)
+    def _apply_rollup(self, user_id: int, kind: str, rows, sign: int = 1):
+        """
+        Учесть операции в дневных итогах daily_totals (шаги транзакции вызывающего)
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS budgets (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    category TEXT NOT NULL,
-                    limit_amount REAL NOT NULL,
-                    period TEXT DEFAULT 'monthly',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user_id, category, period),
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
+        rows - кортежи (date, категория/источник, amount); sign=-1 при удалении.
+        Заодно обновляются статистика расходов category_stats, счётчики за всё
+        время user_totals и сбрасываются file_id диаграмм пользователя (ключи
+        по содержимому, так что сброс до commit безопасен).
+        """
+        chart_cache.invalidate(user_id)
+        buckets = {}
+        for date_value, category, amount in rows:
+            key = (date_value.date(), category)
+            total, count = buckets.get(key, (0.0, 0))
+            buckets[key] = (total + amount, count + 1)
+        if not buckets:
+            return
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS category_filters (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    category TEXT NOT NULL,
-                    is_excluded INTEGER DEFAULT 0,
-                    filter_type TEXT DEFAULT 'expense',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user_id, category, filter_type),
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
+        # Сортировка по ключу: параллельные транзакции блокируют строки в одном порядке
+        placeholders, params = values_list([
+            (user_id, day, kind, category, sign * total, sign * count)
+            for (day, category), (total, count) in sorted(buckets.items())
+        ])
+        yield Query(f"""
+            INSERT INTO daily_totals (user_id, day, kind, category, total, count)
+            VALUES {placeholders}
+            ON CONFLICT (user_id, kind, day, category) DO UPDATE
+            SET total = daily_totals.total + EXCLUDED.total,
+                count = daily_totals.count + EXCLUDED.count
+        """, params)
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS subscriptions (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT UNIQUE NOT NULL,
-                    is_premium INTEGER DEFAULT 0,
-                    premium_until TIMESTAMP,
-                    stars_paid INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_payment_at TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
+        if sign < 0:
+            yield Query("""
+                DELETE FROM daily_totals
+                WHERE user_id = %s AND kind = %s AND day = ANY(%s) AND count <= 0
+            """, (user_id, kind, sorted({day for day, _ in buckets})))
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS payment_history (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    stars_amount INTEGER NOT NULL,
-                    payment_charge_id TEXT,
-                    telegram_payment_charge_id TEXT,
-                    paid_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
+        # Таблицы - в порядке блокировок _rebuild_rollups (daily_totals,
+        # category_stats, user_totals), иначе пересчёт и запись операции
+        # могут заблокировать друг друга
+        if kind == 'expense':
+            yield from self._apply_category_stats(user_id, rows, sign)
+        yield from self._apply_user_totals(user_id, kind, rows, sign)
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS group_expenses (
-                    id SERIAL PRIMARY KEY,
-                    group_id BIGINT NOT NULL,
-                    user_id BIGINT NOT NULL,
-                    user_name TEXT,
-                    amount REAL NOT NULL,
-                    category TEXT NOT NULL,
-                    description TEXT,
-                    date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+    def _apply_user_totals(self, user_id: int, kind: str, rows, sign: int = 1):
+        """
+        Учесть операции в счётчиках user_totals (шаги транзакции вызывающего)
 
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS group_settings (
-                    group_id BIGINT PRIMARY KEY,
-                    is_enabled INTEGER DEFAULT 1,
-                    allow_all_members INTEGER DEFAULT 1,
-                    show_stats INTEGER DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS group_debts (
-                    id SERIAL PRIMARY KEY,
-                    group_id BIGINT NOT NULL,
-                    debtor_id BIGINT NOT NULL,
-                    debtor_name TEXT,
-                    creditor_id BIGINT NOT NULL,
-                    creditor_name TEXT,
-                    amount REAL NOT NULL,
-                    description TEXT,
-                    is_settled INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
+        Число и сумма складываются; первая/последняя операция при добавлении
+        сдвигаются по LEAST/GREATEST, а при удалении крайней операции
+        перечитываются через индексы (user_id, date) expenses и income.
+        """
+        if not rows:
+            return
+        dates = [date_value for date_value, _, _ in rows]
+        count = sign * len(rows)
+        total = sign * sum(amount for _, _, amount in rows)
+        expense = (count, total, 0, 0.0) if kind == 'expense' else (0, 0.0, count, total)
+        first_at, last_at = min(dates), max(dates)
 
-            conn.commit()
-            logger.info("Database initialized successfully")
-        except Exception as e:
-            conn.rollback()
-            logger.error(f"Error initializing database: {e}")
-            raise
-        finally:
-            cursor.close()
-            self.return_connection(conn)
+        if sign > 0:
+            yield Query("""
+                INSERT INTO user_totals AS t
+                    (user_id, expenses_count, expenses_total, income_count, income_total, first_at, last_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (user_id) DO UPDATE
+                SET expenses_count = t.expenses_count + EXCLUDED.expenses_count,
+                    expenses_total = t.expenses_total + EXCLUDED.expenses_total,
+                    income_count = t.income_count + EXCLUDED.income_count,
+                    income_total = t.income_total + EXCLUDED.income_total,
+                    first_at = LEAST(t.first_at, EXCLUDED.first_at),
+                    last_at = GREATEST(t.last_at, EXCLUDED.last_at)
+            """, (user_id, *expense, first_at, last_at))
+            return
 
-    def add_user(self, user_id: int, username: str = None, first_name: str = None):
-        """Добавить пользователя"""
+        yield Query("""
+            UPDATE user_totals
+            SET expenses_count = expenses_count + %s,
+                expenses_total = expenses_total + %s,
+                income_count = income_count + %s,
+                income_total = income_total + %s
+            WHERE user_id = %s
+        """, (*expense, user_id))
+        yield Query("""
+            DELETE FROM user_totals WHERE user_id = %s AND expenses_count + income_count <= 0
+        """, (user_id,))
+        yield Query("""
+            UPDATE user_totals
+            SET first_at = LEAST((SELECT MIN(date) FROM expenses WHERE user_id = %s),
+                                 (SELECT MIN(date) FROM income WHERE user_id = %s)),
+                last_at = GREATEST((SELECT MAX(date) FROM expenses WHERE user_id = %s),
+                                   (SELECT MAX(date) FROM income WHERE user_id = %s))
+            WHERE user_id = %s AND (first_at >= %s OR last_at <= %s)
+        """, (user_id,) * 5 + (first_at, last_at))
+
+    @transaction()
+    def get_user_totals(self, user_id: int) -> Dict:
+        """
+        Счётчики пользователя за всё время одной строкой
+
+        Returns:
+            {'expenses_count', 'expenses_total', 'income_count', 'income_total',
+             'first_at', 'last_at', 'expense_categories'}; нули и None, если
+            операций ещё нет
+        """
+        row = yield Query("""
+            SELECT COALESCE(t.expenses_count, 0) AS expenses_count,
+                   COALESCE(t.expenses_total, 0) AS expenses_total,
+                   COALESCE(t.income_count, 0) AS income_count,
+                   COALESCE(t.income_total, 0) AS income_total,
+                   t.first_at, t.last_at,
+                   (SELECT COUNT(*) FROM category_stats WHERE user_id = %s) AS expense_categories
+            FROM (SELECT %s::bigint AS user_id) AS u
+            LEFT JOIN user_totals t ON t.user_id = u.user_id
+        """, (user_id, user_id), fetch='one', dict_rows=True)
+        return dict(row)
+
+    def _apply_category_stats(self, user_id: int, rows, sign: int = 1):
+        """
+        Учесть расходы в бегущей статистике category_stats (шаги транзакции вызывающего)
+
+        rows - кортежи (date, категория, amount); sign=-1 при удалении. Пакет
+        сворачивается в (число, среднее, M2) по категории и сливается с
+        хранимыми значениями формулой Чана - для одной траты это шаг Велфорда,
+        с отрицательным числом - обратный шаг. Скорость трат - сумма
+        amount / T * exp(-(rate_at - date) / T), поэтому удалённую трату можно
+        вычесть так же, как добавить.
+        """
+        groups = {}
+        for date_value, category, amount in rows:
+            groups.setdefault(category, []).append((date_value, amount))
+        if not groups:
+            return
+
+        values = []
+        for category, items in sorted(groups.items()):
+            count = len(items)
+            mean = sum(amount for _, amount in items) / count
+            m2 = sum((amount - mean) ** 2 for _, amount in items)
+            rate_at = max(date_value for date_value, _ in items)
+            rate = sum(
+                amount * math.exp(-(rate_at - date_value).total_seconds() / 86400 / CATEGORY_RATE_DAYS)
+                for date_value, amount in items
+            ) / CATEGORY_RATE_DAYS
+            values.append((user_id, category, sign * count, mean, sign * m2, sign * rate, rate_at))
+
+        # Все выражения SET видят старую строку s; exp() в PostgreSQL падает на underflow
+        placeholders, params = values_list(values)
+        yield Query(f"""
+            INSERT INTO category_stats AS s (user_id, category, count, mean, m2, rate, rate_at)
+            VALUES {placeholders}
+            ON CONFLICT (user_id, category) DO UPDATE
+            SET count = s.count + EXCLUDED.count,
+                mean = CASE WHEN s.count + EXCLUDED.count > 0
+                    THEN s.mean + (EXCLUDED.mean - s.mean) * EXCLUDED.count / (s.count + EXCLUDED.count)
+                    ELSE 0 END,
+                m2 = CASE WHEN s.count + EXCLUDED.count > 0
+                    THEN GREATEST(s.m2 + EXCLUDED.m2 + (EXCLUDED.mean - s.mean) ^ 2
+                                  * s.count * EXCLUDED.count / (s.count + EXCLUDED.count), 0)
+                    ELSE 0 END,
+                rate = GREATEST(
+                    s.rate * exp(-LEAST(extract(epoch FROM GREATEST(s.rate_at, EXCLUDED.rate_at) - s.rate_at)
+                                        / 86400 / {CATEGORY_RATE_DAYS}, 700))
+                    + EXCLUDED.rate * exp(-LEAST(extract(epoch FROM GREATEST(s.rate_at, EXCLUDED.rate_at) - EXCLUDED.rate_at)
+                                                 / 86400 / {CATEGORY_RATE_DAYS}, 700)),
+                    0),
+                rate_at = GREATEST(s.rate_at, EXCLUDED.rate_at)
+        """, params)
+
+        if sign < 0:
+            yield Query("""
+                DELETE FROM category_stats
+                WHERE user_id = %s AND category = ANY(%s) AND count <= 0
+            """, (user_id, sorted(groups)))
+
+    @staticmethod
+    def _stats_without(count: int, mean: float, m2: float, amount: float):
+        """(count, mean, m2) категории без одной траты amount (обратный шаг Велфорда)"""
+        others = count - 1
+        if others <= 0:
+            return 0, 0.0, 0.0
+        delta = amount - mean
+        return others, mean - delta / others, max(m2 - delta * delta * count / others, 0.0)
+
+    @staticmethod
+    def anomaly_score(amount: float, count: int, mean: float, m2: float) -> Optional[float]:
+        """
+        z-оценка траты относительно других трат её категории (count, mean, m2 без неё)
+
+        None, если других трат меньше ANOMALY_MIN_COUNT - сравнивать не с чем.
+        """
+        if count < ANOMALY_MIN_COUNT:
+            return None
+        spread = max(math.sqrt(max(m2, 0.0) / (count - 1)), mean * ANOMALY_MIN_SPREAD)
+        if spread <= 0:
+            return None
+        return (amount - mean) / spread
+
+    def get_category_stats(self, user_id: int, category: str = None) -> Dict[str, Dict]:
+        """
+        Бегущая статистика расходов по категориям (одной, если указана)
+
+        Returns:
+            {категория: {'count', 'mean', 'm2', 'std', 'rate'}}, rate - руб./день
+            на текущий момент
+        """
         conn = self.get_connection()
         try:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO users (user_id, username, first_name)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (user_id) DO NOTHING
-            """, (user_id, username, first_name))
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            logger.error(f"Error adding user: {e}")
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute(f"""
+                SELECT category, count, mean, m2,
+                       rate * exp(-LEAST(GREATEST(extract(epoch FROM LOCALTIMESTAMP - rate_at), 0)
+                                         / 86400 / {CATEGORY_RATE_DAYS}, 700)) AS rate
+                FROM category_stats
+                WHERE user_id = %s AND (%s::text IS NULL OR category = %s)
+            """, (user_id, category, category))
+            result = {}
+            for row in cursor.fetchall():
+                stats = dict(row)
+                name = stats.pop('category')
+                stats['std'] = math.sqrt(stats['m2'] / (stats['count'] - 1)) if stats['count'] > 1 else 0.0
+                result[name] = stats
+            return result
         finally:
             cursor.close()
             self.return_connection(conn)
 
-    def _normalize_date(self, date_value):
-        """Нормализация даты"""
-        if isinstance(date_value, datetime):
-            return date_value
-        if isinstance(date_value, str):
-            return datetime.fromisoformat(date_value.replace('Z', '+00:00'))
-        return None
+    def _add_search_terms(self, user_id: int, texts):
+        """
+        Пополнить словарь search_terms словами из названий и описаний
+
+        texts - строки (категория/источник, описание; None пропускаются).
+        Разбиение на слова совпадает с заполнением в миграции 0004.
+        """
+        terms = set()
+        for text in texts:
+            if text:
+                terms.update(
+                    word for word in _SEARCH_TERM_RE.findall(text.lower())
+                    if len(word) >= SEARCH_TERM_MIN_LENGTH and not word.isdigit()
+                )
+        if not terms:
+            return
+        placeholders, params = values_list([(user_id, term) for term in sorted(terms)])
+        yield Query(f"""
+            INSERT INTO search_terms (user_id, term)
+            VALUES {placeholders}
+            ON CONFLICT DO NOTHING
+        """, params)
 
+    def _delete_tag_links(self, kind: str, ids: List[int]):
+        """
+        Удалить привязки тегов к удалённым операциям
+
+        Внешний ключ с ON DELETE CASCADE на секционированные expenses/income
+        невозможен, поэтому связи чистятся здесь, в той же транзакции.
+        """
+        if not ids:
+            return
+        if kind == 'expense':
+            yield Query("DELETE FROM expense_tags WHERE expense_id = ANY(%s)", (ids,))
+        else:
+            yield Query("DELETE FROM income_tags WHERE income_id = ANY(%s)", (ids,))
+
+    @transaction("Error adding expense")
     def add_expense(self, user_id, amount, category, description=None, date=None):
         """Добавить расход"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.cursor()
-            normalized = self._normalize_date(date)
+        normalized = self._normalize_date(date)
 
-            if normalized:
-                cursor.execute("""
-                    INSERT INTO expenses (user_id, amount, category, description, date)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (user_id, amount, category, description, normalized))
-            else:
-                cursor.execute("""
-                    INSERT INTO expenses (user_id, amount, category, description)
-                    VALUES (%s, %s, %s, %s)
-                """, (user_id, amount, category, description))
+        if normalized:
+            rows = yield Query("""
+                INSERT INTO expenses (user_id, amount, category, description, date)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING date, category, amount::float8
+            """, (user_id, amount, category, description, normalized), fetch='all')
+        else:
+            rows = yield Query("""
+                INSERT INTO expenses (user_id, amount, category, description)
+                VALUES (%s, %s, %s, %s)
+                RETURNING date, category, amount::float8
+            """, (user_id, amount, category, description), fetch='all')
 
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            logger.error(f"Error adding expense: {e}")
-            raise
-        finally:
-            cursor.close()
-            self.return_connection(conn)
+        yield from self._apply_rollup(user_id, 'expense', rows)
+        yield from self._add_search_terms(user_id, (category, description))
 
+    @transaction("Error adding income")
     def add_income(self, user_id, amount, source, description=None, date=None):
         """Добавить доход"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.cursor()
-            normalized = self._normalize_date(date)
+        normalized = self._normalize_date(date)
 
-            if normalized:
-                cursor.execute("""
-                    INSERT INTO income (user_id, amount, source, description, date)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (user_id, amount, source, description, normalized))
-            else:
-                cursor.execute("""
-                    INSERT INTO income (user_id, amount, source, description)
-                    VALUES (%s, %s, %s, %s)
-                """, (user_id, amount, source, description))
+        if normalized:
+            rows = yield Query("""
+                INSERT INTO income (user_id, amount, source, description, date)
+                VALUES (%s, %s, %s, %s, %s)
+                RETURNING date, source, amount::float8
+            """, (user_id, amount, source, description, normalized), fetch='all')
+        else:
+            rows = yield Query("""
+                INSERT INTO income (user_id, amount, source, description)
+                VALUES (%s, %s, %s, %s)
+                RETURNING date, source, amount::float8
+            """, (user_id, amount, source, description), fetch='all')
 
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            logger.error(f"Error adding income: {e}")
-            raise
-        finally:
-            cursor.close()
-            self.return_connection(conn)
+        yield from self._apply_rollup(user_id, 'income', rows)
+        yield from self._add_search_terms(user_id, (source, description))
 
-    def add_expenses_bulk(self, user_id: int, entries: List[Dict]) -> int:
-        """Массовое добавление расходов"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.cursor()
-            inserted = 0
-            
-            for entry in entries:
-                try:
-                    date_value = entry.get('date')
-                    cursor.execute("""
-                        INSERT INTO expenses (user_id, amount, category, description, date)
-                        VALUES (%s, %s, %s, %s, %s)
-                    """, (
-                        user_id,
-                        entry['amount'],
-                        entry['category'],
-                        entry.get('description'),
-                        date_value if date_value else datetime.now()
-                    ))
-                    inserted += 1
-                except Exception as e:
-                    logger.error(f"Error inserting bulk expense: {e}")
-                    continue
-            
-            conn.commit()
-            return inserted
-        except Exception as e:
-            conn.rollback()
-            logger.error(f"Error in bulk expense insert: {e}")
-            return 0
-        finally:
-            cursor.close()
-            self.return_connection(conn)
+    @transaction("Error recording expense")
+    def record_expense(self, user_id: int, amount: float, category: str,
+                       description: str = None, date=None) -> Dict:
+        """
+        Записать расход со всеми последствиями одной транзакцией
 
-    def add_income_bulk(self, user_id: int, entries: List[Dict]) -> int:
-        """Массовое добавление доходов"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.cursor()
-            inserted = 0
-            
-            for entry in entries:
-                try:
-                    date_value = entry.get('date')
-                    cursor.execute("""
-                        INSERT INTO income (user_id, amount, source, description, date)
-                        VALUES (%s, %s, %s, %s, %s)
-                    """, (
-                        user_id,
-                        entry['amount'],
-                        entry['source'],
-                        entry.get('description'),
-                        date_value if date_value else datetime.now()
-                    ))
-                    inserted += 1
-                except Exception as e:
-                    logger.error(f"Error inserting bulk income: {e}")
-                    continue
-            
-            conn.commit()
-            return inserted
-        except Exception as e:
-            conn.rollback()
-            logger.error(f"Error in bulk income insert: {e}")
-            return 0
-        finally:
-            cursor.close()
-            self.return_connection(conn)
-    
+        Вставка, дневные итоги, статистика категории, словарь поиска и
+        списание с баланса, затем одним запросом - настройки крупных трат (с
+        созданием по умолчанию, как NotificationManager.get_settings), бюджет
+        категории с тратами за его период (как BudgetManager.check_budget_alerts)
+        и статистика категории. Трата крупная, если она на ANOMALY_Z отклонений
+        больше остальных трат категории, а пока их меньше ANOMALY_MIN_COUNT -
+        если не меньше порога из настроек.
 
-    def get_expenses(self, user_id: int, days: int = None) -> List[Dict]:
-        """Получить расходы"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
+        Returns:
+            {'expense': запись, 'balance': {'balance', 'hidden_balance', 'total_balance'},
+             'large_expense_threshold': порог, если трата крупная, иначе None,
+             'large_expense_typical': средняя трата категории, если крупная по
+                 сравнению с ней (см. anomaly_score), иначе None,
+             'budget': {'category', 'limit_amount', 'spent'} или None}
+        """
+        row = yield Query("""
+            INSERT INTO expenses (user_id, amount, category, description, date)
+            VALUES (%s, %s, %s, %s, COALESCE(%s, CURRENT_TIMESTAMP))
+            RETURNING id, user_id, amount::float8 AS amount, category, description, date
+        """, (user_id, amount, category, description, self._normalize_date(date)),
+            fetch='one', dict_rows=True)
+        expense = dict(row)
 
-            if days:
-                date_from = datetime.now() - timedelta(days=days)
-                cursor.execute("""
-                    SELECT * FROM expenses
-                    WHERE user_id = %s AND date >= %s
-                    ORDER BY date DESC
-                """, (user_id, date_from))
-            else:
-                cursor.execute("""
-                    SELECT * FROM expenses
-                    WHERE user_id = %s
-                    ORDER BY date DESC
-                """, (user_id,))
+        rows = [(expense['date'], category, expense['amount'])]
+        yield from self._apply_rollup(user_id, 'expense', rows)
+        yield from self._add_search_terms(user_id, (category, description))
+        balance = yield from self._adjust_balance(user_id, -expense['amount'])
 
-            result = [dict(row) for row in cursor.fetchall()]
-            return result
-        finally:
-            cursor.close()
-            self.return_connection(conn)
+        # Периоды бюджетов календарные, то есть целые дни - хватает daily_totals
+        budget_days = [Period.for_budget(name).plan()[0] for name in ('daily', 'weekly', 'monthly')]
+        checks = yield Query("""
+            WITH created AS (
+                INSERT INTO notification_settings (user_id) VALUES (%s)
+                ON CONFLICT (user_id) DO NOTHING
+                RETURNING large_expense_alert, large_expense_threshold
+            ),
+            settings AS (
+                SELECT large_expense_alert, large_expense_threshold FROM created
+                UNION ALL
+                SELECT large_expense_alert, large_expense_threshold
+                FROM notification_settings WHERE user_id = %s
+                LIMIT 1
+            ),
+            budget AS (
+                SELECT category, limit_amount::float8 AS limit_amount, period FROM budgets
+                WHERE user_id = %s AND LOWER(category) = LOWER(%s)
+                ORDER BY category
+                LIMIT 1
+            )
+            SELECT s.large_expense_alert, s.large_expense_threshold,
+                   b.category AS budget_category, b.limit_amount,
+                   (SELECT COALESCE(SUM(d.total), 0) FROM daily_totals d
+                    WHERE d.user_id = %s AND d.kind = 'expense' AND d.category = b.category
+                      AND d.day >= CASE b.period WHEN 'daily' THEN %s::date
+                                                 WHEN 'weekly' THEN %s::date ELSE %s::date END
+                      AND d.day < CASE b.period WHEN 'daily' THEN %s::date
+                                                WHEN 'weekly' THEN %s::date ELSE %s::date END
+                   ) AS spent,
+                   cs.count AS stats_count, cs.mean AS stats_mean, cs.m2 AS stats_m2
+            FROM settings s
+            LEFT JOIN budget b ON TRUE
+            LEFT JOIN category_stats cs ON cs.user_id = %s AND cs.category = %s
+        """, [user_id, user_id, user_id, category, user_id]
+            + [days[0] for days in budget_days] + [days[1] for days in budget_days]
+            + [user_id, category], fetch='one', dict_rows=True)
+        yield COMMIT
+        balance_cache.invalidate(user_id)
 
-    def get_income(self, user_id: int, days: int = None) -> List[Dict]:
-        """Получить доходы"""
-        conn = self.get_connection()
+        # Статистика категории уже с этой тратой - сравниваем с остальными
+        others = self._stats_without(
+            checks['stats_count'] or 0, checks['stats_mean'] or 0.0, checks['stats_m2'] or 0.0,
+            expense['amount']
+        )
+        score = self.anomaly_score(expense['amount'], *others)
+        threshold = checks['large_expense_threshold']
+        if score is not None:
+            large = checks['large_expense_alert'] and score >= ANOMALY_Z
+        else:
+            # Истории категории мало - порог из настроек
+            large = checks['large_expense_alert'] and amount >= threshold
+        return {
+            'expense': expense,
+            'balance': {
+                'balance': balance['balance'],
+                'hidden_balance': balance['hidden_balance'],
+                'total_balance': balance['balance'] + balance['hidden_balance']
+            },
+            'large_expense_threshold': threshold if large else None,
+            'large_expense_typical': others[1] if large and score is not None else None,
+            'budget': {
+                'category': checks['budget_category'],
+                'limit_amount': checks['limit_amount'],
+                'spent': checks['spent']
+            } if checks['budget_category'] is not None else None
+        }
+
+    @transaction("Error recording income")
+    def record_income(self, user_id: int, amount: float, source: str,
+                      description: str = None, date=None) -> Dict:
+        """
+        Записать доход и зачислить его на баланс одной транзакцией
+
+        Returns:
+            {'income': запись, 'balance': {'balance', 'hidden_balance', 'total_balance'}}
+        """
+        row = yield Query("""
+            INSERT INTO income (user_id, amount, source, description, date)
+            VALUES (%s, %s, %s, %s, COALESCE(%s, CURRENT_TIMESTAMP))
+            RETURNING id, user_id, amount::float8 AS amount, source, description, date
+        """, (user_id, amount, source, description, self._normalize_date(date)),
+            fetch='one', dict_rows=True)
+        income = dict(row)
+
+        yield from self._apply_rollup(user_id, 'income', [(income['date'], source, income['amount'])])
+        yield from self._add_search_terms(user_id, (source, description))
+        balance = yield from self._adjust_balance(user_id, income['amount'])
+        yield COMMIT
+        balance_cache.invalidate(user_id)
+
+        return {
+            'income': income,
+            'balance': {
+                'balance': balance['balance'],
+                'hidden_balance': balance['hidden_balance'],
+                'total_balance': balance['balance'] + balance['hidden_balance']
+            }
+        }
+
+    def _validate_bulk_entry(self, entry: Dict, field: str) -> Optional[str]:
+        """Проверить запись для массовой вставки; возвращает текст ошибки или None"""
         try:
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            amount = float(entry.get('amount'))
+        except (TypeError, ValueError):
+            return "сумма не число"
+        # amount хранится как REAL
+        if not math.isfinite(amount) or amount <= 0 or amount > REAL_MAX:
+            return "сумма должна быть положительной и не больше 3.4e38"
 
-            if days:
-                date_from = datetime.now() - timedelta(days=days)
-                cursor.execute("""
-                    SELECT * FROM income
-                    WHERE user_id = %s AND date >= %s
-                    ORDER BY date DESC
-                """, (user_id, date_from))
-            else:
-                cursor.execute("""
-                    SELECT * FROM income
-                    WHERE user_id = %s
-                    ORDER BY date DESC
-                """, (user_id,))
+        name = entry.get(field)
+        if not isinstance(name, str) or not name.strip():
+            return "не указана категория" if field == 'category' else "не указан источник"
 
-            result = [dict(row) for row in cursor.fetchall()]
-            return result
+        description = entry.get('description')
+        if description is not None and not isinstance(description, str):
+            return "описание должно быть строкой"
+        if '\x00' in name or (description and '\x00' in description):
+            return "недопустимый символ в тексте"
+
+        date_value = entry.get('date')
+        if date_value is not None and not isinstance(date_value, datetime):
+            return "дата должна быть datetime"
+        return None
+
+    def _insert_bulk(self, user_id: int, kind: str, entries: List[Dict]) -> Dict:
+        """
+        Массовая вставка операций одним INSERT ... VALUES
+
+        Записи проверяются до обращения к БД, поэтому ошибка в одной строке
+        не прерывает транзакцию с остальными. Вставка, дневные итоги, словарь
+        поиска и баланс обновляются один раз на пакет в одной транзакции.
+        Возвращает {'inserted': число, 'errors': [(индекс в entries, ошибка)]}.
+        """
+        table, field = ('expenses', 'category') if kind == 'expense' else ('income', 'source')
+        now = datetime.now()
+        values, texts, errors = [], [], []
+        for index, entry in enumerate(entries):
+            error = self._validate_bulk_entry(entry, field)
+            if error:
+                errors.append((index, error))
+                continue
+            values.append((
+                user_id, float(entry['amount']), entry[field].strip(),
+                entry.get('description'), entry.get('date') or now
+            ))
+            texts.extend((entry[field], entry.get('description')))
+
+        if not values:
+            return {'inserted': 0, 'errors': errors}
+
+        placeholders, params = values_list(values)
+        rows = yield Query(f"""
+            INSERT INTO {table} (user_id, amount, {field}, description, date)
+            VALUES {placeholders}
+            RETURNING date, {field}, amount::float8
+        """, params, fetch='all')
+
+        yield from self._apply_rollup(user_id, kind, rows)
+        yield from self._add_search_terms(user_id, texts)
+        total = sum(row[2] for row in rows)
+        yield from self._adjust_balance(user_id, total if kind == 'income' else -total)
+        yield COMMIT
+        balance_cache.invalidate(user_id)
+        return {'inserted': len(rows), 'errors': errors}
+
+    @transaction("Error in bulk expense insert")
+    def add_expenses_bulk(self, user_id: int, entries: List[Dict]) -> Dict:
+        """Массовое добавление расходов (см. _insert_bulk), сумма списывается с баланса"""
+        return (yield from self._insert_bulk(user_id, 'expense', entries))
+
+    @transaction("Error in bulk income insert")
+    def add_income_bulk(self, user_id: int, entries: List[Dict]) -> Dict:
+        """Массовое добавление доходов (см. _insert_bulk), сумма зачисляется на баланс"""
+        return (yield from self._insert_bulk(user_id, 'income', entries))
+
+    @transaction()
+    def get_expenses(self, user_id: int, period: Union[Period, int] = None) -> List[Dict]:
+        """Получить расходы за период (Period, число последних дней или None - всё время)"""
+        period = Period.coerce(period)
+        rows = yield Query("""
+            SELECT * FROM expenses
+            WHERE user_id = %s
+              AND (%s::timestamp IS NULL OR date >= %s)
+              AND (%s::timestamp IS NULL OR date < %s)
+            ORDER BY date DESC
+        """, (user_id, period.date_from, period.date_from, period.date_to, period.date_to),
+            fetch='all', dict_rows=True)
+
+        result = [dict(row) for row in rows]
+        return result
+
+    @transaction()
+    def get_income(self, user_id: int, period: Union[Period, int] = None) -> List[Dict]:
+        """Получить доходы за период (Period, число последних дней или None - всё время)"""
+        period = Period.coerce(period)
+        rows = yield Query("""
+            SELECT * FROM income
+            WHERE user_id = %s
+              AND (%s::timestamp IS NULL OR date >= %s)
+              AND (%s::timestamp IS NULL OR date < %s)
+            ORDER BY date DESC
+        """, (user_id, period.date_from, period.date_from, period.date_to, period.date_to),
+            fetch='all', dict_rows=True)
+
+        result = [dict(row) for row in rows]
+        return result
+
+    def iter_operations(self, user_id: int, kind: str, period: Union[Period, int] = None,
+                        chunk_size: int = None):
+        """
+        Операции за период, новые сверху: кортежи (date, категория или источник, amount, description)
+
+        Строки читаются именованным (серверным) курсором порциями по
+        EXPORT_CHUNK_ROWS, поэтому память не зависит от длины истории (для
+        экспорта). Соединение занято, пока генератор не исчерпан или не закрыт.
+        """
+        table, field = ('expenses', 'category') if kind == 'expense' else ('income', 'source')
+        period = Period.coerce(period)
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor(name=f"iter_{table}_{user_id}")
+            cursor.itersize = chunk_size or EXPORT_CHUNK_ROWS
+            cursor.execute(f"""
+                SELECT date, {field}, amount::float8, COALESCE(description, '')
+                FROM {table}
+                WHERE user_id = %s
+                  AND (%s::timestamp IS NULL OR date >= %s)
+                  AND (%s::timestamp IS NULL OR date < %s)
+                ORDER BY date DESC, id DESC
+            """, (user_id, period.date_from, period.date_from, period.date_to, period.date_to))
+            yield from cursor
         finally:
             cursor.close()
+            # Серверный курсор живёт в транзакции: закрыть её перед возвратом в пул
+            conn.rollback()
             self.return_connection(conn)
 
-    def get_last_expenses(self, user_id: int, limit: int = 10) -> List[Dict]:
-        """Получить последние расходы"""
+    def get_last_expenses(self, user_id: int, limit: int = 10, since: datetime = None) -> List[Dict]:
+        """Получить последние расходы (since - не раньше этого момента, читаются только его секции)"""
         conn = self.get_connection()
         try:
             cursor = conn.cursor(cursor_factory=RealDictCursor)
             cursor.execute("""
                 SELECT * FROM expenses
-                WHERE user_id = %s
+                WHERE user_id = %s AND (%s::timestamp IS NULL OR date >= %s)
                 ORDER BY date DESC
                 LIMIT %s
-            """, (user_id, limit))
+            """, (user_id, since, since, limit))
             
             result = [dict(row) for row in cursor.fetchall()]
             return result
@@ -417,6 +863,47 @@ class Database:
             cursor.close()
             self.return_connection(conn)
 
+    def copy_expense_history(self, user_id: int, since: datetime = None):
+        """
+        Расходы пользователя в двоичном формате COPY (для timeseries.SpendingHistory)
+
+        Каждая строка - (секунды от 1970-01-01 по времени записи, сумма, номер
+        категории в возвращаемом списке), все поля фиксированной длины и без
+        NULL, поэтому данные разбираются без цикла по строкам. Строки
+        отсортированы по дате; категория, появившаяся между двумя запросами,
+        получает номер -1.
+
+        Returns:
+            (список категорий, bytes в формате COPY BINARY)
+        """
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT DISTINCT category FROM daily_totals
+                WHERE user_id = %s AND kind = 'expense'
+                  AND (%s::date IS NULL OR day >= %s::date)
+                ORDER BY category
+            """, (user_id, since, since))
+            categories = [row[0] for row in cursor.fetchall()]
+
+            query = cursor.mogrify("""
+                COPY (
+                    SELECT floor(extract(epoch FROM date))::int8,
+                           amount::float8,
+                           COALESCE(array_position(%s::text[], category) - 1, -1)::int4
+                    FROM expenses
+                    WHERE user_id = %s AND (%s::timestamp IS NULL OR date >= %s)
+                    ORDER BY date
+                ) TO STDOUT WITH (FORMAT binary)
+            """, (categories, user_id, since, since)).decode()
+            buffer = io.BytesIO()
+            cursor.copy_expert(query, buffer)
+            return categories, buffer.getvalue()
+        finally:
+            cursor.close()
+            self.return_connection(conn)
+
     def get_last_income(self, user_id: int, limit: int = 10) -> List[Dict]:
         """Получить последние доходы"""
         conn = self.get_connection()
@@ -435,141 +922,774 @@ class Database:
             cursor.close()
             self.return_connection(conn)
 
-    def delete_expense(self, user_id: int, expense_id: int) -> bool:
-        """Удалить расход"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.cursor()
-            cursor.execute("""
-                DELETE FROM expenses WHERE id = %s AND user_id = %s
-            """, (expense_id, user_id))
+    def _get_page(self, table: str, user_id: int, cursor_key=None,
+                  backward: bool = False, limit: int = 10) -> Dict:
+        """
+        Страница операций по ключу (date, id), новые сверху
 
-            conn.commit()
-            deleted = cursor.rowcount > 0
-            return deleted
-        finally:
-            cursor.close()
-            self.return_connection(conn)
+        cursor_key - (date, id) крайней записи соседней страницы: без него
+        возвращается первая страница, при backward=False - записи старше
+        ключа, при backward=True - новее. Каждая страница - один запрос по
+        индексу (user_id, date), без OFFSET и без хранения списка в памяти.
+        has_more - есть ли ещё записи в том же направлении.
+        """
+        if cursor_key is None:
+            condition, order, params = "", "DESC", (user_id, limit + 1)
+        else:
+            # Отдельное сравнение date отсекает лишние месячные секции ещё при планировании
+            if backward:
+                condition = "AND date >= %s AND (date, id) > (%s, %s)"
+            else:
+                condition = "AND date <= %s AND (date, id) < (%s, %s)"
+            order = "ASC" if backward else "DESC"
+            params = (user_id, cursor_key[0], cursor_key[0], cursor_key[1], limit + 1)
+
+        rows = yield Query(f"""
+            SELECT * FROM {table}
+            WHERE user_id = %s {condition}
+            ORDER BY date {order}, id {order}
+            LIMIT %s
+        """, params, fetch='all', dict_rows=True)
+        rows = [dict(row) for row in rows]
+
+        items = rows[:limit]
+        if backward:
+            items.reverse()
+        return {"items": items, "has_more": len(rows) > limit}
+
+    @transaction()
+    def get_expenses_page(self, user_id: int, cursor_key=None,
+                          backward: bool = False, limit: int = 10) -> Dict:
+        """Страница расходов для списков удаления (см. _get_page)"""
+        return (yield from self._get_page("expenses", user_id, cursor_key, backward, limit))
+
+    @transaction()
+    def get_income_page(self, user_id: int, cursor_key=None,
+                        backward: bool = False, limit: int = 10) -> Dict:
+        """Страница доходов для списков удаления (см. _get_page)"""
+        return (yield from self._get_page("income", user_id, cursor_key, backward, limit))
+
+    def _adjust_balance(self, user_id: int, delta: float):
+        """
+        Изменить основной баланс user_balance (шаги транзакции вызывающего)
+
+        Как BalanceManager.update_balance: если записи баланса ещё нет,
+        она создаётся с нулевым балансом, к которому прибавляется delta.
+        Возвращает новые (balance, hidden_balance). После commit вызывающий
+        сбрасывает balance_cache пользователя.
+        """
+        return (yield Query("""
+            INSERT INTO user_balance (user_id, balance, hidden_balance)
+            VALUES (%s, %s, 0)
+            ON CONFLICT (user_id) DO UPDATE
+            SET balance = user_balance.balance + EXCLUDED.balance,
+                last_updated = CURRENT_TIMESTAMP
+            RETURNING balance, hidden_balance
+        """, (user_id, delta), fetch='one', dict_rows=True))
+
+    @transaction("Error deleting expense")
+    def delete_expense(self, user_id: int, expense_id: int) -> Optional[Dict]:
+        """
+        Удалить расход и вернуть его сумму на баланс
+
+        Удаление, дневные итоги, статистика категории и баланс меняются в
+        одной транзакции.
+        Возвращает удалённую запись или None, если расхода нет.
+        """
+        expense = yield Query("""
+            DELETE FROM expenses WHERE id = %s AND user_id = %s
+            RETURNING id, user_id, amount::float8 AS amount, category, description, date
+        """, (expense_id, user_id), fetch='one', dict_rows=True)
+        if expense is None:
+            return None
+
+        yield from self._delete_tag_links('expense', [expense['id']])
+        rows = [(expense['date'], expense['category'], expense['amount'])]
+        yield from self._apply_rollup(user_id, 'expense', rows, sign=-1)
+        yield from self._adjust_balance(user_id, expense['amount'])
+        yield COMMIT
+        balance_cache.invalidate(user_id)
+        return dict(expense)
+
+    @transaction("Error deleting income")
+    def delete_income(self, user_id: int, income_id: int) -> Optional[Dict]:
+        """
+        Удалить доход и снять его сумму с баланса
+
+        Удаление, дневные итоги и баланс меняются в одной транзакции.
+        Возвращает удалённую запись или None, если дохода нет.
+        """
+        income = yield Query("""
+            DELETE FROM income WHERE id = %s AND user_id = %s
+            RETURNING id, user_id, amount::float8 AS amount, source, description, date
+        """, (income_id, user_id), fetch='one', dict_rows=True)
+        if income is None:
+            return None
+
+        yield from self._delete_tag_links('income', [income['id']])
+        yield from self._apply_rollup(
+            user_id, 'income', [(income['date'], income['source'], income['amount'])], sign=-1
+        )
+        yield from self._adjust_balance(user_id, -income['amount'])
+        yield COMMIT
+        balance_cache.invalidate(user_id)
+        return dict(income)
+
+    @transaction()
+    def delete_expenses_bulk(self, user_id: int, ids: List[int]) -> int:
+        """Массовое удаление расходов, сумма возвращается на баланс"""
+        rows = yield Query("""
+            DELETE FROM expenses 
+            WHERE user_id = %s AND id = ANY(%s)
+            RETURNING id, date, category, amount::float8
+        """, (user_id, ids), fetch='all')
+
+        yield from self._delete_tag_links('expense', [row[0] for row in rows])
+        yield from self._apply_rollup(user_id, 'expense', [row[1:] for row in rows], sign=-1)
+        if rows:
+            yield from self._adjust_balance(user_id, sum(row[3] for row in rows))
+        yield COMMIT
+        balance_cache.invalidate(user_id)
+        deleted = len(rows)
+        return deleted
+
+    @transaction()
+    def delete_income_bulk(self, user_id: int, ids: List[int]) -> int:
+        """Массовое удаление доходов, сумма снимается с баланса"""
+        rows = yield Query("""
+            DELETE FROM income 
+            WHERE user_id = %s AND id = ANY(%s)
+            RETURNING id, date, source, amount::float8
+        """, (user_id, ids), fetch='all')
+
+        yield from self._delete_tag_links('income', [row[0] for row in rows])
+        yield from self._apply_rollup(user_id, 'income', [row[1:] for row in rows], sign=-1)
+        if rows:
+            yield from self._adjust_balance(user_id, -sum(row[3] for row in rows))
+        yield COMMIT
+        balance_cache.invalidate(user_id)
+        deleted = len(rows)
+        return deleted
+
+    @transaction()
+    def search_transactions(self, user_id: int, query: str, txn_type: str = "all", limit: int = 15,
+                            cursor_key=None, fuzzy_offset: int = None) -> Dict:
+        """
+        Поиск транзакций по категории/источнику и описанию
+
+        Сначала идут совпадения подстроки без учёта регистра, новые сверху
+        (GIN-индекс pg_trgm из миграции 0004 или индекс (user_id, date) -
+        выбирает планировщик). Страница сначала собирается из последних
+        SEARCH_RECENT_DAYS дней - планировщик отбрасывает остальные месячные
+        секции, и частое слово не заставляет просматривать всю историю
+        таблицы, где его нет; более старые записи добавляются вторым
+        запросом, только если страница не заполнилась. Когда точные
+        совпадения заканчиваются, слова запроса
+        сравниваются со словарём search_terms и ищутся похожие слова - так
+        находятся запросы с опечатками; эти записи идут по похожести, затем
+        более новые.
+
+        Точные совпадения листаются по ключу (date, id) последней показанной
+        записи, как в _get_page: cursor_key - этот ключ, без него - первая
+        страница. Похожие - по смещению fuzzy_offset среди них; если оно
+        задано, точные совпадения уже показаны все. Возвращает страницу из
+        limit записей, has_more и next - аргументы следующей страницы:
+        {"cursor_key": (date, id)} или {"fuzzy_offset": n}, None в конце.
+        """
+        escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"%{escaped}%"
+        words = [
+            word for word in _SEARCH_TERM_RE.findall(query.lower())
+            if len(word) >= SEARCH_TERM_MIN_LENGTH and not word.isdigit()
+        ]
+
+        if cursor_key is None:
+            keyset, keyset_params = "", []
+            boundary = datetime.now() - timedelta(days=SEARCH_RECENT_DAYS)
+        else:
+            # Отдельное сравнение date отсекает лишние месячные секции ещё при планировании
+            keyset = "AND date <= %s AND (date, id) < (%s, %s)"
+            keyset_params = [cursor_key[0], cursor_key[0], cursor_key[1]]
+            boundary = cursor_key[0] - timedelta(days=SEARCH_RECENT_DAYS)
+
+        exact_parts, fuzzy_parts, fuzzy_params = [], [], []
+        for kind, table, field in (("expenses", "expenses", "category"), ("income", "income", "source")):
+            if txn_type not in ("all", kind):
+                continue
+            text = f"({field} || ' ' || COALESCE(description, ''))"
+            columns = f"'{kind}' AS kind, id, user_id, amount, {field} AS name, description, date"
+            exact_parts.append(f"""(
+                SELECT {columns}
+                FROM {table}
+                WHERE user_id = %s AND {text} ILIKE %s AND {{window}} {keyset}
+                {{tail}}
+            )""")
+            fuzzy_parts.append(f"""
+                SELECT {columns},
+                       (SELECT SUM(score) FROM terms WHERE {text} ILIKE '%%' || term || '%%') AS rank
+                FROM {table}
+                WHERE user_id = %s
+                  AND {text} ILIKE ANY (ARRAY(SELECT '%%' || term || '%%' FROM terms))
+                  AND NOT {text} ILIKE %s
+            """)
+            fuzzy_params.extend([user_id, pattern])
+
+        results = {"expenses": [], "income": [], "has_more": False, "next": None}
+        if not exact_parts:
+            return results
+
+        rows = []
+        if fuzzy_offset is None:
+            # Остальная история нужна, когда совпадений мало: OFFSET 0 не даёт
+            # планировщику протащить LIMIT внутрь, и он берёт GIN-индекс вместо
+            # просмотра всей истории в порядке дат. Все записи первого запроса
+            # новее записей второго, так что страницы просто склеиваются
+            passes = (
+                ("date >= %s", "ORDER BY date DESC, id DESC LIMIT %s", True),
+                ("date < %s", "OFFSET 0", False),
+            )
+            for window, tail, limited in passes:
+                need = limit + 1 - len(rows)
+                part_params = [user_id, pattern, boundary, *keyset_params] + ([need] if limited else [])
+                exact_sql = " UNION ALL ".join(part.format(window=window, tail=tail) for part in exact_parts)
+                rows.extend((yield Query(f"""
+                    SELECT * FROM ({exact_sql}) AS exact
+                    ORDER BY date DESC, id DESC
+                    LIMIT %s
+                """, part_params * len(exact_parts) + [need], fetch='all', dict_rows=True)))
+                if len(rows) > limit:
+                    break
+            if len(rows) > limit:
+                last = rows[limit - 1]
+                results["next"] = {"cursor_key": (last['date'], last['id'])}
+            fuzzy_offset = 0
+
+        # Похожие слова ищутся отдельным запросом и только когда точных
+        # совпадений не хватает на страницу: планировать и выполнять его
+        # для каждой секции заметно дороже точного поиска
+        if len(rows) <= limit and words:
+            fuzzy_rows = yield Query(f"""
+                WITH terms AS (
+                    SELECT t.term, MAX(similarity(t.term, w.word)) AS score
+                    FROM search_terms t
+                    JOIN unnest(%s::text[]) AS w(word) ON t.term %% w.word
+                    WHERE t.user_id = %s
+                    GROUP BY t.term
+                    ORDER BY score DESC
+                    LIMIT 10
+                )
+                SELECT * FROM ({" UNION ALL ".join(fuzzy_parts)}) AS fuzzy
+                ORDER BY rank DESC, date DESC, id DESC
+                LIMIT %s OFFSET %s
+            """, [words, user_id] + fuzzy_params + [limit + 1 - len(rows), fuzzy_offset],
+                fetch='all', dict_rows=True)
+            if len(rows) + len(fuzzy_rows) > limit:
+                results["next"] = {"fuzzy_offset": fuzzy_offset + limit - len(rows)}
+            rows.extend(fuzzy_rows)
+
+        results["has_more"] = results["next"] is not None
+        for row in rows[:limit]:
+            row = dict(row)
+            kind = row.pop('kind')
+            row.pop('rank', None)
+            row['category' if kind == 'expenses' else 'source'] = row.pop('name')
+            results[kind].append(row)
+        return results
+
+    @transaction()
+    def get_summary(self, user_id: int, period: Union[Period, int] = None, filters: Dict = None) -> Dict:
+        """
+        Сводка за период без выборки строк: итоги, количество операций, суммы
+        по категориям расходов и источникам доходов.
+
+        period - Period, число последних дней или None (всё время).
+        filters - см. get_period_summary.
+        """
+        period = Period.coerce(period)
+        return (yield from self.get_period_summary.steps(
+            self, user_id, period.date_from, period.date_to, filters=filters
+        ))
 
-    def delete_income(self, user_id: int, income_id: int) -> bool:
-        """Удалить доход"""
+    @staticmethod
+    def _filter_condition(filters: Optional[Dict], kind: str):
+        """SQL-условие фильтра категорий одного вида операций и его параметры"""
+        if filters:
+            included = filters.get(f"{kind}_included")
+            excluded = filters.get(f"{kind}_excluded")
+            # Как CategoryFilter.apply_filters: список включённых важнее исключённых
+            if included:
+                return "category = ANY(%s)", [list(included)]
+            if excluded:
+                return "category <> ALL(%s)", [list(excluded)]
+        return "TRUE", []
+
+    def _period_sources(self, user_id: int, period: Period):
+        """
+        Подзапросы (kind, category, total, count) за период
+
+        По плану Period.plan(): полные дни берутся из daily_totals, неполные
+        крайние дни - из строк expenses/income. Возвращает (список SQL-частей
+        для UNION ALL, параметры).
+        """
+        parts = []
+        params = []
+
+        days, edges = period.plan()
+        if days is not None:
+            first_day, last_day = days
+            rollup_sql = "SELECT kind, category, total, count FROM daily_totals WHERE user_id = %s"
+            params.append(user_id)
+            if first_day:
+                rollup_sql += " AND day >= %s"
+                params.append(first_day)
+            if last_day:
+                rollup_sql += " AND day < %s"
+                params.append(last_day)
+            parts.append(rollup_sql)
+
+        for edge_from, edge_to in edges:
+            parts.append("""
+                SELECT 'expense', category, amount::float8, 1 FROM expenses
+                WHERE user_id = %s AND date >= %s AND date < %s
+                UNION ALL
+                SELECT 'income', source, amount::float8, 1 FROM income
+                WHERE user_id = %s AND date >= %s AND date < %s
+            """)
+            params.extend([user_id, edge_from, edge_to, user_id, edge_from, edge_to])
+
+        return parts, params
+
+    @transaction()
+    def get_period_summary(self, user_id: int, date_from: datetime = None,
+                           date_to: datetime = None, filters: Dict = None) -> Dict:
+        """
+        Сводка за период [date_from, date_to); None - граница не ограничена
+
+        Полные дни периода берутся из дневных итогов daily_totals, неполные
+        крайние дни досчитываются по строкам expenses/income. Всё считается
+        одним запросом, стоимость зависит от числа дней и категорий, а не
+        от числа транзакций.
+
+        filters - фильтры категорий в формате CategoryFilter.get_all_filters().
+        Итоги, количества и суммы по категориям тогда считаются только по
+        прошедшим фильтр категориям; исключённые категории сворачиваются в
+        БД в одну строку на вид операции и попадают только в 'unfiltered'
+        (итоги без фильтров из того же запроса).
+        """
+        parts, params = self._period_sources(user_id, Period(date_from, date_to))
+
+        rows = []
+        if parts:
+            expense_sql, expense_params = self._filter_condition(filters, 'expense')
+            income_sql, income_params = self._filter_condition(filters, 'income')
+            rows = yield Query(f"""
+                SELECT kind, CASE WHEN passed THEN category END, passed, SUM(total), SUM(count)
+                FROM (
+                    SELECT kind, category, total, count,
+                           CASE WHEN kind = 'expense' THEN {expense_sql} ELSE {income_sql} END AS passed
+                    FROM ({" UNION ALL ".join(parts)}) AS t (kind, category, total, count)
+                ) AS f
+                GROUP BY 1, 2, 3
+                ORDER BY 4 DESC
+            """, expense_params + income_params + params, fetch='all')
+
+        expenses_by_category = {}
+        income_by_source = {}
+        expenses_count = 0
+        income_count = 0
+        excluded = {'expense': [0, 0], 'income': [0, 0]}
+        filters_applied = False
+        for kind, name, passed, total, count in rows:
+            if not passed:
+                excluded[kind] = [total, int(count)]
+                filters_applied = True
+            elif kind == 'expense':
+                expenses_by_category[name] = total
+                expenses_count += int(count)
+            else:
+                income_by_source[name] = total
+                income_count += int(count)
+
+        total_expenses = sum(expenses_by_category.values())
+        total_income = sum(income_by_source.values())
+        all_expenses = total_expenses + excluded['expense'][0]
+        all_income = total_income + excluded['income'][0]
+
+        return {
+            'total_expenses': total_expenses,
+            'total_income': total_income,
+            'balance': total_income - total_expenses,
+            'expenses_count': expenses_count,
+            'income_count': income_count,
+            'expenses_by_category': expenses_by_category,
+            'income_by_source': income_by_source,
+            'filters_applied': filters_applied,
+            'unfiltered': {
+                'total_expenses': all_expenses,
+                'total_income': all_income,
+                'balance': all_income - all_expenses,
+                'expenses_count': expenses_count + excluded['expense'][1],
+                'income_count': income_count + excluded['income'][1]
+            }
+        }
+
+    @transaction()
+    def get_window_summaries(self, user_id: int, windows: Dict[str, tuple],
+                             filters: Dict = None) -> Dict[str, Dict]:
+        """
+        Сводки get_period_summary сразу за несколько периодов одним запросом
+
+        windows - {имя: Period или (date_from, date_to)}, None - граница не ограничена.
+        Границы всех периодов делят время на отрезки; дневные итоги и строки
+        дней, внутри которых проходит граница, читаются один раз и
+        суммируются по отрезкам (width_bucket), а периоды собираются из
+        отрезков. Сводка периода дополнительно содержит суммы по всем
+        категориям без фильтров в 'unfiltered' (для достижений и фактов).
+        """
+        windows = {
+            name: (window.date_from, window.date_to) if isinstance(window, Period) else window
+            for name, window in windows.items()
+        }
+        bounds = sorted({
+            moment for window in windows.values() for moment in window if moment is not None
+        })
+        edge_days = sorted({moment.date() for moment in bounds if moment != day_start(moment.date())})
+
+        # Если у всех периодов есть начало, дни раньше самого раннего не нужны
+        since = bounds[0].date() if bounds and all(w[0] is not None for w in windows.values()) else None
+        parts = ["""
+            SELECT kind, category, total, count, day::timestamp FROM daily_totals
+            WHERE user_id = %s AND day <> ALL(%s::date[]) AND (%s::date IS NULL OR day >= %s)
+        """]
+        source_params = [user_id, edge_days, since, since]
+        for day in edge_days:
+            day_from = day_start(day)
+            day_to = day_from + timedelta(days=1)
+            parts.append("""
+                SELECT 'expense', category, amount::float8, 1, date FROM expenses
+                WHERE user_id = %s AND date >= %s AND date < %s
+                UNION ALL
+                SELECT 'income', source, amount::float8, 1, date FROM income
+                WHERE user_id = %s AND date >= %s AND date < %s
+            """)
+            source_params.extend([user_id, day_from, day_to, user_id, day_from, day_to])
+
+        expense_sql, expense_params = self._filter_condition(filters, 'expense')
+        income_sql, income_params = self._filter_condition(filters, 'income')
+        rows = yield Query(f"""
+            SELECT kind, category,
+                   CASE WHEN kind = 'expense' THEN {expense_sql} ELSE {income_sql} END,
+                   width_bucket(at, %s::timestamp[]), SUM(total), SUM(count)
+            FROM ({" UNION ALL ".join(parts)}) AS t (kind, category, total, count, at)
+            GROUP BY 1, 2, 4
+        """, expense_params + income_params + [bounds] + source_params, fetch='all')
+
+        def by_total(values):
+            return dict(sorted(values.items(), key=lambda item: item[1], reverse=True))
+
+        summaries = {}
+        for name, (date_from, date_to) in windows.items():
+            # Отрезок i - [bounds[i-1], bounds[i]); отрезки периода идут подряд
+            first = bounds.index(date_from) + 1 if date_from is not None else 0
+            last = bounds.index(date_to) if date_to is not None else len(bounds)
+            totals = {'expense': ({}, {}), 'income': ({}, {})}
+            counts = {'expense': [0, 0], 'income': [0, 0]}
+            filters_applied = False
+            for kind, category, passed, bucket, total, count in rows:
+                if not first <= bucket <= last:
+                    continue
+                filtered, unfiltered = totals[kind]
+                unfiltered[category] = unfiltered.get(category, 0) + total
+                counts[kind][1] += int(count)
+                if passed:
+                    filtered[category] = filtered.get(category, 0) + total
+                    counts[kind][0] += int(count)
+                else:
+                    filters_applied = True
+
+            expenses, all_expenses = (by_total(d) for d in totals['expense'])
+            income, all_income = (by_total(d) for d in totals['income'])
+            total_expenses = sum(expenses.values())
+            total_income = sum(income.values())
+            total_all_expenses = sum(all_expenses.values())
+            total_all_income = sum(all_income.values())
+            summaries[name] = {
+                'total_expenses': total_expenses,
+                'total_income': total_income,
+                'balance': total_income - total_expenses,
+                'expenses_count': counts['expense'][0],
+                'income_count': counts['income'][0],
+                'expenses_by_category': expenses,
+                'income_by_source': income,
+                'filters_applied': filters_applied,
+                'unfiltered': {
+                    'total_expenses': total_all_expenses,
+                    'total_income': total_all_income,
+                    'balance': total_all_income - total_all_expenses,
+                    'expenses_count': counts['expense'][1],
+                    'income_count': counts['income'][1],
+                    'expenses_by_category': all_expenses,
+                    'income_by_source': all_income
+                }
+            }
+        return summaries
+
+    @transaction()
+    def get_statistics(self, user_id: int, period: Union[Period, int] = None,
+                       include_rows: bool = True) -> Dict:
+        """
+        Получить статистику
+
+        То же, что get_summary(), плюс списки операций 'expenses' и 'income'.
+        Если строки не нужны, используйте get_summary() или include_rows=False.
+        """
+        period = Period.coerce(period)
+        stats = yield from self.get_summary.steps(self, user_id, period)
+        if include_rows:
+            stats['expenses'] = yield from self.get_expenses.steps(self, user_id, period)
+            stats['income'] = yield from self.get_income.steps(self, user_id, period)
+        return stats
+
+    def _rebuild_rollups(self, cursor, user_id: int = None):
+        """Пересчитать daily_totals, category_stats и user_totals из expenses/income (в транзакции вызывающего)"""
+        user_filter = "WHERE user_id = %s" if user_id is not None else ""
+        params = (user_id,) if user_id is not None else ()
+
+        # Блокировка не даёт параллельным add/delete изменить итоги посреди пересчёта
+        cursor.execute("LOCK TABLE daily_totals IN SHARE ROW EXCLUSIVE MODE")
+        cursor.execute(f"DELETE FROM daily_totals {user_filter}", params)
+        cursor.execute(f"""
+            INSERT INTO daily_totals (user_id, day, kind, category, total, count)
+            SELECT user_id, date::date, 'expense', category, SUM(amount::float8), COUNT(*)
+            FROM expenses {user_filter}
+            GROUP BY user_id, date::date, category
+        """, params)
+        cursor.execute(f"""
+            INSERT INTO daily_totals (user_id, day, kind, category, total, count)
+            SELECT user_id, date::date, 'income', source, SUM(amount::float8), COUNT(*)
+            FROM income {user_filter}
+            GROUP BY user_id, date::date, source
+        """, params)
+
+        cursor.execute("LOCK TABLE category_stats IN SHARE ROW EXCLUSIVE MODE")
+        cursor.execute(f"DELETE FROM category_stats {user_filter}", params)
+        cursor.execute(f"""
+            INSERT INTO category_stats (user_id, category, count, mean, m2, rate, rate_at)
+            {self._category_stats_sql(user_filter)}
+        """, params)
+
+        cursor.execute("LOCK TABLE user_totals IN SHARE ROW EXCLUSIVE MODE")
+        cursor.execute(f"DELETE FROM user_totals {user_filter}", params)
+        cursor.execute(f"""
+            INSERT INTO user_totals
+                (user_id, expenses_count, expenses_total, income_count, income_total, first_at, last_at)
+            {self._user_totals_sql(user_filter)}
+        """, params * 2)
+
+    @staticmethod
+    def _user_totals_sql(user_filter: str) -> str:
+        """SELECT счётчиков user_totals из expenses/income, как в миграции 0006"""
+        return f"""
+            SELECT user_id,
+                   COALESCE(SUM(count) FILTER (WHERE kind = 'expense'), 0),
+                   COALESCE(SUM(total) FILTER (WHERE kind = 'expense'), 0),
+                   COALESCE(SUM(count) FILTER (WHERE kind = 'income'), 0),
+                   COALESCE(SUM(total) FILTER (WHERE kind = 'income'), 0),
+                   MIN(first_at), MAX(last_at)
+            FROM (
+                SELECT user_id, 'expense' AS kind, COUNT(*) AS count, SUM(amount::float8) AS total,
+                       MIN(date) AS first_at, MAX(date) AS last_at
+                FROM expenses {user_filter} GROUP BY user_id
+                UNION ALL
+                SELECT user_id, 'income', COUNT(*), SUM(amount::float8), MIN(date), MAX(date)
+                FROM income {user_filter} GROUP BY user_id
+            ) AS t
+            GROUP BY user_id
+        """
+
+    @staticmethod
+    def _category_stats_sql(user_filter: str) -> str:
+        """SELECT статистики категорий из expenses, как в миграции 0005"""
+        return f"""
+            SELECT user_id, category, COUNT(*), AVG(amount::float8),
+                   COALESCE(VAR_POP(amount::float8) * COUNT(*), 0),
+                   SUM(amount::float8 * exp(-LEAST(extract(epoch FROM last_at - date)
+                                                   / 86400 / {CATEGORY_RATE_DAYS}, 700))) / {CATEGORY_RATE_DAYS},
+                   last_at
+            FROM (
+                SELECT user_id, category, amount, date,
+                       MAX(date) OVER (PARTITION BY user_id, category) AS last_at
+                FROM expenses {user_filter}
+            ) AS e
+            GROUP BY user_id, category, last_at
+        """
+
+    def rebuild_rollups(self, user_id: int = None):
+        """Пересобрать дневные итоги, статистику категорий и счётчики user_totals для пользователя или для всех"""
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
-            cursor.execute("""
-                DELETE FROM income WHERE id = %s AND user_id = %s
-            """, (income_id, user_id))
-
+            self._rebuild_rollups(cursor, user_id)
             conn.commit()
-            deleted = cursor.rowcount > 0
-            return deleted
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error rebuilding rollups: {e}")
+            raise
         finally:
             cursor.close()
             self.return_connection(conn)
 
-    def delete_expenses_bulk(self, user_id: int, ids: List[int]) -> int:
-        """Массовое удаление расходов"""
+    def verify_rollups(self, user_id: int = None) -> List[Dict]:
+        """
+        Сверить daily_totals с expenses/income
+
+        Возвращает расхождения: строки, где сумма или количество отличаются
+        (пустой список - итоги верны).
+        """
+        user_filter = "WHERE user_id = %s" if user_id is not None else ""
+        params = (user_id,) * 3 if user_id is not None else ()
+
         conn = self.get_connection()
         try:
-            cursor = conn.cursor()
-            cursor.execute("""
-                DELETE FROM expenses 
-                WHERE user_id = %s AND id = ANY(%s)
-            """, (user_id, ids))
-            
-            conn.commit()
-            deleted = cursor.rowcount
-            return deleted
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute(f"""
+                WITH actual AS (
+                    SELECT user_id, date::date AS day, 'expense' AS kind, category,
+                           SUM(amount::float8) AS total, COUNT(*) AS count
+                    FROM expenses {user_filter}
+                    GROUP BY user_id, date::date, category
+                    UNION ALL
+                    SELECT user_id, date::date, 'income', source,
+                           SUM(amount::float8), COUNT(*)
+                    FROM income {user_filter}
+                    GROUP BY user_id, date::date, source
+                ),
+                stored AS (
+                    SELECT * FROM daily_totals {user_filter}
+                )
+                SELECT COALESCE(a.user_id, s.user_id) AS user_id,
+                       COALESCE(a.day, s.day) AS day,
+                       COALESCE(a.kind, s.kind) AS kind,
+                       COALESCE(a.category, s.category) AS category,
+                       s.total AS stored_total, a.total AS actual_total,
+                       s.count AS stored_count, a.count AS actual_count
+                FROM actual a
+                FULL OUTER JOIN stored s
+                  ON s.user_id = a.user_id AND s.day = a.day
+                 AND s.kind = a.kind AND s.category = a.category
+                WHERE s.count IS DISTINCT FROM a.count
+                   OR ABS(COALESCE(s.total, 0) - COALESCE(a.total, 0)) > 0.005
+                ORDER BY 1, 2, 3, 4
+            """, params)
+            return [dict(row) for row in cursor.fetchall()]
         finally:
             cursor.close()
             self.return_connection(conn)
 
-    def delete_income_bulk(self, user_id: int, ids: List[int]) -> int:
-        """Массовое удаление доходов"""
+    def verify_category_stats(self, user_id: int = None) -> List[Dict]:
+        """
+        Сверить category_stats с expenses
+
+        Возвращает категории, где число трат, среднее, разброс или скорость
+        отличаются от пересчитанных (пустой список - статистика верна).
+        """
+        user_filter = "WHERE user_id = %s" if user_id is not None else ""
+        params = (user_id,) * 2 if user_id is not None else ()
+
         conn = self.get_connection()
         try:
-            cursor = conn.cursor()
-            cursor.execute("""
-                DELETE FROM income 
-                WHERE user_id = %s AND id = ANY(%s)
-            """, (user_id, ids))
-            
-            conn.commit()
-            deleted = cursor.rowcount
-            return deleted
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute(f"""
+                WITH actual (user_id, category, count, mean, m2, rate, rate_at) AS (
+                    {self._category_stats_sql(user_filter)}
+                ),
+                stored AS (
+                    SELECT * FROM category_stats {user_filter}
+                )
+                SELECT COALESCE(a.user_id, s.user_id) AS user_id,
+                       COALESCE(a.category, s.category) AS category,
+                       s.count AS stored_count, a.count AS actual_count,
+                       s.mean AS stored_mean, a.mean AS actual_mean,
+                       s.m2 AS stored_m2, a.m2 AS actual_m2,
+                       s.rate AS stored_rate, a.rate AS actual_rate
+                FROM actual a
+                FULL OUTER JOIN stored s
+                  ON s.user_id = a.user_id AND s.category = a.category
+                WHERE s.count IS DISTINCT FROM a.count
+                   OR ABS(s.mean - a.mean) > 0.005 + 1e-9 * ABS(a.mean)
+                   OR ABS(s.m2 - a.m2) > 0.01 + 1e-6 * ABS(a.m2)
+                   OR ABS(s.rate * exp(-LEAST(extract(epoch FROM a.rate_at - s.rate_at)
+                                             / 86400 / {CATEGORY_RATE_DAYS}, 700)) - a.rate)
+                      > 0.005 + 1e-6 * ABS(a.rate)
+                ORDER BY 1, 2
+            """, params)
+            return [dict(row) for row in cursor.fetchall()]
         finally:
             cursor.close()
             self.return_connection(conn)
 
-    def search_transactions(self, user_id: int, query: str, 
-                          txn_type: str = "all", limit: int = 15) -> Dict:
-        """Поиск транзакций"""
+    def verify_user_totals(self, user_id: int = None) -> List[Dict]:
+        """
+        Сверить user_totals с expenses/income
+
+        Возвращает пользователей, у которых счётчики, суммы или даты первой и
+        последней операции отличаются от пересчитанных (пустой список - верно).
+        """
+        user_filter = "WHERE user_id = %s" if user_id is not None else ""
+        params = (user_id,) * 3 if user_id is not None else ()
+
         conn = self.get_connection()
         try:
             cursor = conn.cursor(cursor_factory=RealDictCursor)
-            results = {"expenses": [], "income": []}
-            
-            search_pattern = f"%{query}%"
-            
-            if txn_type in ("all", "expenses"):
-                cursor.execute("""
-                    SELECT * FROM expenses
-                    WHERE user_id = %s 
-                    AND (LOWER(category) LIKE LOWER(%s) 
-                         OR LOWER(description) LIKE LOWER(%s))
-                    ORDER BY date DESC
-                    LIMIT %s
-                """, (user_id, search_pattern, search_pattern, limit))
-                results["expenses"] = [dict(row) for row in cursor.fetchall()]
-            
-            if txn_type in ("all", "income"):
-                cursor.execute("""
-                    SELECT * FROM income
-                    WHERE user_id = %s 
-                    AND (LOWER(source) LIKE LOWER(%s) 
-                         OR LOWER(description) LIKE LOWER(%s))
-                    ORDER BY date DESC
-                    LIMIT %s
-                """, (user_id, search_pattern, search_pattern, limit))
-                results["income"] = [dict(row) for row in cursor.fetchall()]
-            
-            return results
+            cursor.execute(f"""
+                WITH actual (user_id, expenses_count, expenses_total, income_count, income_total,
+                             first_at, last_at) AS (
+                    {self._user_totals_sql(user_filter)}
+                ),
+                stored AS (
+                    SELECT * FROM user_totals {user_filter}
+                )
+                SELECT COALESCE(a.user_id, s.user_id) AS user_id,
+                       s.expenses_count AS stored_expenses_count, a.expenses_count AS actual_expenses_count,
+                       s.income_count AS stored_income_count, a.income_count AS actual_income_count,
+                       s.expenses_total AS stored_expenses_total, a.expenses_total AS actual_expenses_total,
+                       s.income_total AS stored_income_total, a.income_total AS actual_income_total,
+                       s.first_at AS stored_first_at, a.first_at AS actual_first_at,
+                       s.last_at AS stored_last_at, a.last_at AS actual_last_at
+                FROM actual a
+                FULL OUTER JOIN stored s ON s.user_id = a.user_id
+                WHERE s.expenses_count IS DISTINCT FROM a.expenses_count
+                   OR s.income_count IS DISTINCT FROM a.income_count
+                   OR ABS(COALESCE(s.expenses_total, 0) - COALESCE(a.expenses_total, 0)) > 0.005
+                   OR ABS(COALESCE(s.income_total, 0) - COALESCE(a.income_total, 0)) > 0.005
+                   OR s.first_at IS DISTINCT FROM a.first_at
+                   OR s.last_at IS DISTINCT FROM a.last_at
+                ORDER BY 1
+            """, params)
+            return [dict(row) for row in cursor.fetchall()]
         finally:
             cursor.close()
             self.return_connection(conn)
 
-    def get_statistics(self, user_id: int, days: int = None) -> Dict:
-        """Получить статистику"""
-        expenses = self.get_expenses(user_id, days)
-        income = self.get_income(user_id, days)
-        
-        total_expenses = sum(e['amount'] for e in expenses)
-        total_income = sum(i['amount'] for i in income)
-        
-        expenses_by_category = {}
-        for exp in expenses:
-            cat = exp['category']
-            expenses_by_category[cat] = expenses_by_category.get(cat, 0) + exp['amount']
-        
-        income_by_source = {}
-        for inc in income:
-            src = inc['source']
-            income_by_source[src] = income_by_source.get(src, 0) + inc['amount']
-        
-        return {
-            'total_expenses': total_expenses,
-            'total_income': total_income,
-            'balance': total_income - total_expenses,
-            'expenses_count': len(expenses),
-            'income_count': len(income),
-            'expenses': expenses,
-            'income': income,
-            'expenses_by_category': expenses_by_category,
-            'income_by_source': income_by_source
-        }
-
     def close_all_connections(self):
         """Закрыть все соединения"""
-        if self.connection_pool:
-            self.connection_pool.closeall()
-            logger.info("All connections closed")
\ No newline at end of file
+        with self._pool_lock:
+            if self.connection_pool:
+                self.connection_pool.closeall()
+                self.connection_pool = None
+                self._ready = False
+                logger.info("All connections closed")
+
+
+_database: Optional[Database] = None
+_database_lock = threading.Lock()
+
+
+def get_database() -> Database:
+    """Общий для всего процесса экземпляр Database (пул создаётся при первом запросе)"""
+    global _database
+    if _database is None:
+        with _database_lock:
+            if _database is None:
+                _database = Database()
+    return _database
@@ -1,8 +1,13 @@
+import functools
+import io
+import logging
 import os
+import tempfile
 from datetime import datetime
+from typing import Dict, Iterator, Tuple, Union
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, PatternFill
-from openpyxl.utils import get_column_letter
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -13,8 +18,11 @@ from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.enums import TA_LEFT, TA_CENTER
 
 from database import Database
+from periods import Period
 from utils import format_currency, format_date
 
+logger = logging.getLogger(__name__)
+
 
 def _normalize_date(date_value):
     """Нормализация даты для обработки"""
@@ -34,269 +42,300 @@ def _normalize_date(date_value):
     return str(date_value)
 
 
-def export_to_excel(db: Database, user_id: int, days: int = None) -> str:
+# Ширина столбца описаний в Excel: при потоковой записи ширины задаются до строк
+EXCEL_DESCRIPTION_WIDTH = 50
+# Экспорт держится в памяти до этого размера, дальше - во временном файле
+EXPORT_SPOOL_BYTES = int(os.getenv("EXPORT_SPOOL_BYTES", str(8 * 1024 * 1024)))
+
+_MONEY_FORMAT = '#,##0.00" руб."'
+_DATE_FORMAT = 'DD.MM.YYYY HH:MM'
+
+
+def _excel_widths(stats: Dict) -> Dict[str, float]:
+    """
+    Ширины столбцов A-D по итогам периода
+
+    В write-only листе ширины пишутся перед первой строкой, поэтому они
+    считаются заранее: названия категорий и источников известны из итогов,
+    суммы операций не больше итога своей категории, даты - одного формата.
+    """
+    names = list(stats['expenses_by_category']) + list(stats['income_by_source'])
+    largest = max(
+        [stats['total_income'], stats['total_expenses'], abs(stats['balance'])], default=0
+    )
+    name_width = max((len(name) for name in names), default=0)
+    money_width = len(f"{largest:,.2f} руб.")
+    return {
+        'A': min(max(name_width, len("16.10.2025 12:30"), len("Расходы:")) + 2, 50),
+        'B': min(max(name_width, money_width, len("Категория")) + 2, 50),
+        'C': min(max(money_width, len("Сумма")) + 2, 50),
+        'D': EXCEL_DESCRIPTION_WIDTH
+    }
+
+
+def export_to_excel(db: Database, user_id: int, period: Union[Period, int, None] = None):
     """
     Экспорт данных в Excel
-    
+
+    Книга пишется в режиме write-only: операции читаются из БД серверным
+    курсором порциями (Database.iter_operations) и сразу уходят в файл, так
+    что память не растёт с длиной истории. Даты и суммы - числовые ячейки
+    Excel с форматом.
+
     Args:
         db: экземпляр базы данных
         user_id: ID пользователя
-        days: количество дней или None для всех данных
+        period: Period, количество дней или None для всех данных
+
+    Returns:
+        Файловый объект с .xlsx, позиция в начале (в памяти до
+        EXPORT_SPOOL_BYTES, дальше - временный файл); закрыть после отправки.
     """
-    stats = db.get_statistics(user_id, days)
-    
-    wb = Workbook()
-    ws = wb.active
-    period_text = f"{days} дней" if days else "все время"
-    ws.title = f"Финансы {period_text}"
-    
-    ws.merge_cells('A1:D1')
-    header_cell = ws['A1']
-    header_cell.value = f"Финансовый отчет за {period_text}"
-    header_cell.font = Font(size=16, bold=True, color="FFFFFF")
-    header_cell.alignment = Alignment(horizontal='center')
-    header_cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    
-    ws['A3'] = "Общая статистика"
-    ws['A3'].font = Font(bold=True, size=14)
-    
-    ws['A4'] = "Доходы:"
-    ws['B4'] = f"{stats['total_income']:,.2f} руб."
-    ws['A5'] = "Расходы:"
-    ws['B5'] = f"{stats['total_expenses']:,.2f} руб."
-    ws['A6'] = "Баланс:"
-    ws['B6'] = f"{stats['balance']:,.2f} руб."
-    ws['B6'].font = Font(bold=True)
-    
-    row = 8
-    ws[f'A{row}'] = "Расходы по категориям"
-    ws[f'A{row}'].font = Font(bold=True, size=14)
-    row += 1
-    
-    ws[f'A{row}'] = "Категория"
-    ws[f'B{row}'] = "Сумма"
-    ws[f'A{row}'].font = Font(bold=True)
-    ws[f'B{row}'].font = Font(bold=True)
-    row += 1
-    
-    for cat, amount in sorted(stats['expenses_by_category'].items(), key=lambda x: x[1], reverse=True):
-        ws[f'A{row}'] = cat
-        ws[f'B{row}'] = f"{amount:,.2f} руб."
-        row += 1
-    
-    row += 1
-    ws[f'A{row}'] = "Доходы по источникам"
-    ws[f'A{row}'].font = Font(bold=True, size=14)
-    row += 1
-    
-    ws[f'A{row}'] = "Источник"
-    ws[f'B{row}'] = "Сумма"
-    ws[f'A{row}'].font = Font(bold=True)
-    ws[f'B{row}'].font = Font(bold=True)
-    row += 1
-    
-    for src, amount in sorted(stats['income_by_source'].items(), key=lambda x: x[1], reverse=True):
-        ws[f'A{row}'] = src
-        ws[f'B{row}'] = f"{amount:,.2f} руб."
-        row += 1
-    
-    row += 2
-    ws[f'A{row}'] = "Детализация расходов"
-    ws[f'A{row}'].font = Font(bold=True, size=14)
-    row += 1
-    
-    ws[f'A{row}'] = "Дата"
-    ws[f'B{row}'] = "Категория"
-    ws[f'C{row}'] = "Сумма"
-    ws[f'D{row}'] = "Описание"
-    for col in ['A', 'B', 'C', 'D']:
-        ws[f'{col}{row}'].font = Font(bold=True)
-        ws[f'{col}{row}'].fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
-    row += 1
-    
-    for exp in sorted(stats['expenses'], key=lambda x: x.get('date') or datetime.min, reverse=True):
-        date_str = _normalize_date(exp.get('date'))
-        ws[f'A{row}'] = date_str
-        ws[f'B{row}'] = exp['category']
-        ws[f'C{row}'] = exp['amount']
-        ws[f'D{row}'] = exp.get('description') or ''
-        row += 1
-    
-    row += 1
-    ws[f'A{row}'] = "Детализация доходов"
-    ws[f'A{row}'].font = Font(bold=True, size=14)
-    row += 1
-    
-    ws[f'A{row}'] = "Дата"
-    ws[f'B{row}'] = "Источник"
-    ws[f'C{row}'] = "Сумма"
-    ws[f'D{row}'] = "Описание"
-    for col in ['A', 'B', 'C', 'D']:
-        ws[f'{col}{row}'].font = Font(bold=True)
-        ws[f'{col}{row}'].fill = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
-    row += 1
-    
-    for inc in sorted(stats['income'], key=lambda x: x.get('date') or datetime.min, reverse=True):
-        date_str = _normalize_date(inc.get('date'))
-        ws[f'A{row}'] = date_str
-        ws[f'B{row}'] = inc['source']
-        ws[f'C{row}'] = inc['amount']
-        ws[f'D{row}'] = inc.get('description') or ''
-        row += 1
-    
-    for column in ws.columns:
-        max_length = 0
-        column_letter = get_column_letter(column[0].column)
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws.column_dimensions[column_letter].width = adjusted_width
-    
-    period_suffix = f"{days}days" if days else "alltime"
-    filename = f"finance_export_{user_id}_{period_suffix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    filepath = os.path.join(os.getcwd(), filename)
-    wb.save(filepath)
-    
-    return filepath
+    period = Period.coerce(period)
+    stats = db.get_summary(user_id, period)
+    period_text = period.label
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(f"Финансы {period_text}"[:31])
+    for column, width in _excel_widths(stats).items():
+        ws.column_dimensions[column].width = width
+    ws.merged_cells.add('A1:D1')
+
+    def styled(value, font: Font = None, fill: PatternFill = None, number_format: str = None):
+        cell = WriteOnlyCell(ws, value)
+        if font:
+            cell.font = font
+        if fill:
+            cell.fill = fill
+        if number_format:
+            cell.number_format = number_format
+        return cell
+
+    title_font = Font(bold=True, size=14)
+    bold = Font(bold=True)
+    grey = PatternFill(start_color="D3D3D3", end_color="D3D3D3", fill_type="solid")
+
+    header = styled(
+        f"Финансовый отчет за {period_text}", Font(size=16, bold=True, color="FFFFFF"),
+        PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+    )
+    header.alignment = Alignment(horizontal='center')
+    ws.append([header])
+    ws.append([])
+
+    ws.append([styled("Общая статистика", title_font)])
+    ws.append(["Доходы:", styled(stats['total_income'], number_format=_MONEY_FORMAT)])
+    ws.append(["Расходы:", styled(stats['total_expenses'], number_format=_MONEY_FORMAT)])
+    ws.append(["Баланс:", styled(stats['balance'], bold, number_format=_MONEY_FORMAT)])
+    ws.append([])
+
+    for title, column, totals in (
+        ("Расходы по категориям", "Категория", stats['expenses_by_category']),
+        ("Доходы по источникам", "Источник", stats['income_by_source'])
+    ):
+        ws.append([styled(title, title_font)])
+        ws.append([styled(column, bold), styled("Сумма", bold)])
+        for name, amount in sorted(totals.items(), key=lambda x: x[1], reverse=True):
+            ws.append([name, styled(amount, number_format=_MONEY_FORMAT)])
+        ws.append([])
+
+    for title, column, kind in (
+        ("Детализация расходов", "Категория", 'expense'),
+        ("Детализация доходов", "Источник", 'income')
+    ):
+        ws.append([])
+        ws.append([styled(title, title_font)])
+        ws.append([styled(name, bold, grey) for name in ("Дата", column, "Сумма", "Описание")])
+        # append пишет строку сразу, поэтому ячейки с форматом переиспользуются
+        date_cell = styled(None, number_format=_DATE_FORMAT)
+        amount_cell = styled(None, number_format=_MONEY_FORMAT)
+        for date_value, name, amount, description in db.iter_operations(user_id, kind, period):
+            date_cell.value = date_value
+            amount_cell.value = amount
+            ws.append([date_cell, name, amount_cell, description])
+
+    buffer = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES)
+    try:
+        wb.save(buffer)
+    except Exception:
+        buffer.close()
+        raise
+    buffer.seek(0)
+    return buffer
+
+
+# Строк операций в одной таблице PDF - страница: кадр A4 с полями 20 мм около
+# 716 pt, строка шрифтом 8 с отступами 1+2 - 12,6 pt, то есть 56 строк с шапкой
+PDF_TABLE_ROWS = 54
+# Описание в PDF обрезается до столбца (ячейки таблицы не переносят строки)
+PDF_DESCRIPTION_CHARS = 32
+PDF_FONT_PATHS = {
+    'DejaVu': '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    'DejaVu-Bold': '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _pdf_fonts() -> Tuple[str, str]:
+    """Регистрация шрифтов с кириллицей - один раз на процесс; (обычный, жирный)"""
+    try:
+        for name, path in PDF_FONT_PATHS.items():
+            pdfmetrics.registerFont(TTFont(name, path))
+        return 'DejaVu', 'DejaVu-Bold'
+    except Exception as e:
+        logger.warning(f"DejaVu fonts are not available, PDF falls back to Helvetica: {e}")
+        return 'Helvetica', 'Helvetica-Bold'
+
+
+@functools.lru_cache(maxsize=None)
+def _pdf_styles() -> Dict:
+    """Стили абзацев и таблиц отчёта (создаются один раз, после _pdf_fonts)"""
+    font_name, font_bold = _pdf_fonts()
+    styles = getSampleStyleSheet()
+    grid = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+        ('FONTNAME', (0, 0), (-1, -1), font_name),
+    ]
+    return {
+        'title': ParagraphStyle(
+            'CustomTitle', parent=styles['Title'], fontName=font_bold,
+            fontSize=18, alignment=TA_CENTER, spaceAfter=12
+        ),
+        'heading': ParagraphStyle(
+            'CustomHeading', parent=styles['Heading2'], fontName=font_bold,
+            fontSize=14, spaceAfter=6
+        ),
+        'summary': TableStyle(grid + [('ALIGN', (1, 0), (1, -1), 'RIGHT'), ('FONTSIZE', (0, 0), (-1, -1), 10)]),
+        'totals': TableStyle(grid + [('FONTNAME', (0, 0), (-1, 0), font_bold)]),
+        'ledger': TableStyle(grid + [
+            ('FONTNAME', (0, 0), (-1, 0), font_bold),
+            ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 1),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 2)
+        ])
+    }
+
+
+class _StreamedStory(list):
+    """
+    Список flowables для doc.build, который дополняется из генератора
 
+    build забирает flowables с начала списка (del flowables[0]); в списке
+    держится не больше ahead следующих, поэтому таблицы операций создаются
+    по мере вёрстки, а не все сразу.
+    """
+
+    def __init__(self, flowables: Iterator, ahead: int = 4):
+        super().__init__()
+        self._source = iter(flowables)
+        self._ahead = ahead
+        self._refill()
+
+    def _refill(self):
+        while len(self) < self._ahead:
+            item = next(self._source, None)
+            if item is None:
+                return
+            self.append(item)
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._refill()
+
+
+def _ledger_tables(db: Database, user_id: int, kind: str, period: Period, column: str) -> Iterator:
+    """Все операции периода таблицами по PDF_TABLE_ROWS строк (строки читаются Database.iter_operations)"""
+    style = _pdf_styles()['ledger']
+    header = ["Дата", column, "Сумма", "Описание"]
+    widths = [30 * mm, 42 * mm, 28 * mm, 70 * mm]
+    rows = []
+    for date_value, name, amount, description in db.iter_operations(user_id, kind, period):
+        if len(description) > PDF_DESCRIPTION_CHARS:
+            description = description[:PDF_DESCRIPTION_CHARS - 1] + "…"
+        rows.append([_normalize_date(date_value), name, f"{format_currency(amount)} руб.", description])
+        if len(rows) == PDF_TABLE_ROWS:
+            yield Table([header] + rows, colWidths=widths, style=style, repeatRows=1)
+            rows = []
+    if rows:
+        yield Table([header] + rows, colWidths=widths, style=style, repeatRows=1)
 
-def export_to_pdf(db: Database, user_id: int, days: int = None) -> str:
+
+def export_to_pdf(db: Database, user_id: int, period: Union[Period, int, None] = None,
+                  summary_only: bool = False) -> io.BytesIO:
     """
     Экспорт данных в PDF с поддержкой кириллицы
-    
+
+    Итоги берутся из get_summary (дневные итоги, без чтения операций). Если
+    не summary_only, дальше идут все операции периода: строки читаются
+    серверным курсором и вёрстываются таблицами по PDF_TABLE_ROWS строк по
+    мере вывода страниц (_StreamedStory), так что в памяти - только готовые
+    страницы PDF, а не список операций.
+
     Args:
         db: экземпляр базы данных
         user_id: ID пользователя
-        days: количество дней или None для всех данных
+        period: Period, количество дней или None для всех данных
+        summary_only: только итоги и суммы по категориям (быстро при любой истории)
+
+    Returns:
+        BytesIO с PDF, позиция в начале
     """
-    stats = db.get_statistics(user_id, days)
-    period_suffix = f"{days}days" if days else "alltime"
-    filename = f"finance_report_{user_id}_{period_suffix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    filepath = os.path.join(os.getcwd(), filename)
-    try:
-        pdfmetrics.registerFont(TTFont('DejaVu', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'))
-        pdfmetrics.registerFont(TTFont('DejaVu-Bold', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'))
-        font_name = 'DejaVu'
-        font_bold = 'DejaVu-Bold'
-    except:
-        font_name = 'Helvetica'
-        font_bold = 'Helvetica-Bold'
-    
+    period = Period.coerce(period)
+    stats = db.get_summary(user_id, period)
+    styles = _pdf_styles()
+    buffer = io.BytesIO()
     doc = SimpleDocTemplate(
-        filepath,
+        buffer,
         pagesize=A4,
         leftMargin=20 * mm,
         rightMargin=20 * mm,
         topMargin=20 * mm,
-        bottomMargin=20 * mm
-    )
-    styles = getSampleStyleSheet()
-    
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Title'],
-        fontName=font_bold,
-        fontSize=18,
-        alignment=TA_CENTER,
-        spaceAfter=12
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontName=font_bold,
-        fontSize=14,
-        spaceAfter=6
+        bottomMargin=20 * mm,
+        title=f"Финансовый отчет за {period.label}"
     )
-    
-    story = []
-    
-    period_text = f"{days} дней" if days else "все время"
-    title = Paragraph(f"Финансовый отчет за {period_text}", title_style)
-    story.append(title)
-    story.append(Spacer(1, 12))
-    summary_data = [
-        ["Доходы", f"{format_currency(stats['total_income'])} руб."],
-        ["Расходы", f"{format_currency(stats['total_expenses'])} руб."],
-        ["Баланс", f"{format_currency(stats['balance'])} руб."],
-        ["Кол-во операций (расходы)", str(stats['expenses_count'])],
-        ["Кол-во операций (доходы)", str(stats['income_count'])]
-    ]
-    summary_table = Table(summary_data, colWidths=[80 * mm, 70 * mm])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('FONTNAME', (0, 0), (-1, -1), font_name),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10)
-    ]))
-    story.append(summary_table)
-    story.append(Spacer(1, 12))
-    
-    if stats['expenses_by_category']:
-        story.append(Paragraph("Расходы по категориям", heading_style))
-        expense_rows = [
-            [category, f"{format_currency(amount)} руб."]
-            for category, amount in sorted(stats['expenses_by_category'].items(), key=lambda x: x[1], reverse=True)
-        ]
-        expense_table = Table([["Категория", "Сумма"]] + expense_rows, colWidths=[90 * mm, 60 * mm])
-        expense_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('FONTNAME', (0, 0), (-1, -1), font_name),
-            ('FONTNAME', (0, 0), (-1, 0), font_bold)
-        ]))
-        story.append(expense_table)
-        story.append(Spacer(1, 12))
-    
-    if stats['income_by_source']:
-        story.append(Paragraph("Доходы по источникам", heading_style))
-        income_rows = [
-            [source, f"{format_currency(amount)} руб."]
-            for source, amount in sorted(stats['income_by_source'].items(), key=lambda x: x[1], reverse=True)
+
+    def story():
+        yield Paragraph(f"Финансовый отчет за {period.label}", styles['title'])
+        yield Spacer(1, 12)
+        summary_data = [
+            ["Доходы", f"{format_currency(stats['total_income'])} руб."],
+            ["Расходы", f"{format_currency(stats['total_expenses'])} руб."],
+            ["Баланс", f"{format_currency(stats['balance'])} руб."],
+            ["Кол-во операций (расходы)", str(stats['expenses_count'])],
+            ["Кол-во операций (доходы)", str(stats['income_count'])]
         ]
-        income_table = Table([["Источник", "Сумма"]] + income_rows, colWidths=[90 * mm, 60 * mm])
-        income_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('FONTNAME', (0, 0), (-1, -1), font_name),
-            ('FONTNAME', (0, 0), (-1, 0), font_bold)
-        ]))
-        story.append(income_table)
-        story.append(Spacer(1, 12))
-    
-    def build_operations_section(title_text: str, items: list, columns: list):
-        if not items:
+        yield Table(summary_data, colWidths=[80 * mm, 70 * mm], style=styles['summary'])
+        yield Spacer(1, 12)
+
+        for title, column, totals in (
+            ("Расходы по категориям", "Категория", stats['expenses_by_category']),
+            ("Доходы по источникам", "Источник", stats['income_by_source'])
+        ):
+            if not totals:
+                continue
+            yield Paragraph(title, styles['heading'])
+            rows = [
+                [name, f"{format_currency(amount)} руб."]
+                for name, amount in sorted(totals.items(), key=lambda x: x[1], reverse=True)
+            ]
+            yield Table([[column, "Сумма"]] + rows, colWidths=[90 * mm, 60 * mm],
+                        style=styles['totals'], repeatRows=1)
+            yield Spacer(1, 12)
+
+        if summary_only:
             return
-        story.append(Paragraph(title_text, heading_style))
-        header = ["Дата", columns[0], "Сумма", "Описание"]
-        rows = []
-        for record in sorted(items, key=lambda x: x.get('date') or datetime.min, reverse=True)[:20]:
-            raw_date = record.get('date')
-            date_str = _normalize_date(raw_date)
-            rows.append([
-                date_str,
-                record[columns[1]],
-                f"{format_currency(record['amount'])} руб.",
-                record.get('description') or ''
-            ])
-        table = Table([header] + rows, colWidths=[35 * mm, 40 * mm, 25 * mm, 50 * mm])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('FONTNAME', (0, 0), (-1, -1), font_name),
-            ('FONTNAME', (0, 0), (-1, 0), font_bold),
-            ('FONTSIZE', (0, 0), (-1, -1), 9)
-        ]))
-        story.append(table)
-        story.append(Spacer(1, 12))
-    
-    build_operations_section("Последние расходы", stats['expenses'], ["Категория", "category"])
-    build_operations_section("Последние доходы", stats['income'], ["Источник", "source"])
-    
-    doc.build(story)
-    return filepath
\ No newline at end of file
+        for title, column, kind, count in (
+            ("Расходы", "Категория", 'expense', stats['expenses_count']),
+            ("Доходы", "Источник", 'income', stats['income_count'])
+        ):
+            if not count:
+                continue
+            yield Paragraph(f"{title}: {count}", styles['heading'])
+            yield from _ledger_tables(db, user_id, kind, period, column)
+            yield Spacer(1, 12)
+
+    doc.build(_StreamedStory(story()))
+    buffer.seek(0)
+    return buffer
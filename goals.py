@@ -4,61 +4,14 @@
 from psycopg2.extras import RealDictCursor
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
-from database import Database
+from database import get_database
 
-db = Database()
+db = get_database()
 
 
 class GoalsManager:
     """Управление финансовыми целями"""
     
-    def __init__(self):
-        self._init_tables()
-    
-    def _init_tables(self):
-        """Инициализация таблиц"""
-        conn = db.get_connection()
-        try:
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS financial_goals (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    goal_name TEXT NOT NULL,
-                    target_amount REAL NOT NULL,
-                    current_amount REAL DEFAULT 0,
-                    deadline TIMESTAMP,
-                    icon TEXT,
-                    description TEXT,
-                    is_completed INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    completed_at TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS goal_contributions (
-                    id SERIAL PRIMARY KEY,
-                    goal_id INTEGER NOT NULL,
-                    user_id BIGINT NOT NULL,
-                    amount REAL NOT NULL,
-                    note TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (goal_id) REFERENCES financial_goals (id) ON DELETE CASCADE,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            print(f"Error initializing goals tables: {e}")
-        finally:
-            cursor.close()
-            db.return_connection(conn)
-    
     def create_goal(self, user_id: int, goal_name: str, target_amount: float,
                    deadline: datetime = None, icon: str = None, description: str = None) -> bool:
         """Создать новую цель"""
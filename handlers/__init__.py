@@ -18,7 +18,7 @@ from .statistics import (
     handle_chart_generation
 )
 from .bulk import bulk_add_handler, bulk_delete_handler
-from .search import search_handler
+from .search import search_handler, search_more_callback
 
 __all__ = [
     'start', 'cancel',
@@ -30,5 +30,5 @@ __all__ = [
     'show_pdf_export_menu', 'show_statistics', 'handle_export',
     'handle_pdf_export', 'send_statistics_chart', 'show_chart_menu',
     'handle_chart_generation',
-    'search_handler'
+    'search_handler', 'search_more_callback'
 ]
\ No newline at end of file
@@ -3,7 +3,7 @@ from telegram.ext import (
     ContextTypes, ConversationHandler, MessageHandler,
     CommandHandler, CallbackQueryHandler, filters
 )
-from balance import balance_manager
+from balance import async_balance_manager
 from utils import format_currency, format_date
 from handlers.common import cancel
 from config import BACK_BUTTON_TEXT
@@ -14,7 +14,7 @@ WAITING_FOR_HIDDEN_REASON = 401
 
 async def show_balance(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    balance = balance_manager.get_balance(user_id)
+    balance = await async_balance_manager.get_balance(user_id)
     
     message = "💰 <b>Твой баланс</b>\n\n"
     message += f"💵 Основной: {format_currency(balance['balance'])} руб.\n"
@@ -40,7 +40,7 @@ async def hidden_add_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
     
     user_id = update.effective_user.id
-    balance = balance_manager.get_balance(user_id)
+    balance = await async_balance_manager.get_balance(user_id)
     
     await update.callback_query.edit_message_text(
         f"💰 Доступно на основном балансе: {format_currency(balance['balance'])} руб.\n\n"
@@ -57,7 +57,7 @@ async def hidden_remove_start(update: Update, context: ContextTypes.DEFAULT_TYPE
     await update.callback_query.answer()
     
     user_id = update.effective_user.id
-    balance = balance_manager.get_balance(user_id)
+    balance = await async_balance_manager.get_balance(user_id)
     
     if balance['hidden_balance'] <= 0:
         await update.callback_query.edit_message_text(
@@ -107,9 +107,9 @@ async def hidden_reason_entered(update: Update, context: ContextTypes.DEFAULT_TY
         reason = update.message.text
     
     if operation == 'add':
-        success = balance_manager.add_to_hidden(user_id, amount, reason)
+        success = await async_balance_manager.add_to_hidden(user_id, amount, reason)
         if success:
-            new_balance = balance_manager.get_balance(user_id)
+            new_balance = await async_balance_manager.get_balance(user_id)
             await update.message.reply_text(
                 f"✅ Отложено в скрытое: {format_currency(amount)} руб.\n\n"
                 f"💵 Основной баланс: {format_currency(new_balance['balance'])} руб.\n"
@@ -121,9 +121,9 @@ async def hidden_reason_entered(update: Update, context: ContextTypes.DEFAULT_TY
                 "❌ Недостаточно средств на основном балансе."
             )
     else:  
-        success = balance_manager.remove_from_hidden(user_id, amount, reason)
+        success = await async_balance_manager.remove_from_hidden(user_id, amount, reason)
         if success:
-            new_balance = balance_manager.get_balance(user_id)
+            new_balance = await async_balance_manager.get_balance(user_id)
             await update.message.reply_text(
                 f"✅ Возвращено из скрытого: {format_currency(amount)} руб.\n\n"
                 f"💵 Основной баланс: {format_currency(new_balance['balance'])} руб.\n"
@@ -144,7 +144,7 @@ async def show_hidden_history(update: Update, context: ContextTypes.DEFAULT_TYPE
     await update.callback_query.answer()
     
     user_id = update.effective_user.id
-    history = balance_manager.get_hidden_history(user_id, limit=15)
+    history = await async_balance_manager.get_hidden_history(user_id, limit=15)
     
     if not history:
         await update.callback_query.edit_message_text(
@@ -171,9 +171,9 @@ async def recalculate_balance(update: Update, context: ContextTypes.DEFAULT_TYPE
     await update.callback_query.answer("Пересчитываю...")
     
     user_id = update.effective_user.id
-    balance_manager.recalculate_balance(user_id)
+    await async_balance_manager.recalculate_balance(user_id)
     
-    new_balance = balance_manager.get_balance(user_id)
+    new_balance = await async_balance_manager.get_balance(user_id)
     
     await update.callback_query.edit_message_text(
         f"✅ <b>Баланс пересчитан</b>\n\n"
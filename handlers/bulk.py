@@ -13,11 +13,11 @@ from config import (
     WAITING_FOR_BULK_DELETE_IDS,
     BACK_BUTTON_TEXT
 )
-from database import Database
-from handlers.common import cancel
+from async_db import get_async_database
+from handlers.common import cancel, load_keyset_page, keyset_navigation_rows
 from utils import parse_user_date, format_currency, format_date
 
-db = Database()
+db = get_async_database()
 
 BULK_ADD_HINT = (
     "Введи операции построчно в формате:\n"
@@ -31,8 +31,10 @@ BULK_ADD_HINT = (
 ITEMS_PER_PAGE = 10
 
 
-def _parse_bulk_lines(text: str, record_type: str) -> Tuple[List[dict], List[str]]:
+def _parse_bulk_lines(text: str, record_type: str) -> Tuple[List[dict], List[int], List[str]]:
+    """Разобрать строки; возвращает записи, номера их строк и ошибки разбора"""
     entries = []
+    line_numbers = []
     errors = []
     
     for idx, raw_line in enumerate(text.splitlines(), start=1):
@@ -71,8 +73,9 @@ def _parse_bulk_lines(text: str, record_type: str) -> Tuple[List[dict], List[str
             entry['date'] = parsed_date
         
         entries.append(entry)
+        line_numbers.append(idx)
     
-    return entries, errors
+    return entries, line_numbers, errors
 
 
 async def bulk_add_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -103,7 +106,7 @@ async def bulk_add_process(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Неизвестный тип. Начни заново командой /cancel и выбери тип.")
         return ConversationHandler.END
     
-    entries, errors = _parse_bulk_lines(update.message.text, record_type)
+    entries, line_numbers, errors = _parse_bulk_lines(update.message.text, record_type)
     if not entries:
         await update.message.reply_text(
             "Не удалось обработать ни одной строки.\n" + ("\n".join(errors) if errors else "Проверь формат и попробуй еще раз.")
@@ -112,12 +115,13 @@ async def bulk_add_process(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     user_id = update.effective_user.id
     if record_type == 'expenses':
-        inserted = db.add_expenses_bulk(user_id, entries)
+        result = await db.add_expenses_bulk(user_id, entries)
     else:
-        inserted = db.add_income_bulk(user_id, entries)
+        result = await db.add_income_bulk(user_id, entries)
+    errors.extend(f"Строка {line_numbers[index]}: {error}." for index, error in result['errors'])
     
     response = [
-        f"✅ Добавлено записей: {inserted}",
+        f"✅ Добавлено записей: {result['inserted']}",
     ]
     if errors:
         response.append("⚠️ Ошибки:")
@@ -130,41 +134,26 @@ async def bulk_add_process(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 
-def create_bulk_delete_keyboard(items, page, record_type):
+def create_bulk_delete_keyboard(items, page, has_prev=False, has_next=False):
     """Создает клавиатуру с пагинацией для массового удаления"""
-    total_items = len(items)
-    total_pages = (total_items + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE
-    
-    start_idx = page * ITEMS_PER_PAGE
-    end_idx = min(start_idx + ITEMS_PER_PAGE, total_items)
-    
     buttons = []
-    for item in items[start_idx:end_idx]:
+    for item in items:
         descriptor = item.get('category') or item.get('source')
         date_value = item.get('date')
         date_str = format_date(date_value) if date_value else "Без даты"
         label = f"ID {item['id']}: {format_currency(item['amount'])} руб., {descriptor} ({date_str})"
         buttons.append([InlineKeyboardButton(label, callback_data=f"bulk_ignore_{item['id']}")])
     
-    nav_buttons = []
-    if page > 0:
-        nav_buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"bulk_page_{page-1}"))
-    
-    if page < total_pages - 1:
-        nav_buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"bulk_page_{page+1}"))
-    
-    if nav_buttons:
-        buttons.append(nav_buttons)
-
-    if total_pages > 1:
-        buttons.append([InlineKeyboardButton(
-            f"Страница {page + 1} из {total_pages}",
-            callback_data="bulk_page_info"
-        )])
-    
+    buttons.extend(keyset_navigation_rows("bulk_page_", page, items, has_prev, has_next))
     return InlineKeyboardMarkup(buttons)
 
 
+def _bulk_delete_source(record_type):
+    if record_type == 'expenses':
+        return db.get_expenses_page, "Последние расходы (укажи ID через пробел/запятую):"
+    return db.get_income_page, "Последние доходы (укажи ID через пробел/запятую):"
+
+
 async def bulk_delete_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [
         [
@@ -181,23 +170,17 @@ async def bulk_delete_choose_type(update: Update, context: ContextTypes.DEFAULT_
     await update.callback_query.answer()
     record_type = update.callback_query.data.replace("bulk_del_", "")
     context.user_data['bulk_delete_type'] = record_type
-    context.user_data['bulk_delete_page'] = 0
     user_id = update.effective_user.id
     
-    if record_type == 'expenses':
-        items = db.get_last_expenses(user_id, limit=50)
-        title = "Последние расходы (укажи ID через пробел/запятую):"
-    else:
-        items = db.get_last_income(user_id, limit=50)
-        title = "Последние доходы (укажи ID через пробел/запятую):"
+    fetch_page, title = _bulk_delete_source(record_type)
+    page, items, has_prev, has_next = await load_keyset_page(fetch_page, user_id, ITEMS_PER_PAGE)
     
     if not items:
         await update.callback_query.edit_message_text("Нет записей для удаления.")
         context.user_data.pop('bulk_delete_type', None)
         return ConversationHandler.END
     
-    context.user_data['bulk_delete_items'] = items
-    reply_markup = create_bulk_delete_keyboard(items, 0, record_type)
+    reply_markup = create_bulk_delete_keyboard(items, page, has_prev, has_next)
     
     await update.callback_query.edit_message_text(
         f"{title}\n(Отсортировано по дате, новые сверху)",
@@ -217,18 +200,22 @@ async def handle_bulk_page_navigation(update: Update, context: ContextTypes.DEFA
         await update.callback_query.answer("Это только для просмотра. Введи ID в сообщении.", show_alert=True)
         return
     
-    page = int(update.callback_query.data.replace("bulk_page_", ""))
-    items = context.user_data.get('bulk_delete_items', [])
     record_type = context.user_data.get('bulk_delete_type')
-    
-    if not items:
+    if record_type not in ('expenses', 'income'):
         await update.callback_query.edit_message_text("Список устарел. Начни заново.")
         return
     
-    context.user_data['bulk_delete_page'] = page
-    reply_markup = create_bulk_delete_keyboard(items, page, record_type)
+    fetch_page, title = _bulk_delete_source(record_type)
+    page, items, has_prev, has_next = await load_keyset_page(
+        fetch_page, update.effective_user.id, ITEMS_PER_PAGE,
+        update.callback_query.data, "bulk_page_"
+    )
+    
+    if not items:
+        await update.callback_query.edit_message_text("Нет записей для удаления.")
+        return
     
-    title = "Последние расходы (укажи ID через пробел/запятую):" if record_type == 'expenses' else "Последние доходы (укажи ID через пробел/запятую):"
+    reply_markup = create_bulk_delete_keyboard(items, page, has_prev, has_next)
     
     await update.callback_query.edit_message_text(
         f"{title}\n(Отсортировано по дате, новые сверху)",
@@ -256,14 +243,12 @@ async def bulk_delete_process(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     user_id = update.effective_user.id
     if record_type == 'expenses':
-        deleted = db.delete_expenses_bulk(user_id, ids)
+        deleted = await db.delete_expenses_bulk(user_id, ids)
     else:
-        deleted = db.delete_income_bulk(user_id, ids)
+        deleted = await db.delete_income_bulk(user_id, ids)
     
     await update.message.reply_text(f"🗑 Удалено записей: {deleted}")
     context.user_data.pop('bulk_delete_type', None)
-    context.user_data.pop('bulk_delete_items', None)
-    context.user_data.pop('bulk_delete_page', None)
     return ConversationHandler.END
 
 
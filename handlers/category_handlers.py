@@ -6,13 +6,14 @@ from telegram.ext import (
     ContextTypes, ConversationHandler, MessageHandler,
     CommandHandler, CallbackQueryHandler, filters
 )
-from database import Database
-from custom_categories import category_manager
+from async_db import get_async_database
+from custom_categories import async_category_manager
 from utils import format_currency, format_date
 from handlers.common import cancel
 from config import BACK_BUTTON_TEXT
+from periods import Period
 
-db = Database()
+db = get_async_database()
 
 WAITING_FOR_CATEGORY_NAME = 500
 WAITING_FOR_CATEGORY_ICON = 501
@@ -102,7 +103,7 @@ async def category_icon_selected(update: Update, context: ContextTypes.DEFAULT_T
     icon_data = update.callback_query.data.replace("icon_", "")
     icon = None if icon_data == "none" else icon_data
     
-    success = category_manager.add_category(user_id, category_name, category_type, icon)
+    success = await async_category_manager.add_category(user_id, category_name, category_type, icon)
     
     if success:
         display_name = f"{icon} {category_name}" if icon else category_name
@@ -127,7 +128,7 @@ async def list_categories(update: Update, context: ContextTypes.DEFAULT_TYPE):
     category_type = 'expense' if 'expense' in update.callback_query.data else 'income'
     user_id = update.effective_user.id
     
-    categories = category_manager.get_categories(user_id, category_type)
+    categories = await async_category_manager.get_categories(user_id, category_type)
     
     type_name = "расходов" if category_type == 'expense' else "доходов"
     message = f"📋 <b>Категории {type_name}</b>\n\n"
@@ -158,8 +159,8 @@ async def delete_category_menu(update: Update, context: ContextTypes.DEFAULT_TYP
     
     user_id = update.effective_user.id
     
-    expense_cats = [c for c in category_manager.get_categories(user_id, 'expense') if c['is_custom']]
-    income_cats = [c for c in category_manager.get_categories(user_id, 'income') if c['is_custom']]
+    expense_cats = [c for c in await async_category_manager.get_categories(user_id, 'expense') if c['is_custom']]
+    income_cats = [c for c in await async_category_manager.get_categories(user_id, 'income') if c['is_custom']]
     
     if not expense_cats and not income_cats:
         await update.callback_query.edit_message_text(
@@ -203,7 +204,7 @@ async def delete_category_confirm(update: Update, context: ContextTypes.DEFAULT_
     category_name = parts[1]
     
     user_id = update.effective_user.id
-    success = category_manager.delete_category(user_id, category_name, category_type)
+    success = await async_category_manager.delete_category(user_id, category_name, category_type)
     
     if success:
         await update.callback_query.edit_message_text(
@@ -218,7 +219,7 @@ async def delete_category_confirm(update: Update, context: ContextTypes.DEFAULT_
 async def view_expenses_by_category(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Меню просмотра трат по категориям"""
     user_id = update.effective_user.id
-    stats = db.get_statistics(user_id, 90)
+    stats = await db.get_summary(user_id, 90)
     
     categories = list(stats['expenses_by_category'].keys())
     
@@ -253,7 +254,7 @@ async def category_selected_for_view(update: Update, context: ContextTypes.DEFAU
     
     keyboard = [
         [
-            InlineKeyboardButton("Вчера", callback_data="cat_period_1"),
+            InlineKeyboardButton("Вчера", callback_data="cat_period_yesterday"),
             InlineKeyboardButton("3 дня", callback_data="cat_period_3")
         ],
         [
@@ -280,11 +281,10 @@ async def show_category_details(update: Update, context: ContextTypes.DEFAULT_TY
     await update.callback_query.answer()
     
     category = context.user_data.get('view_category')
-    period_str = update.callback_query.data.replace("cat_period_", "")
-    days = None if period_str == "all" else int(period_str)
+    period = Period.parse(update.callback_query.data.replace("cat_period_", ""))
     
     user_id = update.effective_user.id
-    expenses = db.get_expenses(user_id, days)
+    expenses = await db.get_expenses(user_id, period)
     
     category_expenses = [e for e in expenses if e['category'] == category]
     
@@ -299,14 +299,7 @@ async def show_category_details(update: Update, context: ContextTypes.DEFAULT_TY
     count = len(category_expenses)
     avg = total / count if count > 0 else 0
     
-    period_text = {
-        1: "вчера",
-        3: "за 3 дня",
-        7: "за 7 дней",
-        30: "за 30 дней",
-        90: "за 90 дней",
-        None: "за все время"
-    }.get(days, f"за {days} дней")
+    period_text = f"за {period.label}"
     
     message = f"📂 <b>{category}</b> {period_text}\n\n"
     message += f"💸 Всего потрачено: {format_currency(total)} руб.\n"
@@ -1,21 +1,22 @@
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
+from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardButton
 from telegram.ext import ContextTypes
-from database import Database
-from balance import balance_manager
-from utils import format_currency
+from async_db import get_async_database
+from balance import async_balance_manager
+from utils import format_currency, encode_page_cursor, decode_page_cursor
 from config import BACK_BUTTON_TEXT
 
-db = Database()
+db = get_async_database()
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    db.add_user(user.id, user.username, user.first_name)
+    await db.add_user(user.id, user.username, user.first_name)
 
-    balance = balance_manager.get_balance(user.id)
+    balance = await async_balance_manager.get_balance(user.id)
+    totals = await db.get_user_totals(user.id)
 
     try:
-        from subscription import subscription_manager
-        sub = subscription_manager.get_subscription(user.id)
+        from subscription import async_subscription_manager
+        sub = await async_subscription_manager.get_subscription(user.id)
         is_premium = sub['is_premium']
         premium_text = f"⭐ Premium до: {sub['days_left']} дн." if is_premium else "⭐ Premium"
     except:
@@ -56,6 +57,12 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"Скрытый: {format_currency(balance['hidden_balance'])} руб.\n"
         f"<b>Всего: {format_currency(balance['total_balance'])} руб.</b>"
     )
+    operations = totals['expenses_count'] + totals['income_count']
+    if operations:
+        balance_info += (
+            f"\n\n📒 Учёт с {totals['first_at']:%d.%m.%Y}, операций: {operations}, "
+            f"категорий трат: {totals['expense_categories']}"
+        )
     
     await update.message.reply_text(
         f"Привет, {user.first_name}! 👋\n\n"
@@ -87,4 +94,53 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     from telegram.ext import ConversationHandler
     context.user_data.clear()
     await update.message.reply_text("Операция отменена.")
-    return ConversationHandler.END
\ No newline at end of file
+    return ConversationHandler.END
+
+
+async def load_keyset_page(fetch_page, user_id: int, limit: int, callback_data: str = None, prefix: str = ""):
+    """
+    Загрузить страницу списка по ключу из callback_data
+
+    callback_data вида f"{prefix}{номер}_{n|p}_{ключ}" (см. keyset_navigation_rows),
+    без него - первая страница. fetch_page - db.get_expenses_page / get_income_page.
+    Возвращает (номер страницы, записи, есть ли предыдущая, есть ли следующая).
+    """
+    page, cursor_key, backward = 0, None, False
+    if callback_data:
+        try:
+            page_str, direction, cursor_str = callback_data[len(prefix):].split('_', 2)
+            page, backward = int(page_str), direction == 'p'
+            cursor_key = decode_page_cursor(cursor_str)
+        except ValueError:
+            pass
+
+    result = await fetch_page(user_id, cursor_key, backward, limit)
+    if cursor_key is not None and not result['items']:
+        # Записи соседней страницы удалены - начинаем сначала
+        page, cursor_key, backward = 0, None, False
+        result = await fetch_page(user_id, None, False, limit)
+
+    has_prev = result['has_more'] if backward else cursor_key is not None
+    has_next = True if backward else result['has_more']
+    if not has_prev:
+        page = 0
+    return page, result['items'], has_prev, has_next
+
+
+def keyset_navigation_rows(prefix: str, page: int, items, has_prev: bool, has_next: bool):
+    """Ряды кнопок «Назад/Вперед» и номер страницы; в callback_data только ключ соседней записи"""
+    nav_buttons = []
+    if has_prev:
+        nav_buttons.append(InlineKeyboardButton(
+            "⬅️ Назад", callback_data=f"{prefix}{page - 1}_p_{encode_page_cursor(items[0])}"
+        ))
+    if has_next:
+        nav_buttons.append(InlineKeyboardButton(
+            "Вперед ➡️", callback_data=f"{prefix}{page + 1}_n_{encode_page_cursor(items[-1])}"
+        ))
+
+    rows = []
+    if nav_buttons:
+        rows.append(nav_buttons)
+        rows.append([InlineKeyboardButton(f"Страница {page + 1}", callback_data=f"{prefix}info")])
+    return rows
@@ -1,21 +1,21 @@
 """
 Расширенная статистика: 7 дней, диаграмма доходов, сравнение категорий
 """
-import os
-from datetime import datetime, timedelta
+from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from database import Database
+from async_db import get_async_database
 from utils import format_currency, format_date
-from charts_improved import create_pie_chart, create_bar_chart
+from chart_service import ChartBusyError, reply_chart
+from periods import Period
 
-db = Database()
+db = get_async_database()
 
 
 async def show_last_7_days(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать последние 7 дней трат"""
     user_id = update.effective_user.id
-    stats = db.get_statistics(user_id, 7)
+    stats = await db.get_statistics(user_id, 7)
     
     message = "📝 <b>Последние 7 дней</b>\n\n"
     
@@ -55,7 +55,7 @@ async def show_last_7_days(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def show_7_days_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать статистику за 7 дней"""
     user_id = update.effective_user.id
-    stats = db.get_statistics(user_id, 7)
+    stats = await db.get_summary(user_id, 7)
     
     message = "📊 <b>Статистика за 7 дней</b>\n\n"
     
@@ -103,11 +103,10 @@ async def income_chart_period_selected(update: Update, context: ContextTypes.DEF
     """Создать диаграмму доходов"""
     await update.callback_query.answer("Генерирую диаграмму...")
     
-    period_str = update.callback_query.data.replace("income_chart_", "")
-    days = None if period_str == "all" else int(period_str)
+    period = Period.parse(update.callback_query.data.replace("income_chart_", ""))
     
     user_id = update.effective_user.id
-    stats = db.get_statistics(user_id, days)
+    stats = await db.get_summary(user_id, period)
     
     if not stats['income_by_source']:
         await update.callback_query.edit_message_text(
@@ -115,57 +114,47 @@ async def income_chart_period_selected(update: Update, context: ContextTypes.DEF
         )
         return
     
-    period_text = {
-        30: "30 дней",
-        90: "90 дней",
-        None: "все время"
-    }.get(days, f"{days} дней")
+    period_text = period.label
     
-    chart_path = create_pie_chart(
-        stats['income_by_source'],
-        f"Доходы по источникам ({period_text})"
-    )
+    try:
+        sent = await reply_chart(
+            update.callback_query.message,
+            user_id,
+            f"📈 Доходы за {period_text}\n"
+            f"💰 Всего: {format_currency(stats['total_income'])} руб.",
+            "charts_improved.create_pie_chart",
+            stats['income_by_source'],
+            f"Доходы по источникам ({period_text})"
+        )
+    except ChartBusyError as e:
+        await update.callback_query.message.reply_text(e.text)
+        return
     
-    if not chart_path or not os.path.exists(chart_path):
+    if not sent:
         await update.callback_query.edit_message_text(
             "Недостаточно данных для диаграммы."
         )
         return
     
-    try:
-        await update.callback_query.message.reply_photo(
-            photo=open(chart_path, 'rb'),
-            caption=f"📈 Доходы за {period_text}\n"
-                   f"💰 Всего: {format_currency(stats['total_income'])} руб."
-        )
-        await update.callback_query.message.delete()
-    finally:
-        if os.path.exists(chart_path):
-            os.remove(chart_path)
+    await update.callback_query.message.delete()
 
 
 async def show_category_comparison(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Сравнение категорий за последние 2 месяца"""
+    """Сравнение категорий: текущий месяц и прошлый"""
     user_id = update.effective_user.id
     
-    stats_current = db.get_statistics(user_id, 30)
-    
-    all_expenses = db.get_expenses(user_id, 60)
-    cutoff = datetime.now() - timedelta(days=30)
-    
-    prev_expenses = [e for e in all_expenses 
-                    if datetime.fromisoformat(str(e['date']).replace('Z', '+00:00')) < cutoff]
-    
-    prev_by_category = {}
-    for e in prev_expenses:
-        cat = e['category']
-        prev_by_category[cat] = prev_by_category.get(cat, 0) + e['amount']
+    # Текущий календарный месяц против того же числа дней прошлого
+    current = Period.calendar_month()
+    previous = current.previous()
+    stats = await db.get_window_summaries(user_id, {'current': current, 'previous': previous})
+    stats_current = stats['current']
+    prev_by_category = stats['previous']['expenses_by_category']
     
     all_cats = set(list(stats_current['expenses_by_category'].keys()) + 
                   list(prev_by_category.keys()))
     
     message = "📊 <b>Сравнение категорий</b>\n"
-    message += "Текущий месяц vs Прошлый месяц\n\n"
+    message += f"{current.label.capitalize()} vs {previous.label}\n\n"
     
     for cat in sorted(all_cats):
         current = stats_current['expenses_by_category'].get(cat, 0)
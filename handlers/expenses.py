@@ -8,12 +8,12 @@ from telegram.ext import (
     ContextTypes, ConversationHandler, CommandHandler, MessageHandler,
     CallbackQueryHandler, filters
 )
-from database import Database
-from balance import balance_manager
-from custom_categories import category_manager
-from notifications import notification_manager
+from async_db import get_async_database
+from custom_categories import async_category_manager
+from notifications import large_expense_message
+from budgets import budget_alert
 from utils import format_currency, format_date, parse_user_date
-from handlers.common import cancel
+from handlers.common import cancel, load_keyset_page, keyset_navigation_rows
 from config import (
     WAITING_FOR_AMOUNT,
     WAITING_FOR_CATEGORY,
@@ -22,7 +22,7 @@ from config import (
     BACK_BUTTON_TEXT
 )
 
-db = Database()
+db = get_async_database()
 ITEMS_PER_PAGE = 5
 
 
@@ -41,7 +41,7 @@ async def add_expense_amount(update: Update, context: ContextTypes.DEFAULT_TYPE)
         context.user_data['expense_amount'] = amount
         
         user_id = update.effective_user.id
-        categories = category_manager.get_categories(user_id, 'expense')
+        categories = await async_category_manager.get_categories(user_id, 'expense')
         
         keyboard = []
         
@@ -94,7 +94,7 @@ async def add_expense_category(update: Update, context: ContextTypes.DEFAULT_TYP
             category = update.callback_query.data.replace("cat_", "")
             context.user_data['expense_category'] = category
             user_id = update.callback_query.from_user.id
-            category_manager.increment_use_count(user_id, category, 'expense')
+            await async_category_manager.increment_use_count(user_id, category, 'expense')
             
             await update.callback_query.edit_message_text(
                 f"Категория: {category}\n\n"
@@ -148,9 +148,8 @@ async def add_expense_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return WAITING_FOR_EXPENSE_DATE
         date_value = parsed_date
     
-    db.add_expense(user_id, amount, category, description, date_value)
-    
-    balance_manager.update_balance(user_id, amount, is_income=False)
+    # Вставка, баланс и проверки крупной траты и бюджета - одна транзакция
+    result = await db.record_expense(user_id, amount, category, description, date_value)
     
     response_text = (
         f"✅ Расход добавлен!\n\n"
@@ -160,35 +159,32 @@ async def add_expense_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"📅 Дата: {format_date(date_value.isoformat())}"
     )
     
-    balance = balance_manager.get_balance(user_id)
+    balance = result['balance']
     response_text += (
         f"\n\n💵 <b>Баланс:</b> {format_currency(balance['balance'])} руб.\n"
         f"🔒 Скрытый: {format_currency(balance['hidden_balance'])} руб."
     )
-    large_expense_alert = notification_manager.check_large_expense(user_id, amount)
-    if large_expense_alert:
-        response_text += f"\n\n{large_expense_alert}"
+    if result['large_expense_threshold'] is not None:
+        response_text += "\n\n" + large_expense_message(
+            amount, result['large_expense_threshold'], result['large_expense_typical']
+        )
     
-    try:
-        from budgets import budget_manager
-        alert = budget_manager.check_budget_alerts(user_id, category)
-        
-        if alert:
-            if alert['type'] == 'exceeded':
-                response_text += (
-                    f"\n\n🔴 <b>ПРЕВЫШЕН БЮДЖЕТ!</b>\n"
-                    f"Лимит: {format_currency(alert['limit'])} руб.\n"
-                    f"Потрачено: {format_currency(alert['spent'])} руб.\n"
-                    f"Перерасход: {format_currency(alert['over'])} руб."
-                )
-            elif alert['type'] == 'warning':
-                response_text += (
-                    f"\n\n🟡 <b>Предупреждение!</b>\n"
-                    f"Использовано {alert['percent']:.0f}% бюджета на '{category}'\n"
-                    f"Осталось: {format_currency(alert['remaining'])} руб."
-                )
-    except Exception as e:
-        print(f"Budget check error: {e}")
+    budget = result['budget']
+    alert = budget_alert(category, budget['limit_amount'], budget['spent']) if budget else None
+    if alert:
+        if alert['type'] == 'exceeded':
+            response_text += (
+                f"\n\n🔴 <b>ПРЕВЫШЕН БЮДЖЕТ!</b>\n"
+                f"Лимит: {format_currency(alert['limit'])} руб.\n"
+                f"Потрачено: {format_currency(alert['spent'])} руб.\n"
+                f"Перерасход: {format_currency(alert['over'])} руб."
+            )
+        elif alert['type'] == 'warning':
+            response_text += (
+                f"\n\n🟡 <b>Предупреждение!</b>\n"
+                f"Использовано {alert['percent']:.0f}% бюджета на '{category}'\n"
+                f"Осталось: {format_currency(alert['remaining'])} руб."
+            )
     
     await update.message.reply_text(response_text, parse_mode='HTML')
     
@@ -197,50 +193,29 @@ async def add_expense_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 
-def create_expense_delete_keyboard(expenses, page=0):
+def create_expense_delete_keyboard(expenses, page=0, has_prev=False, has_next=False):
     """Создает клавиатуру с пагинацией для удаления расходов"""
-    total_items = len(expenses)
-    total_pages = (total_items + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE
-    
-    start_idx = page * ITEMS_PER_PAGE
-    end_idx = min(start_idx + ITEMS_PER_PAGE, total_items)
-    
     buttons = []
-    for exp in expenses[start_idx:end_idx]:
+    for exp in expenses:
         date_value = format_date(exp['date']) if exp.get('date') else "Без даты"
         label = f"{format_currency(exp['amount'])} · {exp['category']} · {date_value}"
         buttons.append([InlineKeyboardButton(label, callback_data=f"del_exp_{exp['id']}")])
     
-    nav_buttons = []
-    if page > 0:
-        nav_buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"exp_page_{page-1}"))
-    
-    if page < total_pages - 1:
-        nav_buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"exp_page_{page+1}"))
-    
-    if nav_buttons:
-        buttons.append(nav_buttons)
-    if total_pages > 1:
-        buttons.append([InlineKeyboardButton(
-            f"Страница {page + 1} из {total_pages}",
-            callback_data="exp_page_info"
-        )])
-    
+    buttons.extend(keyset_navigation_rows("exp_page_", page, expenses, has_prev, has_next))
     return InlineKeyboardMarkup(buttons)
 
 
 async def show_delete_expenses(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    expenses = db.get_last_expenses(user_id, limit=50)
+    page, expenses, has_prev, has_next = await load_keyset_page(
+        db.get_expenses_page, user_id, ITEMS_PER_PAGE
+    )
     
     if not expenses:
         await update.message.reply_text("Пока нет расходов для удаления.")
         return
     
-    context.user_data['delete_expenses_list'] = expenses
-    context.user_data['delete_expenses_page'] = 0
-    
-    reply_markup = create_expense_delete_keyboard(expenses, 0)
+    reply_markup = create_expense_delete_keyboard(expenses, page, has_prev, has_next)
     await update.message.reply_text(
         "Выбери расход для удаления:\n(Отсортировано по дате, новые сверху)",
         reply_markup=reply_markup
@@ -253,15 +228,16 @@ async def handle_expense_page_navigation(update: Update, context: ContextTypes.D
     if update.callback_query.data == "exp_page_info":
         return
     
-    page = int(update.callback_query.data.replace("exp_page_", ""))
-    expenses = context.user_data.get('delete_expenses_list', [])
+    page, expenses, has_prev, has_next = await load_keyset_page(
+        db.get_expenses_page, update.effective_user.id, ITEMS_PER_PAGE,
+        update.callback_query.data, "exp_page_"
+    )
     
     if not expenses:
-        await update.callback_query.edit_message_text("Список расходов устарел. Начни заново.")
+        await update.callback_query.edit_message_text("Пока нет расходов для удаления.")
         return
     
-    context.user_data['delete_expenses_page'] = page
-    reply_markup = create_expense_delete_keyboard(expenses, page)
+    reply_markup = create_expense_delete_keyboard(expenses, page, has_prev, has_next)
     
     await update.callback_query.edit_message_text(
         "Выбери расход для удаления:\n(Отсортировано по дате, новые сверху)",
@@ -274,18 +250,14 @@ async def handle_delete_expense(update: Update, context: ContextTypes.DEFAULT_TY
     expense_id = int(update.callback_query.data.replace("del_exp_", ""))
     user_id = update.effective_user.id
     
-    expenses = db.get_expenses(user_id, None)
-    expense = next((e for e in expenses if e['id'] == expense_id), None)
+    # Удаление и возврат суммы на баланс - одна транзакция
+    expense = await db.delete_expense(user_id, expense_id)
     
-    if expense and db.delete_expense(user_id, expense_id):
-        balance_manager.update_balance(user_id, expense['amount'], is_income=True)
-        
+    if expense:
         await update.callback_query.edit_message_text(
             f"✅ Расход удален.\n"
             f"Возвращено на баланс: {format_currency(expense['amount'])} руб."
         )
-        context.user_data.pop('delete_expenses_list', None)
-        context.user_data.pop('delete_expenses_page', None)
     else:
         await update.callback_query.edit_message_text("Не удалось найти расход. Возможно, он уже удален.")
 
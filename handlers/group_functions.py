@@ -2,11 +2,12 @@ from psycopg2.extras import RealDictCursor
 from typing import Dict, List
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from database import Database
+from database import get_database
+from async_db import AsyncProxy, get_async_database
 from utils import format_currency
 from datetime import datetime, timedelta
 
-db = Database()
+db = get_database()
 
 
 class GroupFinance:
@@ -153,6 +154,8 @@ class GroupFinance:
 
 
 group_finance = GroupFinance()
+async_group_finance = AsyncProxy(group_finance)
+async_database = get_async_database()
 
 async def group_add_expense(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -178,7 +181,7 @@ async def group_add_expense(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
         group_id = update.effective_chat.id
         
-        success = group_finance.add_group_expense(
+        success = await async_group_finance.add_group_expense(
             group_id=group_id,
             user_id=user.id,
             user_name=user.first_name,
@@ -188,7 +191,7 @@ async def group_add_expense(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         
         if success:
-            db.add_expense(user.id, amount, category, description)
+            await async_database.add_expense(user.id, amount, category, description)
             
             await update.message.reply_text(
                 f"✅ Групповой расход добавлен!\n\n"
@@ -222,7 +225,7 @@ async def group_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE):
             pass
     
     group_id = update.effective_chat.id
-    stats = group_finance.get_group_statistics(group_id, days)
+    stats = await async_group_finance.get_group_statistics(group_id, days)
     
     if stats['count'] == 0:
         await update.message.reply_text(
@@ -280,7 +283,7 @@ async def group_add_debt(update: Update, context: ContextTypes.DEFAULT_TYPE):
         creditor = update.message.reply_to_message.from_user
         group_id = update.effective_chat.id
         
-        success = group_finance.add_debt(
+        success = await async_group_finance.add_debt(
             group_id=group_id,
             debtor_id=debtor.id,
             debtor_name=debtor.first_name,
@@ -316,7 +319,7 @@ async def group_my_debts(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     group_id = update.effective_chat.id
     
-    debts = group_finance.get_user_debts(group_id, user_id)
+    debts = await async_group_finance.get_user_debts(group_id, user_id)
     
     message = "💰 <b>Твои долги в группе</b>\n\n"
     
@@ -371,7 +374,7 @@ async def group_settle_debt(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         debt_id = int(context.args[0])
         
-        if group_finance.settle_debt(debt_id):
+        if await async_group_finance.settle_debt(debt_id):
             await update.message.reply_text("✅ Долг погашен!")
         else:
             await update.message.reply_text("❌ Долг не найден")
@@ -3,7 +3,7 @@
 """
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from balance import balance_manager
+from balance import async_balance_manager
 from utils import format_currency
 
 
@@ -12,10 +12,12 @@ from utils import format_currency
 async def show_statistics_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Единое меню статистики"""
     keyboard = [
-        [InlineKeyboardButton("📊 Вчера", callback_data="stat_1"),
-         InlineKeyboardButton("📊 3 дня", callback_data="stat_3")],
+        [InlineKeyboardButton("📊 Сегодня", callback_data="stat_today"),
+         InlineKeyboardButton("📊 Вчера", callback_data="stat_yesterday")],
         [InlineKeyboardButton("📊 7 дней", callback_data="stat_7"),
          InlineKeyboardButton("📊 30 дней", callback_data="stat_30")],
+        [InlineKeyboardButton("📊 Эта неделя", callback_data="stat_week"),
+         InlineKeyboardButton("📊 Этот месяц", callback_data="stat_month")],
         [InlineKeyboardButton("📊 90 дней", callback_data="stat_90"),
          InlineKeyboardButton("📊 Всё время", callback_data="stat_all")],
         [InlineKeyboardButton("━━━━━━━━━━━━", callback_data="divider")],
@@ -51,9 +53,9 @@ async def show_charts_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Premium функция - фильтры
     try:
-        from subscription import subscription_manager
+        from subscription import async_subscription_manager
         user_id = update.effective_user.id
-        if subscription_manager.is_premium(user_id):
+        if await async_subscription_manager.is_premium(user_id):
             keyboard.append([InlineKeyboardButton(
                 "🎯 С фильтрами (Premium)",
                 callback_data="chart_with_filters"
@@ -112,7 +114,7 @@ async def show_tools_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     user_id = update.effective_user.id
-    balance = balance_manager.get_balance(user_id)
+    balance = await async_balance_manager.get_balance(user_id)
     
     await update.message.reply_text(
         f"🔧 <b>Инструменты</b>\n\n"
@@ -128,12 +130,12 @@ async def show_tools_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def show_balance_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Расширенное меню баланса"""
     user_id = update.effective_user.id
-    balance = balance_manager.get_balance(user_id)
+    balance = await async_balance_manager.get_balance(user_id)
     
     # Получаем статистику
-    from database import Database
-    db = Database()
-    stats = db.get_statistics(user_id, 30)
+    from async_db import get_async_database
+    db = get_async_database()
+    stats = await db.get_summary(user_id, 30)
     
     message = "💰 <b>Мой баланс</b>\n\n"
     message += f"💵 Основной: {format_currency(balance['balance'])} сом\n"
@@ -166,10 +168,10 @@ async def show_categories_menu(update: Update, context: ContextTypes.DEFAULT_TYP
     """Расширенное меню категорий"""
     user_id = update.effective_user.id
     
-    from custom_categories import category_manager
+    from custom_categories import async_category_manager
     
-    expense_cats = category_manager.get_categories(user_id, 'expense')
-    income_cats = category_manager.get_categories(user_id, 'income')
+    expense_cats = await async_category_manager.get_categories(user_id, 'expense')
+    income_cats = await async_category_manager.get_categories(user_id, 'income')
     
     custom_expense = len([c for c in expense_cats if c['is_custom']])
     custom_income = len([c for c in income_cats if c['is_custom']])
@@ -10,14 +10,14 @@ from config import (
     WAITING_FOR_BULK_DATA,
     BACK_BUTTON_TEXT
 )
-from database import Database
+from async_db import AsyncProxy, get_async_database
 from handlers.common import cancel
 from utils import parse_user_date, format_currency, format_date
 from hidden import HiddenMoneyManager
 
-db = Database()
+db = get_async_database()
 
-hidden_money_manager = HiddenMoneyManager()
+hidden_money_manager = AsyncProxy(HiddenMoneyManager())
 
 async def add_hidden_money_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Начать добавление скрытых денег"""
@@ -50,14 +50,14 @@ async def add_hidden_money_reason(update: Update, context: ContextTypes.DEFAULT_
     reason = update.message.text
     amount = context.user_data.get('hidden_money_amount')
     user_id = update.effective_user.id
-    minus_money_from_balance = db.add_expense(
+    minus_money_from_balance = await db.add_expense(
         user_id=user_id,
         amount=amount,
         category="Скрытые деньги",
         description=f"Добавление скрытых денег. Причина: {reason}" if reason else "Добавление скрытых денег",
         date=datetime.now()
     )
-    success = hidden_money_manager.add_hidden_money(user_id, amount, reason)
+    success = await hidden_money_manager.add_hidden_money(user_id, amount, reason)
 
     
     if success:
@@ -8,11 +8,10 @@ from telegram.ext import (
     ContextTypes, ConversationHandler, CommandHandler, MessageHandler,
     CallbackQueryHandler, filters
 )
-from database import Database
-from balance import balance_manager
-from custom_categories import category_manager
+from async_db import get_async_database
+from custom_categories import async_category_manager
 from utils import format_currency, format_date, parse_user_date
-from handlers.common import cancel
+from handlers.common import cancel, load_keyset_page, keyset_navigation_rows
 from config import (
     WAITING_FOR_INCOME_AMOUNT,
     WAITING_FOR_INCOME_SOURCE,
@@ -21,7 +20,7 @@ from config import (
     BACK_BUTTON_TEXT
 )
 
-db = Database()
+db = get_async_database()
 ITEMS_PER_PAGE = 5
 
 
@@ -41,7 +40,7 @@ async def add_income_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # НОВОЕ: Получаем пользовательские источники
         user_id = update.effective_user.id
-        sources = category_manager.get_categories(user_id, 'income')
+        sources = await async_category_manager.get_categories(user_id, 'income')
         
         keyboard = []
         
@@ -98,7 +97,7 @@ async def add_income_source(update: Update, context: ContextTypes.DEFAULT_TYPE):
             
             # НОВОЕ: Увеличиваем счётчик использования
             user_id = update.callback_query.from_user.id
-            category_manager.increment_use_count(user_id, source, 'income')
+            await async_category_manager.increment_use_count(user_id, source, 'income')
             
             await update.callback_query.edit_message_text(
                 f"Источник: {source}\n\n"
@@ -151,11 +150,8 @@ async def add_income_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return WAITING_FOR_INCOME_DATE
         date_value = parsed_date
     
-    # Добавляем доход в базу
-    db.add_income(user_id, amount, source, description, date_value)
-    
-    # НОВОЕ: Обновляем баланс
-    balance_manager.update_balance(user_id, amount, is_income=True)
+    # Вставка и зачисление на баланс - одна транзакция
+    result = await db.record_income(user_id, amount, source, description, date_value)
     
     response_text = (
         f"✅ Доход добавлен!\n\n"
@@ -165,8 +161,7 @@ async def add_income_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"📅 Дата: {format_date(date_value.isoformat())}"
     )
     
-    # НОВОЕ: Показываем обновлённый баланс
-    balance = balance_manager.get_balance(user_id)
+    balance = result['balance']
     response_text += (
         f"\n\n💵 <b>Баланс:</b> {format_currency(balance['balance'])} руб.\n"
         f"🔒 Скрытый: {format_currency(balance['hidden_balance'])} руб.\n"
@@ -179,52 +174,29 @@ async def add_income_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 
-# Остальной код (удаление доходов) остаётся без изменений
-def create_income_delete_keyboard(incomes, page=0):
+def create_income_delete_keyboard(incomes, page=0, has_prev=False, has_next=False):
     """Создает клавиатуру с пагинацией для удаления доходов"""
-    total_items = len(incomes)
-    total_pages = (total_items + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE
-    
-    start_idx = page * ITEMS_PER_PAGE
-    end_idx = min(start_idx + ITEMS_PER_PAGE, total_items)
-    
     buttons = []
-    for inc in incomes[start_idx:end_idx]:
+    for inc in incomes:
         date_value = format_date(inc['date']) if inc.get('date') else "Без даты"
         label = f"{format_currency(inc['amount'])} · {inc['source']} · {date_value}"
         buttons.append([InlineKeyboardButton(label, callback_data=f"del_inc_{inc['id']}")])
     
-    nav_buttons = []
-    if page > 0:
-        nav_buttons.append(InlineKeyboardButton("⬅️ Назад", callback_data=f"inc_page_{page-1}"))
-    
-    if page < total_pages - 1:
-        nav_buttons.append(InlineKeyboardButton("Вперед ➡️", callback_data=f"inc_page_{page+1}"))
-    
-    if nav_buttons:
-        buttons.append(nav_buttons)
-    
-    if total_pages > 1:
-        buttons.append([InlineKeyboardButton(
-            f"Страница {page + 1} из {total_pages}",
-            callback_data="inc_page_info"
-        )])
-    
+    buttons.extend(keyset_navigation_rows("inc_page_", page, incomes, has_prev, has_next))
     return InlineKeyboardMarkup(buttons)
 
 
 async def show_delete_income(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    incomes = db.get_last_income(user_id, limit=50)
+    page, incomes, has_prev, has_next = await load_keyset_page(
+        db.get_income_page, user_id, ITEMS_PER_PAGE
+    )
     
     if not incomes:
         await update.message.reply_text("Пока нет доходов для удаления.")
         return
     
-    context.user_data['delete_income_list'] = incomes
-    context.user_data['delete_income_page'] = 0
-    
-    reply_markup = create_income_delete_keyboard(incomes, 0)
+    reply_markup = create_income_delete_keyboard(incomes, page, has_prev, has_next)
     await update.message.reply_text(
         "Выбери доход для удаления:\n(Отсортировано по дате, новые сверху)",
         reply_markup=reply_markup
@@ -237,15 +209,16 @@ async def handle_income_page_navigation(update: Update, context: ContextTypes.DE
     if update.callback_query.data == "inc_page_info":
         return
     
-    page = int(update.callback_query.data.replace("inc_page_", ""))
-    incomes = context.user_data.get('delete_income_list', [])
+    page, incomes, has_prev, has_next = await load_keyset_page(
+        db.get_income_page, update.effective_user.id, ITEMS_PER_PAGE,
+        update.callback_query.data, "inc_page_"
+    )
     
     if not incomes:
-        await update.callback_query.edit_message_text("Список доходов устарел. Начни заново.")
+        await update.callback_query.edit_message_text("Пока нет доходов для удаления.")
         return
     
-    context.user_data['delete_income_page'] = page
-    reply_markup = create_income_delete_keyboard(incomes, page)
+    reply_markup = create_income_delete_keyboard(incomes, page, has_prev, has_next)
     
     await update.callback_query.edit_message_text(
         "Выбери доход для удаления:\n(Отсортировано по дате, новые сверху)",
@@ -258,20 +231,14 @@ async def handle_delete_income(update: Update, context: ContextTypes.DEFAULT_TYP
     income_id = int(update.callback_query.data.replace("del_inc_", ""))
     user_id = update.effective_user.id
     
-    # Получаем информацию о доходе перед удалением
-    incomes = db.get_income(user_id, None)
-    income = next((i for i in incomes if i['id'] == income_id), None)
+    # Удаление и списание суммы с баланса - одна транзакция
+    income = await db.delete_income(user_id, income_id)
     
-    if income and db.delete_income(user_id, income_id):
-        # НОВОЕ: Снимаем деньги с баланса при удалении
-        balance_manager.update_balance(user_id, income['amount'], is_income=False)
-        
+    if income:
         await update.callback_query.edit_message_text(
             f"✅ Доход удален.\n"
             f"Снято с баланса: {format_currency(income['amount'])} руб."
         )
-        context.user_data.pop('delete_income_list', None)
-        context.user_data.pop('delete_income_page', None)
     else:
         await update.callback_query.edit_message_text("Не удалось найти доход. Возможно, он уже удален.")
 
@@ -9,9 +9,9 @@ from telegram import (
     InlineKeyboardMarkup, InlineKeyboardButton
 )
 from telegram.ext import ContextTypes
-from database import Database
+from async_db import get_async_database
 
-db = Database()
+db = get_async_database()
 
 
 async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -102,7 +102,7 @@ async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYP
             )
         )
         
-        db.add_expense(
+        await db.add_expense(
             user_id=user_id,
             amount=parsed['amount'],
             category=parsed['category'],
@@ -129,7 +129,7 @@ async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYP
                 ]])
             )
         )
-        db.add_income(
+        await db.add_income(
             user_id=user_id,
             amount=parsed['amount'],
             source=parsed['source'],
@@ -199,7 +199,7 @@ async def inline_stats_callback(update: Update, context: ContextTypes.DEFAULT_TY
     await update.callback_query.answer()
     user_id = update.callback_query.from_user.id
     
-    stats = db.get_statistics(user_id, 30)
+    stats = await db.get_summary(user_id, 30)
     
     message = (
         "📊 <b>Статистика за 30 дней</b>\n\n"
@@ -6,7 +6,7 @@ from telegram.ext import (
     ContextTypes, ConversationHandler, MessageHandler,
     CommandHandler, CallbackQueryHandler, filters
 )
-from notifications import notification_manager
+from notifications import async_notification_manager
 from utils import format_currency, format_date
 from handlers.common import cancel
 from config import BACK_BUTTON_TEXT
@@ -19,7 +19,7 @@ WAITING_FOR_REGULAR_FREQUENCY = 602
 async def show_notification_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать настройки уведомлений"""
     user_id = update.effective_user.id
-    settings = notification_manager.get_settings(user_id)
+    settings = await async_notification_manager.get_settings(user_id)
     
     message = "🔔 <b>Настройки уведомлений</b>\n\n"
     
@@ -29,7 +29,7 @@ async def show_notification_settings(update: Update, context: ContextTypes.DEFAU
     message += f"{status_emoji(settings['weekly_report'])} Недельный отчёт\n"
     message += f"{status_emoji(settings['budget_alerts'])} Предупреждения о бюджете\n"
     message += f"{status_emoji(settings['large_expense_alert'])} Крупные траты"
-    message += f" (от {format_currency(settings['large_expense_threshold'])} руб.)\n"
+    message += f" (необычные для категории, пока истории мало - от {format_currency(settings['large_expense_threshold'])} руб.)\n"
     message += f"{status_emoji(settings['regular_expense_reminders'])} Напоминания о регулярных тратах\n\n"
     message += "Нажми на кнопку, чтобы изменить настройку:"
     
@@ -67,11 +67,11 @@ async def toggle_notification_setting(update: Update, context: ContextTypes.DEFA
     setting_name = update.callback_query.data.replace("notif_toggle_", "")
     user_id = update.effective_user.id
     
-    settings = notification_manager.get_settings(user_id)
+    settings = await async_notification_manager.get_settings(user_id)
     current_value = settings[setting_name]
     new_value = 0 if current_value else 1
     
-    notification_manager.update_settings(user_id, **{setting_name: new_value})
+    await async_notification_manager.update_settings(user_id, **{setting_name: new_value})
     
     setting_names = {
         'daily_summary': 'Ежедневная сводка',
@@ -91,7 +91,7 @@ async def toggle_notification_setting(update: Update, context: ContextTypes.DEFA
 async def show_regular_expenses(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать список регулярных трат"""
     user_id = update.effective_user.id
-    expenses = notification_manager.get_regular_expenses(user_id)
+    expenses = await async_notification_manager.get_regular_expenses(user_id)
     
     if not expenses:
         keyboard = [[InlineKeyboardButton("➕ Добавить регулярную трату", callback_data="add_regular_expense")]]
@@ -200,7 +200,7 @@ async def regular_frequency_selected(update: Update, context: ContextTypes.DEFAU
     category = context.user_data['regular_category']
     amount = context.user_data['regular_amount']
     
-    success = notification_manager.add_regular_expense(
+    success = await async_notification_manager.add_regular_expense(
         user_id, category, amount, frequency
     )
     
@@ -233,7 +233,7 @@ async def disable_regular_expense(update: Update, context: ContextTypes.DEFAULT_
     
     expense_id = int(update.callback_query.data.replace("disable_regular_", ""))
     
-    success = notification_manager.disable_regular_expense(expense_id)
+    success = await async_notification_manager.disable_regular_expense(expense_id)
     
     if success:
         await update.callback_query.edit_message_text(
@@ -6,15 +6,15 @@ from telegram.ext import (
     ContextTypes, ConversationHandler, MessageHandler,
     CommandHandler, CallbackQueryHandler, PreCheckoutQueryHandler, filters
 )
-from subscription import subscription_manager
-from category_filter import category_filter
-from budgets import budget_manager
-from database import Database
+from subscription import async_subscription_manager
+from category_filter import async_category_filter
+from budgets import async_budget_manager
+from async_db import get_async_database
 from utils import format_currency
 from handlers.common import cancel
 from config import BACK_BUTTON_TEXT
 
-db = Database()
+db = get_async_database()
 
 WAITING_FOR_FILTER_CATEGORY = 200
 WAITING_FOR_FILTER_ACTION = 201
@@ -26,7 +26,7 @@ def premium_required(func):
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
         
-        if not subscription_manager.is_premium(user_id):
+        if not await async_subscription_manager.is_premium(user_id):
             keyboard = [[InlineKeyboardButton("⭐ Получить Premium", callback_data="show_premium")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
@@ -55,7 +55,7 @@ def premium_required(func):
 async def show_premium_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать информацию о Premium"""
     user_id = update.effective_user.id
-    sub = subscription_manager.get_subscription(user_id)
+    sub = await async_subscription_manager.get_subscription(user_id)
     
     if update.callback_query:
         await update.callback_query.answer()
@@ -127,10 +127,10 @@ async def successful_payment_callback(update: Update, context: ContextTypes.DEFA
     payment = update.message.successful_payment
     user_id = update.effective_user.id
     
-    success = subscription_manager.activate_premium(user_id, months=1)
+    success = await async_subscription_manager.activate_premium(user_id, months=1)
     
     if success:
-        subscription_manager.add_payment(
+        await async_subscription_manager.add_payment(
             user_id=user_id,
             stars_amount=1,
             payment_charge_id=payment.provider_payment_charge_id,
@@ -160,7 +160,7 @@ async def edit_budget_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
     user_id = update.effective_user.id
     
-    budgets = budget_manager.get_budgets(user_id)
+    budgets = await async_budget_manager.get_budgets(user_id)
     
     if not budgets:
         await update.callback_query.edit_message_text("У тебя нет бюджетов для редактирования.")
@@ -190,7 +190,7 @@ async def edit_budget_category_selected(update: Update, context: ContextTypes.DE
     context.user_data['edit_budget_category'] = category
     
     user_id = update.effective_user.id
-    budgets = budget_manager.get_budgets(user_id)
+    budgets = await async_budget_manager.get_budgets(user_id)
     current_budget = next((b for b in budgets if b['category'] == category), None)
     
     if current_budget:
@@ -215,7 +215,7 @@ async def edit_budget_amount(update: Update, context: ContextTypes.DEFAULT_TYPE)
         user_id = update.effective_user.id
         category = context.user_data['edit_budget_category']
         
-        success = budget_manager.set_budget(user_id, category, amount)
+        success = await async_budget_manager.set_budget(user_id, category, amount)
         
         if success:
             await update.message.reply_text(
@@ -238,7 +238,7 @@ async def edit_budget_amount(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def show_category_filters(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать меню фильтров категорий"""
     user_id = update.effective_user.id
-    filters = category_filter.get_all_filters(user_id)
+    filters = await async_category_filter.get_all_filters(user_id)
     
     message = "🎯 <b>Фильтры категорий</b>\n\n"
     
@@ -283,7 +283,7 @@ async def add_filter_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
     
     user_id = update.effective_user.id
-    stats = db.get_statistics(user_id, 90)
+    stats = await db.get_summary(user_id, 90)
     
     categories = list(stats['expenses_by_category'].keys())[:10]
     
@@ -358,7 +358,7 @@ async def filter_action_selected(update: Update, context: ContextTypes.DEFAULT_T
     
     is_excluded = update.callback_query.data == "filter_exclude"
     
-    success = category_filter.add_filter(user_id, category, is_excluded)
+    success = await async_category_filter.add_filter(user_id, category, is_excluded)
     
     if success:
         action_text = "исключена из" if is_excluded else "будет единственной учитываемой в"
@@ -377,7 +377,7 @@ async def remove_filter_start(update: Update, context: ContextTypes.DEFAULT_TYPE
     await update.callback_query.answer()
     user_id = update.effective_user.id
     
-    filters = category_filter.get_all_filters(user_id)
+    filters = await async_category_filter.get_all_filters(user_id)
     all_filtered = filters['expense_excluded'] + filters['expense_included']
     
     if not all_filtered:
@@ -402,7 +402,7 @@ async def remove_filter_confirm(update: Update, context: ContextTypes.DEFAULT_TY
     category = update.callback_query.data.replace("rmfilter_", "")
     user_id = update.effective_user.id
     
-    success = category_filter.remove_filter(user_id, category)
+    success = await async_category_filter.remove_filter(user_id, category)
     
     if success:
         await update.callback_query.edit_message_text(f"✅ Фильтр «{category}» удален")
@@ -415,7 +415,7 @@ async def clear_all_filters(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
     user_id = update.effective_user.id
     
-    success = category_filter.clear_all_filters(user_id)
+    success = await async_category_filter.clear_all_filters(user_id)
     
     if success:
         await update.callback_query.edit_message_text("✅ Все фильтры очищены")
@@ -1,21 +1,24 @@
-from telegram import Update
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     ContextTypes, ConversationHandler, MessageHandler,
-    CommandHandler, filters
+    CommandHandler, CallbackQueryHandler, filters
 )
-from database import Database
-from utils import format_currency, format_date
+from async_db import get_async_database
+from utils import format_currency, format_date, encode_page_cursor, decode_page_cursor
 from handlers.common import cancel
 from config import WAITING_FOR_SEARCH_QUERY, BACK_BUTTON_TEXT
 
-db = Database()
+db = get_async_database()
+
+SEARCH_PAGE_SIZE = 15
 
 SEARCH_HINT = """🔍 Инструкция по поиску:
 
 📝 Основные возможности:
 • Поиск работает по описанию, категории расходов и источнику доходов
 • Регистр букв не имеет значения
-• Можно искать по части слова
+• Можно искать по части слова, небольшие опечатки тоже находятся
+• Сначала точные совпадения (новые сверху), затем записи с похожими словами
 
 🎯 Специальные префиксы:
 • расход: или expense: — искать только в расходах
@@ -56,11 +59,9 @@ async def search_execute(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return WAITING_FOR_SEARCH_QUERY
     
-    results = db.search_transactions(user_id, text, txn_type, limit=15)
-    response = []
-    total_found = len(results["expenses"]) + len(results["income"])
+    results = await db.search_transactions(user_id, text, txn_type, limit=SEARCH_PAGE_SIZE)
     
-    if total_found == 0:
+    if not results["expenses"] and not results["income"]:
         await update.message.reply_text(
             f"🔍 По запросу «{text}» ничего не найдено.\n\n"
             "💡 Советы:\n"
@@ -70,7 +71,71 @@ async def search_execute(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return ConversationHandler.END
     
-    response.append(f"🔍 Найдено записей: {total_found}\n")
+    context.user_data['search'] = {'query': text, 'type': txn_type}
+    await update.message.reply_text(
+        _format_results(results, txn_type, 0),
+        reply_markup=_more_keyboard(results, _shown(results))
+    )
+    return ConversationHandler.END
+
+
+async def search_more(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Следующая страница результатов поиска"""
+    query = update.callback_query
+    await query.answer()
+    
+    search = context.user_data.get('search')
+    if not search:
+        await query.edit_message_reply_markup(reply_markup=None)
+        await query.message.reply_text("Поиск устарел. Начни заново: 🔍 Поиск")
+        return
+    
+    # search_more_{показано}_e_{ключ} - точные совпадения после ключа,
+    # search_more_{показано}_f_{смещение} - похожие начиная со смещения
+    offset_str, phase, position = query.data[len("search_more_"):].split("_", 2)
+    offset = int(offset_str)
+    if phase == "e":
+        page_args = {'cursor_key': decode_page_cursor(position)}
+    else:
+        page_args = {'fuzzy_offset': int(position)}
+    results = await db.search_transactions(
+        update.effective_user.id, search['query'], search['type'],
+        limit=SEARCH_PAGE_SIZE, **page_args
+    )
+    await query.edit_message_reply_markup(reply_markup=None)
+    if not results["expenses"] and not results["income"]:
+        await query.message.reply_text("Больше ничего не найдено.")
+        return
+    
+    await query.message.reply_text(
+        _format_results(results, search['type'], offset),
+        reply_markup=_more_keyboard(results, offset + _shown(results))
+    )
+
+
+def _shown(results: dict) -> int:
+    return len(results["expenses"]) + len(results["income"])
+
+
+def _more_keyboard(results: dict, next_offset: int):
+    """Кнопка следующей страницы; в callback_data ключ последней записи или смещение похожих"""
+    if not results["has_more"]:
+        return None
+    page = results["next"]
+    if "cursor_key" in page:
+        date_value, row_id = page["cursor_key"]
+        position = f"e_{encode_page_cursor({'date': date_value, 'id': row_id})}"
+    else:
+        position = f"f_{page['fuzzy_offset']}"
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("🔽 Показать ещё", callback_data=f"search_more_{next_offset}_{position}")
+    ]])
+
+
+def _format_results(results: dict, txn_type: str, offset: int) -> str:
+    response = []
+    shown = _shown(results)
+    response.append(f"🔍 Результаты {offset + 1}–{offset + shown}\n")
     
     if txn_type in ("all", "expenses"):
         expenses = results["expenses"]
@@ -99,8 +164,7 @@ async def search_execute(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     f"    📅 {date_str}"
                 )
     
-    await update.message.reply_text("\n".join(response))
-    return ConversationHandler.END
+    return "\n".join(response)
 
 
 search_handler = ConversationHandler(
@@ -114,4 +178,6 @@ search_handler = ConversationHandler(
         CommandHandler("cancel", cancel),
         MessageHandler(filters.Regex(f"^{BACK_BUTTON_TEXT}$"), cancel)
     ]
-)
\ No newline at end of file
+)
+
+search_more_callback = CallbackQueryHandler(search_more, pattern="^search_more_\\d+_(e_\\d+_\\d+|f_\\d+)$")
@@ -3,10 +3,12 @@
 """
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, CommandHandler, CallbackQueryHandler, filters
-from budgets import budget_manager
+from budgets import async_budget_manager
+from async_db import run_sync
 from utils import format_currency, format_date
 from handlers.common import cancel
 from config import BACK_BUTTON_TEXT
+from periods import Period
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)) + '/..')
@@ -28,7 +30,7 @@ WAITING_FOR_BUDGET_AMOUNT = 101
 async def show_smart_tips(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать умные советы"""
     user_id = update.effective_user.id
-    tips = generate_smart_tips(user_id)
+    tips = await run_sync(generate_smart_tips, user_id)
     
     message = "💡 <b>Умные советы и аналитика</b>\n\n"
     
@@ -36,8 +38,8 @@ async def show_smart_tips(update: Update, context: ContextTypes.DEFAULT_TYPE):
         message += f"{i}. {tip}\n\n"
     
     try:
-        from subscription import subscription_manager
-        if subscription_manager.is_premium(user_id):
+        from subscription import async_subscription_manager
+        if await async_subscription_manager.is_premium(user_id):
             message += "\n🎯 <i>Используй фильтры категорий для точной аналитики</i>"
         else:
             message += "\n⭐ <i>Premium: фильтруй категории для точного анализа</i>"
@@ -49,7 +51,7 @@ async def show_smart_tips(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def show_achievements(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    data = get_achievements(user_id)
+    data = await run_sync(get_achievements, user_id)
     
     message = "🏆 <b>Твои достижения</b>\n\n"
     
@@ -72,14 +74,15 @@ async def show_achievements(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def show_period_comparison(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать сравнение текущего и предыдущего периода"""
     user_id = update.effective_user.id
-    comparison = compare_periods(user_id)
+    # Календарный месяц против прошлого по то же число
+    comparison = await run_sync(compare_periods, user_id, period=Period.calendar_month())
     
     current = comparison['current']
     previous = comparison['previous']
     changes = comparison['changes']
     filters_applied = comparison.get('filters_applied', False)
     
-    message = "📊 <b>Сравнение месяцев</b>\n\n"
+    message = f"📊 <b>Сравнение месяцев</b>\n{current['label']} и {previous['label']}\n\n"
     
     if filters_applied:
         message += "🎯 <i>Применены фильтры категорий</i>\n\n"
@@ -123,7 +126,7 @@ async def show_period_comparison(update: Update, context: ContextTypes.DEFAULT_T
 async def show_expense_forecast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать прогноз расходов"""
     user_id = update.effective_user.id
-    forecast = predict_monthly_expenses(user_id)
+    forecast = await run_sync(predict_monthly_expenses, user_id)
     filters_applied = forecast.get('filters_applied', False)
     
     message = "🔮 <b>Прогноз расходов на месяц</b>\n\n"
@@ -139,7 +142,11 @@ async def show_expense_forecast(update: Update, context: ContextTypes.DEFAULT_TY
     
     message += f"🎯 <b>Прогноз на конец месяца:</b>\n"
     message += f"Всего: {format_currency(forecast['predicted_total'])} руб.\n"
-    message += f"Осталось потратить: {format_currency(forecast['predicted_remaining'])} руб.\n\n"
+    message += f"Осталось потратить: {format_currency(forecast['predicted_remaining'])} руб.\n"
+    message += (
+        f"Вероятный диапазон: {format_currency(forecast['predicted_low'])} - "
+        f"{format_currency(forecast['predicted_high'])} руб.\n\n"
+    )
     
     if forecast['predicted_remaining'] > 0:
         daily_budget = forecast['predicted_remaining'] / max(forecast['days_remaining'], 1)
@@ -154,8 +161,8 @@ async def show_budgets_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать меню бюджетов"""
     user_id = update.effective_user.id
     try:
-        from subscription import subscription_manager
-        is_premium = subscription_manager.is_premium(user_id)
+        from subscription import async_subscription_manager
+        is_premium = await async_subscription_manager.is_premium(user_id)
     except:
         is_premium = False
     
@@ -186,7 +193,7 @@ async def show_budgets_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
     user_id = update.effective_user.id
     
-    summary = budget_manager.get_budget_summary(user_id)
+    summary = await async_budget_manager.get_budget_summary(user_id)
     
     if summary['budgets_count'] == 0:
         await update.callback_query.edit_message_text(
@@ -254,7 +261,7 @@ async def add_budget_amount(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
         category = context.user_data['budget_category']
         
-        success = budget_manager.set_budget(user_id, category, amount)
+        success = await async_budget_manager.set_budget(user_id, category, amount)
         
         if success:
             await update.message.reply_text(
@@ -277,7 +284,7 @@ async def delete_budget_start(update: Update, context: ContextTypes.DEFAULT_TYPE
     """Показать список бюджетов для удаления"""
     await update.callback_query.answer()
     user_id = update.effective_user.id
-    budgets = budget_manager.get_budgets(user_id)
+    budgets = await async_budget_manager.get_budgets(user_id)
     
     if not budgets:
         await update.callback_query.edit_message_text("У тебя нет бюджетов для удаления.")
@@ -305,7 +312,7 @@ async def delete_budget_confirm(update: Update, context: ContextTypes.DEFAULT_TY
     category = update.callback_query.data.replace("del_budget_", "")
     user_id = update.effective_user.id
     
-    success = budget_manager.delete_budget(user_id, category)
+    success = await async_budget_manager.delete_budget(user_id, category)
     
     if success:
         await update.callback_query.edit_message_text(f"✅ Бюджет '{category}' удален.")
@@ -1,27 +1,31 @@
-import os
 import logging
 from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from database import Database
+from async_db import get_async_database, run_sync
 from utils import format_currency
-from export import export_to_excel, export_to_pdf
-from charts import create_statistics_chart
+from chart_service import ChartBusyError, reply_chart
+from periods import Period
 
 logger = logging.getLogger(__name__)
-db = Database()
+db = get_async_database()
 
 
 async def show_statistics_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     keyboard = [
         [
-            InlineKeyboardButton("Вчера", callback_data="stat_1"),
-            InlineKeyboardButton("3 дня", callback_data="stat_3")
+            InlineKeyboardButton("Сегодня", callback_data="stat_today"),
+            InlineKeyboardButton("Вчера", callback_data="stat_yesterday")
         ],
         [
+            InlineKeyboardButton("3 дня", callback_data="stat_3"),
             InlineKeyboardButton("15 дней", callback_data="stat_15"),
             InlineKeyboardButton("30 дней", callback_data="stat_30")
         ],
+        [
+            InlineKeyboardButton("Этот месяц", callback_data="stat_month"),
+            InlineKeyboardButton("Прошлый месяц", callback_data="stat_prev_month")
+        ],
         [
             InlineKeyboardButton("90 дней", callback_data="stat_90"),
             InlineKeyboardButton("Все время", callback_data="stat_all")
@@ -33,21 +37,15 @@ async def show_statistics_menu(update: Update, context: ContextTypes.DEFAULT_TYP
 
 async def show_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
-    days_str = update.callback_query.data.replace("stat_", "")
-    days = None if days_str == "all" else int(days_str)
+    try:
+        period = Period.parse(update.callback_query.data.replace("stat_", ""))
+    except ValueError:
+        await update.callback_query.message.reply_text("❌ Ошибка: неверный формат периода")
+        return
     user_id = update.effective_user.id
-    stats = db.get_statistics(user_id, days)
-    
-    period_name = {
-        1: "Вчера",
-        3: "Последние 3 дня",
-        15: "Последние 15 дней",
-        30: "Последние 30 дней",
-        90: "Последние 90 дней",
-        None: "Все время"
-    }.get(days, f"{days} дней")
+    stats = await db.get_summary(user_id, period)
     
-    text = f"📊 Статистика за {period_name}\n\n"
+    text = f"📊 Статистика за {period.label}\n\n"
     text += f"💰 Доходы: {format_currency(stats['total_income'])} руб.\n"
     text += f"💸 Расходы: {format_currency(stats['total_expenses'])} руб.\n"
     text += f"💵 Баланс: {format_currency(stats['balance'])} руб.\n\n"
@@ -68,7 +66,7 @@ async def show_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def show_last_3_days(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    stats = db.get_statistics(user_id, 3)
+    stats = await db.get_statistics(user_id, 3)
     text = "📝 Последние 3 дня\n\n"
     
     expenses_by_day = {}
@@ -129,6 +127,10 @@ async def show_export_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
             InlineKeyboardButton("60 дней", callback_data="exp_60"),
             InlineKeyboardButton("90 дней", callback_data="exp_90")
         ],
+        [
+            InlineKeyboardButton("Этот месяц", callback_data="exp_month"),
+            InlineKeyboardButton("Прошлый месяц", callback_data="exp_prev_month")
+        ],
         [
             InlineKeyboardButton("Все время", callback_data="exp_all")
         ]
@@ -141,37 +143,24 @@ async def handle_export(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
     
     callback_data = update.callback_query.data
-    days_str = callback_data.replace("exp_", "")
-    
-    if days_str == "all":
-        days = None
-        period_text = "все время"
-    else:
-        try:
-            days = int(days_str)
-            period_text = f"{days} дней"
-        except ValueError:
-            await update.callback_query.message.reply_text("❌ Ошибка: неверный формат периода")
-            return
+    try:
+        period = Period.parse(callback_data.replace("exp_", ""))
+    except ValueError:
+        await update.callback_query.message.reply_text("❌ Ошибка: неверный формат периода")
+        return
+    period_text = period.label
     
     user_id = update.effective_user.id
     
     try:
-        file_path = export_to_excel(db, user_id, days)
-        
-        if file_path and os.path.exists(file_path):
-            with open(file_path, 'rb') as file:
-                await update.callback_query.message.reply_document(
-                    document=file,
-                    filename=f"finance_export_{period_text.replace(' ', '_')}.xlsx",
-                    caption=f"📤 Экспорт данных за {period_text}"
-                )
-            try:
-                os.remove(file_path)
-            except:
-                pass
-        else:
-            await update.callback_query.message.reply_text("❌ Ошибка при создании файла экспорта.")
+        from export import export_to_excel
+        # Книга собирается в памяти (большая - во временном файле) и уходит без записи в каталог бота
+        with await run_sync(export_to_excel, db.sync, user_id, period) as file:
+            await update.callback_query.message.reply_document(
+                document=file,
+                filename=f"finance_export_{period_text.replace(' ', '_')}.xlsx",
+                caption=f"📤 Экспорт данных за {period_text}"
+            )
             
     except Exception as e:
         logger.error(f"Export error: {e}", exc_info=True)
@@ -192,49 +181,47 @@ async def show_pdf_export_menu(update: Update, context: ContextTypes.DEFAULT_TYP
             InlineKeyboardButton("60 дней", callback_data="pdf_60"),
             InlineKeyboardButton("90 дней", callback_data="pdf_90")
         ],
+        [
+            InlineKeyboardButton("Этот месяц", callback_data="pdf_month"),
+            InlineKeyboardButton("Прошлый месяц", callback_data="pdf_prev_month")
+        ],
         [
             InlineKeyboardButton("Все время", callback_data="pdf_all")
+        ],
+        [
+            InlineKeyboardButton("⚡ Итоги за месяц", callback_data="pdf_summary_month"),
+            InlineKeyboardButton("⚡ Итоги за все время", callback_data="pdf_summary_all")
         ]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_text("Выбери период для PDF-отчета:", reply_markup=reply_markup)
+    await update.message.reply_text(
+        "Выбери период для PDF-отчета (со всеми операциями) или краткий отчёт только с итогами:",
+        reply_markup=reply_markup
+    )
 
 
 async def handle_pdf_export(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
     
-    callback_data = update.callback_query.data
-    days_str = callback_data.replace("pdf_", "")
-
-    if days_str == "all":
-        days = None
-        period_text = "все время"
-    else:
-        try:
-            days = int(days_str)
-            period_text = f"{days} дней"
-        except ValueError:
-            await update.callback_query.message.reply_text("❌ Ошибка: неверный формат периода")
-            return
+    spec = update.callback_query.data.replace("pdf_", "", 1)
+    summary_only = spec.startswith("summary_")
+    try:
+        period = Period.parse(spec.replace("summary_", "", 1))
+    except ValueError:
+        await update.callback_query.message.reply_text("❌ Ошибка: неверный формат периода")
+        return
+    period_text = period.label
     
     user_id = update.effective_user.id
     
     try:
-        file_path = export_to_pdf(db, user_id, days)
-        
-        if file_path and os.path.exists(file_path):
-            with open(file_path, 'rb') as file:
-                await update.callback_query.message.reply_document(
-                    document=file,
-                    filename=f"finance_report_{period_text.replace(' ', '_')}.pdf",
-                    caption=f"📄 PDF-отчет за {period_text}"
-                )
-            try:
-                os.remove(file_path)
-            except:
-                pass
-        else:
-            await update.callback_query.message.reply_text("❌ Ошибка при создании PDF.")
+        from export import export_to_pdf
+        with await run_sync(export_to_pdf, db.sync, user_id, period, summary_only) as file:
+            await update.callback_query.message.reply_document(
+                document=file,
+                filename=f"finance_report_{period_text.replace(' ', '_')}.pdf",
+                caption=f"📄 PDF-отчет за {period_text}" + (" (итоги)" if summary_only else "")
+            )
             
     except Exception as e:
         logger.error(f"PDF export error: {e}", exc_info=True)
@@ -270,39 +257,30 @@ async def handle_chart_generation(update: Update, context: ContextTypes.DEFAULT_
     await update.callback_query.answer()
     
     callback_data = update.callback_query.data
-    days_str = callback_data.replace("chart_", "")
-    if days_str == "all":
-        days = None
-        period_text = "все время"
-    else:
-        try:
-            days = int(days_str)
-            period_text = f"{days} дней"
-        except ValueError:
-            await update.callback_query.message.reply_text("❌ Ошибка: неверный формат периода")
-            return
+    try:
+        period = Period.parse(callback_data.replace("chart_", ""))
+    except ValueError:
+        await update.callback_query.message.reply_text("❌ Ошибка: неверный формат периода")
+        return
+    period_text = period.label
     
     user_id = update.effective_user.id
     
     try:
-        stats = db.get_statistics(user_id, days)
-        chart_path = create_statistics_chart(stats, period_text)
+        stats = await db.get_summary(user_id, period)
+        sent = await reply_chart(
+            update.callback_query.message,
+            user_id,
+            f"📈 Диаграмма расходов/доходов за {period_text}",
+            "charts.create_statistics_chart", stats, period_text
+        )
         
-        if not chart_path or not os.path.exists(chart_path):
+        if not sent:
             await update.callback_query.message.reply_text("Недостаточно данных для построения диаграммы.")
             return
-        
-        with open(chart_path, 'rb') as photo:
-            await update.callback_query.message.reply_photo(
-                photo=photo,
-                caption=f"📈 Диаграмма расходов/доходов за {period_text}"
-            )
-        
-        try:
-            os.remove(chart_path)
-        except:
-            pass
             
+    except ChartBusyError as e:
+        await update.callback_query.message.reply_text(e.text)
     except Exception as e:
         logger.error(f"Chart generation error: {e}", exc_info=True)
         await update.callback_query.message.reply_text(
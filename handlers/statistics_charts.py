@@ -1,15 +1,15 @@
 """
 Обновленные обработчики для диаграмм с выбором типа и фильтрами
 """
-import os
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, CallbackQueryHandler, MessageHandler, filters
-from database import Database
-from charts_improved import create_statistics_chart
+from async_db import get_async_database
+from chart_service import ChartBusyError, reply_chart
 from handlers.common import cancel
 from config import BACK_BUTTON_TEXT
+from periods import Period
 
-db = Database()
+db = get_async_database()
 
 WAITING_FOR_CHART_CATEGORIES = 300
 
@@ -53,6 +53,10 @@ async def chart_type_selected(update: Update, context: ContextTypes.DEFAULT_TYPE
             InlineKeyboardButton("30 дней", callback_data="chart_period_30"),
             InlineKeyboardButton("90 дней", callback_data="chart_period_90")
         ],
+        [
+            InlineKeyboardButton("Этот месяц", callback_data="chart_period_month"),
+            InlineKeyboardButton("Прошлый месяц", callback_data="chart_period_prev_month")
+        ],
         [
             InlineKeyboardButton("Все время", callback_data="chart_period_all")
         ]
@@ -76,28 +80,30 @@ async def chart_period_selected(update: Update, context: ContextTypes.DEFAULT_TY
     """Выбран период диаграммы"""
     await update.callback_query.answer("Генерирую диаграмму...")
     
-    period_str = update.callback_query.data.replace("chart_period_", "")
-    days = None if period_str == "all" else int(period_str)
+    period = Period.parse(update.callback_query.data.replace("chart_period_", ""))
     
     chart_type = context.user_data.get('chart_type', 'pie')
     user_id = update.effective_user.id
     
-    stats = db.get_statistics(user_id, days)
-    
-    period_text = {
-        30: "30 дней",
-        90: "90 дней",
-        None: "все время"
-    }.get(days, f"{days} дней")
+    stats = await db.get_summary(user_id, period)
+    period_text = period.label
 
-    chart_path = create_statistics_chart(
-        stats, 
-        period_text, 
-        chart_type=chart_type,
-        excluded_categories=None
-    )
+    try:
+        sent = await reply_chart(
+            update.callback_query.message,
+            user_id,
+            f"📈 Диаграмма за {period_text}",
+            "charts_improved.create_statistics_chart",
+            stats, 
+            period_text, 
+            chart_type=chart_type,
+            excluded_categories=None
+        )
+    except ChartBusyError as e:
+        await update.callback_query.message.reply_text(e.text)
+        return
     
-    if not chart_path or not os.path.exists(chart_path):
+    if not sent:
         await update.callback_query.edit_message_text(
             "Недостаточно данных для построения диаграммы."
         )
@@ -105,14 +111,8 @@ async def chart_period_selected(update: Update, context: ContextTypes.DEFAULT_TY
         return
     
     try:
-        await update.callback_query.message.reply_photo(
-            photo=open(chart_path, 'rb'),
-            caption=f"📈 Диаграмма за {period_text}"
-        )
         await update.callback_query.message.delete()
     finally:
-        if os.path.exists(chart_path):
-            os.remove(chart_path)
         context.user_data.clear()
 
 
@@ -122,8 +122,8 @@ async def chart_with_filters_start(update: Update, context: ContextTypes.DEFAULT
     user_id = update.effective_user.id
     
     try:
-        from subscription import subscription_manager
-        if not subscription_manager.is_premium(user_id):
+        from subscription import async_subscription_manager
+        if not await async_subscription_manager.is_premium(user_id):
             keyboard = [[InlineKeyboardButton("⭐ Получить Premium", callback_data="show_premium")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
@@ -138,7 +138,7 @@ async def chart_with_filters_start(update: Update, context: ContextTypes.DEFAULT
     except ImportError:
         pass
     
-    stats = db.get_statistics(user_id, 90)
+    stats = await db.get_summary(user_id, 90)
     categories = list(stats['expenses_by_category'].keys())
     
     if not categories:
@@ -192,7 +192,7 @@ async def chart_toggle_category(update: Update, context: ContextTypes.DEFAULT_TY
     context.user_data['excluded_categories'] = excluded
     
     user_id = update.effective_user.id
-    stats = db.get_statistics(user_id, 90)
+    stats = await db.get_summary(user_id, 90)
     categories = list(stats['expenses_by_category'].keys())
     
     keyboard = []
@@ -256,16 +256,28 @@ async def chart_filtered_type_selected(update: Update, context: ContextTypes.DEF
     excluded = context.user_data.get('excluded_categories', [])
     user_id = update.effective_user.id
 
-    stats = db.get_statistics(user_id, 30)
+    stats = await db.get_summary(user_id, 30)
     
-    chart_path = create_statistics_chart(
-        stats,
-        "30 дней",
-        chart_type=chart_type,
-        excluded_categories=excluded
-    )
+    caption = "📈 Диаграмма за 30 дней"
+    if excluded:
+        caption += f"\n🚫 Исключено категорий: {len(excluded)}"
     
-    if not chart_path or not os.path.exists(chart_path):
+    try:
+        sent = await reply_chart(
+            update.callback_query.message,
+            user_id,
+            caption,
+            "charts_improved.create_statistics_chart",
+            stats,
+            "30 дней",
+            chart_type=chart_type,
+            excluded_categories=excluded
+        )
+    except ChartBusyError as e:
+        await update.callback_query.message.reply_text(e.text)
+        return
+    
+    if not sent:
         await update.callback_query.edit_message_text(
             "Недостаточно данных для построения диаграммы."
         )
@@ -273,18 +285,8 @@ async def chart_filtered_type_selected(update: Update, context: ContextTypes.DEF
         return
     
     try:
-        caption = "📈 Диаграмма за 30 дней"
-        if excluded:
-            caption += f"\n🚫 Исключено категорий: {len(excluded)}"
-        
-        await update.callback_query.message.reply_photo(
-            photo=open(chart_path, 'rb'),
-            caption=caption
-        )
         await update.callback_query.message.delete()
     finally:
-        if os.path.exists(chart_path):
-            os.remove(chart_path)
         context.user_data.clear()
 
 
@@ -1,7 +1,10 @@
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
 from typing import Dict, List, Optional
-from database import Database
+from database import get_database
+
+db = get_database()
+
 
 class HiddenMoneyManager:
     def __init__(self):
@@ -9,7 +12,6 @@ class HiddenMoneyManager:
 
     def add_hidden_money(self, user_id: int, amout:float, reason: str = "") -> bool:
         """Добавить скрытые деньги"""
-        db = Database()
         conn = db.get_connection()
         try:
             cursor = conn.cursor()
@@ -30,7 +32,6 @@ class HiddenMoneyManager:
 
     def get_hidden_money(self, user_id: int) -> List[Dict]:
             """Получить все скрытые деньги пользователя"""
-            db = Database()
             conn = db.get_connection()
             try:
                 cursor = conn.cursor(cursor_factory=RealDictCursor)
@@ -0,0 +1,196 @@
+"""
+Версионированные миграции схемы БД
+
+Каждая миграция - файл migrations/NNNN_описание.sql или NNNN_описание.py
+(модуль с функцией upgrade(cursor) для шагов, которые не выразить одним
+SQL-скриптом). Миграции применяются по
+возрастанию номера, каждая в своей транзакции, номер применённой записывается
+в таблицу schema_version. Бот при запуске только сверяет версию схемы
+(check_schema_version), DDL во время работы не выполняется.
+
+    python migrate.py status          # текущая версия и список миграций
+    python migrate.py apply [--to N]  # применить недостающие
+"""
+import argparse
+import importlib.util
+import logging
+import os
+import re
+import sys
+from typing import Dict, List
+
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+_FILE_RE = re.compile(r"^(\d+)_(\w+)\.(sql|py)$")
+
+# Ключ pg_advisory_xact_lock: несколько процессов не применяют миграции одновременно
+_LOCK_KEY = 0x6D696772
+
+
+class SchemaVersionError(RuntimeError):
+    """Схема БД старее, чем требует код"""
+
+
+def list_migrations() -> List[Dict]:
+    """Миграции из MIGRATIONS_DIR, отсортированные по номеру"""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = _FILE_RE.match(filename)
+        if match:
+            migrations.append({
+                'version': int(match.group(1)),
+                'name': match.group(2),
+                'path': os.path.join(MIGRATIONS_DIR, filename)
+            })
+    migrations.sort(key=lambda m: m['version'])
+
+    versions = [m['version'] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration numbers in {MIGRATIONS_DIR}")
+    return migrations
+
+
+def _run_migration(cursor, migration: Dict):
+    """Выполнить миграцию в транзакции cursor"""
+    if migration['path'].endswith(".py"):
+        spec = importlib.util.spec_from_file_location(
+            f"migration_{migration['version']:04d}", migration['path']
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.upgrade(cursor)
+        return
+
+    with open(migration['path'], encoding="utf-8") as f:
+        cursor.execute(f.read())
+
+
+def latest_version() -> int:
+    """Версия схемы, которую ожидает код"""
+    migrations = list_migrations()
+    return migrations[-1]['version'] if migrations else 0
+
+
+def _ensure_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def get_applied(db=None) -> Dict[int, Dict]:
+    """Применённые миграции: {version: {'name', 'applied_at'}}"""
+    db = db or get_database()
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+        if not cursor.fetchone()[0]:
+            return {}
+        cursor.execute("SELECT version, name, applied_at FROM schema_version")
+        return {
+            version: {'name': name, 'applied_at': applied_at}
+            for version, name, applied_at in cursor.fetchall()
+        }
+    finally:
+        conn.rollback()
+        cursor.close()
+        db.return_connection(conn)
+
+
+def current_version(db=None) -> int:
+    """Последняя применённая миграция (0 - пустая база)"""
+    applied = get_applied(db)
+    return max(applied) if applied else 0
+
+
+def check_schema_version(db=None) -> int:
+    """
+    Проверка при запуске бота: схема должна быть не старее кода
+
+    Один SELECT вместо DDL в каждом менеджере. Если миграции не применены,
+    выбрасывает SchemaVersionError с подсказкой.
+    """
+    current = current_version(db)
+    expected = latest_version()
+    if current < expected:
+        raise SchemaVersionError(
+            f"Database schema version {current} is older than {expected}. "
+            f"Run: python migrate.py apply"
+        )
+    logger.info(f"Database schema version {current}")
+    return current
+
+
+def apply_migrations(db=None, target: int = None) -> List[int]:
+    """Применить недостающие миграции (до target включительно). Возвращает их номера"""
+    db = db or get_database()
+    applied_now = []
+
+    for migration in list_migrations():
+        if target is not None and migration['version'] > target:
+            break
+
+        conn = db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (_LOCK_KEY,))
+            _ensure_version_table(cursor)
+            cursor.execute(
+                "SELECT 1 FROM schema_version WHERE version = %s", (migration['version'],)
+            )
+            if cursor.fetchone():
+                conn.rollback()
+                continue
+
+            _run_migration(cursor, migration)
+            cursor.execute(
+                "INSERT INTO schema_version (version, name) VALUES (%s, %s)",
+                (migration['version'], migration['name'])
+            )
+            conn.commit()
+            applied_now.append(migration['version'])
+            logger.info(f"Applied migration {migration['version']:04d}_{migration['name']}")
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Error applying migration {migration['version']:04d}_{migration['name']}: {e}")
+            raise
+        finally:
+            cursor.close()
+            db.return_connection(conn)
+
+    return applied_now
+
+
+def main():
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("status", "apply"))
+    parser.add_argument("--to", type=int, default=None, help="применить миграции до этого номера")
+    args = parser.parse_args()
+
+    db = get_database()
+    try:
+        if args.command == "apply":
+            applied_now = apply_migrations(db, args.to)
+            print(f"Применено миграций: {len(applied_now)}")
+
+        applied = get_applied(db)
+        for migration in list_migrations():
+            info = applied.get(migration['version'])
+            mark = f"applied {info['applied_at']:%Y-%m-%d %H:%M}" if info else "pending"
+            print(f"  {migration['version']:04d}_{migration['name']:<30} {mark}")
+        print(f"Версия схемы: {max(applied) if applied else 0} (код ожидает {latest_version()})")
+    finally:
+        db.close_all_connections()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,260 @@
+-- Исходная схема: таблицы, которые раньше создавали Database.init_database
+-- и _init_tables() менеджеров. IF NOT EXISTS - чтобы миграцию можно было
+-- применить к уже работающей базе.
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    username TEXT,
+    first_name TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS expenses (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    amount REAL NOT NULL,
+    category TEXT NOT NULL,
+    description TEXT,
+    date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS hidden_money (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    amount REAL NOT NULL,
+    reason TEXT
+);
+
+CREATE TABLE IF NOT EXISTS income (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    amount REAL NOT NULL,
+    source TEXT NOT NULL,
+    description TEXT,
+    date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_expenses_user_date
+ON expenses (user_id, date DESC);
+
+CREATE INDEX IF NOT EXISTS idx_income_user_date
+ON income (user_id, date DESC);
+
+CREATE TABLE IF NOT EXISTS budgets (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    category TEXT NOT NULL,
+    limit_amount REAL NOT NULL,
+    period TEXT DEFAULT 'monthly',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(user_id, category, period),
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS category_filters (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    category TEXT NOT NULL,
+    is_excluded INTEGER DEFAULT 0,
+    filter_type TEXT DEFAULT 'expense',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(user_id, category, filter_type),
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS subscriptions (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT UNIQUE NOT NULL,
+    is_premium INTEGER DEFAULT 0,
+    premium_until TIMESTAMP,
+    stars_paid INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_payment_at TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS payment_history (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    stars_amount INTEGER NOT NULL,
+    payment_charge_id TEXT,
+    telegram_payment_charge_id TEXT,
+    paid_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS group_expenses (
+    id SERIAL PRIMARY KEY,
+    group_id BIGINT NOT NULL,
+    user_id BIGINT NOT NULL,
+    user_name TEXT,
+    amount REAL NOT NULL,
+    category TEXT NOT NULL,
+    description TEXT,
+    date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS group_settings (
+    group_id BIGINT PRIMARY KEY,
+    is_enabled INTEGER DEFAULT 1,
+    allow_all_members INTEGER DEFAULT 1,
+    show_stats INTEGER DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS group_debts (
+    id SERIAL PRIMARY KEY,
+    group_id BIGINT NOT NULL,
+    debtor_id BIGINT NOT NULL,
+    debtor_name TEXT,
+    creditor_id BIGINT NOT NULL,
+    creditor_name TEXT,
+    amount REAL NOT NULL,
+    description TEXT,
+    is_settled INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- balance.py
+CREATE TABLE IF NOT EXISTS user_balance (
+    user_id BIGINT PRIMARY KEY,
+    balance REAL DEFAULT 0,
+    hidden_balance REAL DEFAULT 0,
+    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS hidden_transactions (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    amount REAL NOT NULL,
+    operation_type TEXT NOT NULL,
+    reason TEXT,
+    date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+-- notifications.py
+CREATE TABLE IF NOT EXISTS notification_settings (
+    user_id BIGINT PRIMARY KEY,
+    daily_summary INTEGER DEFAULT 1,
+    weekly_report INTEGER DEFAULT 1,
+    budget_alerts INTEGER DEFAULT 1,
+    large_expense_alert INTEGER DEFAULT 1,
+    large_expense_threshold REAL DEFAULT 5000,
+    regular_expense_reminders INTEGER DEFAULT 1,
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS regular_expenses (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    category TEXT NOT NULL,
+    amount REAL NOT NULL,
+    frequency TEXT NOT NULL,
+    last_reminder TIMESTAMP,
+    next_reminder TIMESTAMP,
+    description TEXT,
+    is_active INTEGER DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS notification_history (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    notification_type TEXT NOT NULL,
+    message TEXT,
+    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+-- goals.py
+CREATE TABLE IF NOT EXISTS financial_goals (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    goal_name TEXT NOT NULL,
+    target_amount REAL NOT NULL,
+    current_amount REAL DEFAULT 0,
+    deadline TIMESTAMP,
+    icon TEXT,
+    description TEXT,
+    is_completed INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS goal_contributions (
+    id SERIAL PRIMARY KEY,
+    goal_id INTEGER NOT NULL,
+    user_id BIGINT NOT NULL,
+    amount REAL NOT NULL,
+    note TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (goal_id) REFERENCES financial_goals (id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+-- tags.py
+CREATE TABLE IF NOT EXISTS tags (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    tag_name TEXT NOT NULL,
+    color TEXT DEFAULT '#3498db',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(user_id, tag_name),
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS expense_tags (
+    expense_id INTEGER NOT NULL,
+    tag_id INTEGER NOT NULL,
+    PRIMARY KEY (expense_id, tag_id),
+    FOREIGN KEY (expense_id) REFERENCES expenses (id) ON DELETE CASCADE,
+    FOREIGN KEY (tag_id) REFERENCES tags (id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS income_tags (
+    income_id INTEGER NOT NULL,
+    tag_id INTEGER NOT NULL,
+    PRIMARY KEY (income_id, tag_id),
+    FOREIGN KEY (income_id) REFERENCES income (id) ON DELETE CASCADE,
+    FOREIGN KEY (tag_id) REFERENCES tags (id) ON DELETE CASCADE
+);
+
+-- templates.py
+CREATE TABLE IF NOT EXISTS transaction_templates (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    template_name TEXT NOT NULL,
+    transaction_type TEXT NOT NULL,
+    amount REAL NOT NULL,
+    category TEXT NOT NULL,
+    description TEXT,
+    icon TEXT,
+    use_count INTEGER DEFAULT 0,
+    is_favorite INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_used TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+-- custom_categories.py
+CREATE TABLE IF NOT EXISTS custom_categories (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    category_name TEXT NOT NULL,
+    category_type TEXT NOT NULL,
+    icon TEXT,
+    is_favorite INTEGER DEFAULT 0,
+    use_count INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE(user_id, category_name, category_type),
+    FOREIGN KEY (user_id) REFERENCES users (user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_custom_categories_user
+ON custom_categories (user_id, category_type);
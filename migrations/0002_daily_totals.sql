@@ -0,0 +1,27 @@
+-- Дневные итоги расходов и доходов (см. Database._apply_rollup).
+-- Таблица пересобирается из expenses/income целиком, поэтому миграция
+-- корректна и для базы, где daily_totals уже были созданы при старте бота.
+
+CREATE TABLE IF NOT EXISTS daily_totals (
+    user_id BIGINT NOT NULL,
+    day DATE NOT NULL,
+    kind TEXT NOT NULL,
+    category TEXT NOT NULL,
+    total DOUBLE PRECISION NOT NULL DEFAULT 0,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, kind, day, category)
+);
+
+LOCK TABLE daily_totals IN SHARE ROW EXCLUSIVE MODE;
+
+DELETE FROM daily_totals;
+
+INSERT INTO daily_totals (user_id, day, kind, category, total, count)
+SELECT user_id, date::date, 'expense', category, SUM(amount::float8), COUNT(*)
+FROM expenses
+GROUP BY user_id, date::date, category;
+
+INSERT INTO daily_totals (user_id, day, kind, category, total, count)
+SELECT user_id, date::date, 'income', source, SUM(amount::float8), COUNT(*)
+FROM income
+GROUP BY user_id, date::date, source;
@@ -0,0 +1,24 @@
+"""
+Помесячное секционирование expenses и income по date (см. partitions.py)
+
+Пустые и небольшие таблицы (до PARTITION_OFFLINE_MAX_ROWS строк) секционируются
+прямо здесь. Большие нужно сначала перенести онлайн:
+    python partitions.py migrate
+после чего миграция только отметит версию.
+"""
+from partitions import OFFLINE_MAX_ROWS, PARTITIONED_TABLES, convert_offline, is_partitioned
+
+
+def upgrade(cursor):
+    for table in PARTITIONED_TABLES:
+        if is_partitioned(cursor, table):
+            continue
+        cursor.execute(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} LIMIT %s) AS t", (OFFLINE_MAX_ROWS + 1,)
+        )
+        if cursor.fetchone()[0] > OFFLINE_MAX_ROWS:
+            raise RuntimeError(
+                f"{table} has more than {OFFLINE_MAX_ROWS} rows: "
+                f"run `python partitions.py migrate` first, then apply migrations again"
+            )
+        convert_offline(cursor, table)
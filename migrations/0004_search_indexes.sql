@@ -0,0 +1,40 @@
+-- Индексы для поиска операций (Database.search_transactions).
+-- pg_trgm даёт поиск по подстроке (ILIKE) через GIN-индекс, btree_gin позволяет
+-- держать user_id в том же индексе, чтобы поиск одного пользователя не
+-- перебирал совпадения всех остальных. Выражение индекса должно совпадать
+-- с выражением в запросе.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+CREATE INDEX IF NOT EXISTS idx_expenses_search_trgm
+ON expenses USING gin (user_id, (category || ' ' || COALESCE(description, '')) gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_income_search_trgm
+ON income USING gin (user_id, (source || ' ' || COALESCE(description, '')) gin_trgm_ops);
+
+-- Словарь слов пользователя для поиска с опечатками: похожие слова ищутся
+-- в нём (сотни строк), а не сравнением с каждой операцией. Пополняется
+-- Database._add_search_terms при добавлении операций; слова удалённых
+-- операций остаются и просто не находят совпадений. Числа в словарь не
+-- попадают: опечатки в них не ищутся.
+CREATE TABLE IF NOT EXISTS search_terms (
+    user_id BIGINT NOT NULL,
+    term TEXT NOT NULL,
+    PRIMARY KEY (user_id, term)
+);
+
+CREATE INDEX IF NOT EXISTS idx_search_terms_trgm
+ON search_terms USING gin (user_id, term gin_trgm_ops);
+
+INSERT INTO search_terms (user_id, term)
+SELECT DISTINCT user_id, term
+FROM (
+    SELECT user_id, regexp_split_to_table(lower(category || ' ' || COALESCE(description, '')), '[^[:alnum:]]+') AS term
+    FROM expenses
+    UNION ALL
+    SELECT user_id, regexp_split_to_table(lower(source || ' ' || COALESCE(description, '')), '[^[:alnum:]]+')
+    FROM income
+) AS words
+WHERE length(term) >= 3 AND term !~ '^[0-9]+$'
+ON CONFLICT DO NOTHING;
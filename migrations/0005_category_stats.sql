@@ -0,0 +1,33 @@
+-- Бегущая статистика расходов по категориям (см. Database._apply_category_stats).
+-- count/mean/m2 - число трат, среднее и сумма квадратов отклонений (Велфорд):
+-- по ним проверка крупной траты при записи - одно чтение строки, без выборки
+-- операций. rate - скорость трат, руб./день, с экспоненциальным затуханием
+-- (постоянная времени 30 дней), приведённая к моменту rate_at.
+-- Таблица заполняется из expenses целиком, как daily_totals в 0002.
+
+CREATE TABLE IF NOT EXISTS category_stats (
+    user_id BIGINT NOT NULL,
+    category TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    mean DOUBLE PRECISION NOT NULL DEFAULT 0,
+    m2 DOUBLE PRECISION NOT NULL DEFAULT 0,
+    rate DOUBLE PRECISION NOT NULL DEFAULT 0,
+    rate_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, category)
+);
+
+LOCK TABLE category_stats IN SHARE ROW EXCLUSIVE MODE;
+
+DELETE FROM category_stats;
+
+INSERT INTO category_stats (user_id, category, count, mean, m2, rate, rate_at)
+SELECT user_id, category, COUNT(*), AVG(amount::float8),
+       COALESCE(VAR_POP(amount::float8) * COUNT(*), 0),
+       SUM(amount::float8 * exp(-LEAST(extract(epoch FROM last_at - date) / 86400 / 30, 700))) / 30,
+       last_at
+FROM (
+    SELECT user_id, category, amount, date,
+           MAX(date) OVER (PARTITION BY user_id, category) AS last_at
+    FROM expenses
+) AS e
+GROUP BY user_id, category, last_at;
@@ -0,0 +1,36 @@
+-- Счётчики пользователя за всё время (см. Database._apply_user_totals):
+-- число и сумма расходов и доходов, первая и последняя операция. По ним
+-- достижения, факты и приветствие /start читают одну строку вместо всей
+-- истории. Число категорий трат берётся из category_stats (строка на категорию).
+-- Таблица заполняется из expenses/income целиком, как daily_totals в 0002.
+
+CREATE TABLE IF NOT EXISTS user_totals (
+    user_id BIGINT PRIMARY KEY,
+    expenses_count INTEGER NOT NULL DEFAULT 0,
+    expenses_total DOUBLE PRECISION NOT NULL DEFAULT 0,
+    income_count INTEGER NOT NULL DEFAULT 0,
+    income_total DOUBLE PRECISION NOT NULL DEFAULT 0,
+    first_at TIMESTAMP,
+    last_at TIMESTAMP
+);
+
+LOCK TABLE user_totals IN SHARE ROW EXCLUSIVE MODE;
+
+DELETE FROM user_totals;
+
+INSERT INTO user_totals (user_id, expenses_count, expenses_total, income_count, income_total, first_at, last_at)
+SELECT user_id,
+       COALESCE(SUM(count) FILTER (WHERE kind = 'expense'), 0),
+       COALESCE(SUM(total) FILTER (WHERE kind = 'expense'), 0),
+       COALESCE(SUM(count) FILTER (WHERE kind = 'income'), 0),
+       COALESCE(SUM(total) FILTER (WHERE kind = 'income'), 0),
+       MIN(first_at), MAX(last_at)
+FROM (
+    SELECT user_id, 'expense' AS kind, COUNT(*) AS count, SUM(amount::float8) AS total,
+           MIN(date) AS first_at, MAX(date) AS last_at
+    FROM expenses GROUP BY user_id
+    UNION ALL
+    SELECT user_id, 'income', COUNT(*), SUM(amount::float8), MIN(date), MAX(date)
+    FROM income GROUP BY user_id
+) AS t
+GROUP BY user_id;
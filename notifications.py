@@ -4,74 +4,39 @@
 from psycopg2.extras import RealDictCursor
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
-from database import Database
+from database import ANOMALY_Z, get_database
+from periods import Period
+from async_db import AsyncProxy
 from utils import format_currency
+from cache import settings_cache
 
-db = Database()
+db = get_database()
+
+
+def large_expense_message(amount: float, threshold: float, typical: float = None) -> str:
+    """Текст предупреждения о крупной трате (typical - обычная трата категории)"""
+    if typical is not None:
+        reason = (
+            f"Сумма {format_currency(amount)} руб. намного больше обычных трат "
+            f"в этой категории (около {format_currency(typical)} руб.)"
+        )
+    else:
+        reason = f"Сумма {format_currency(amount)} руб. превышает порог в {format_currency(threshold)} руб."
+    return (
+        f"⚠️ <b>Крупная трата!</b>\n\n"
+        f"{reason}\n\n"
+        "💡 Это запланированная трата?"
+    )
 
 
 class NotificationManager:
     """Управление умными уведомлениями"""
     
-    def __init__(self):
-        self._init_tables()
-    
-    def _init_tables(self):
-        """Инициализация таблиц"""
-        conn = db.get_connection()
-        try:
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS notification_settings (
-                    user_id BIGINT PRIMARY KEY,
-                    daily_summary INTEGER DEFAULT 1,
-                    weekly_report INTEGER DEFAULT 1,
-                    budget_alerts INTEGER DEFAULT 1,
-                    large_expense_alert INTEGER DEFAULT 1,
-                    large_expense_threshold REAL DEFAULT 5000,
-                    regular_expense_reminders INTEGER DEFAULT 1,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS regular_expenses (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    category TEXT NOT NULL,
-                    amount REAL NOT NULL,
-                    frequency TEXT NOT NULL,
-                    last_reminder TIMESTAMP,
-                    next_reminder TIMESTAMP,
-                    description TEXT,
-                    is_active INTEGER DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS notification_history (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    notification_type TEXT NOT NULL,
-                    message TEXT,
-                    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            print(f"Error initializing notifications: {e}")
-        finally:
-            cursor.close()
-            db.return_connection(conn)
-    
     def get_settings(self, user_id: int) -> Dict:
-        """Получить настройки уведомлений"""
+        """Получить настройки уведомлений (кэшируются до изменения, см. cache.py)"""
+        return settings_cache.get_or_load(user_id, lambda: self._load_settings(user_id))
+    
+    def _load_settings(self, user_id: int) -> Dict:
         conn = db.get_connection()
         try:
             cursor = conn.cursor(cursor_factory=RealDictCursor)
@@ -83,7 +48,7 @@ class NotificationManager:
             row = cursor.fetchone()
             if not row:
                 self._create_default_settings(user_id)
-                return self.get_settings(user_id)
+                return self._load_settings(user_id)
             
             return dict(row)
         finally:
@@ -101,6 +66,8 @@ class NotificationManager:
                 ON CONFLICT (user_id) DO NOTHING
             """, (user_id,))
             conn.commit()
+            if cursor.rowcount:
+                settings_cache.invalidate(user_id)
         finally:
             cursor.close()
             db.return_connection(conn)
@@ -130,6 +97,7 @@ class NotificationManager:
             
             cursor.execute(query, values)
             conn.commit()
+            settings_cache.invalidate(user_id)
             return True
         except Exception as e:
             conn.rollback()
@@ -139,8 +107,15 @@ class NotificationManager:
             cursor.close()
             db.return_connection(conn)
     
-    def check_large_expense(self, user_id: int, amount: float) -> Optional[str]:
-        """Проверить, является ли трата крупной"""
+    def check_large_expense(self, user_id: int, amount: float,
+                            category: str = None) -> Optional[str]:
+        """
+        Проверить, является ли ещё не записанная трата крупной
+
+        С категорией трата сравнивается с её статистикой (category_stats, одна
+        строка по ключу): крупная - на ANOMALY_Z отклонений больше обычной.
+        Без категории или пока трат в ней мало - порог из настроек.
+        """
         settings = self.get_settings(user_id)
         
         if not settings['large_expense_alert']:
@@ -148,12 +123,16 @@ class NotificationManager:
         
         threshold = settings['large_expense_threshold']
         
+        if category is not None:
+            stats = db.get_category_stats(user_id, category).get(category)
+            score = db.anomaly_score(amount, stats['count'], stats['mean'], stats['m2']) if stats else None
+            if score is not None:
+                if score >= ANOMALY_Z:
+                    return large_expense_message(amount, threshold, stats['mean'])
+                return None
+        
         if amount >= threshold:
-            return (
-                f"⚠️ <b>Крупная трата!</b>\n\n"
-                f"Сумма {format_currency(amount)} руб. превышает порог в {format_currency(threshold)} руб.\n\n"
-                "💡 Это запланированная трата?"
-            )
+            return large_expense_message(amount, threshold)
         
         return None
     
@@ -292,7 +271,8 @@ class NotificationManager:
     
     def generate_daily_summary(self, user_id: int) -> str:
         """Сгенерировать ежедневную сводку"""
-        stats = db.get_statistics(user_id, 1)
+        # Календарный день, а не последние 24 часа
+        stats = db.get_summary(user_id, Period.calendar_day())
         
         message = "📊 <b>Сводка за сегодня</b>\n\n"
         
@@ -316,7 +296,7 @@ class NotificationManager:
     
     def generate_weekly_report(self, user_id: int) -> str:
         """Сгенерировать недельный отчёт"""
-        stats = db.get_statistics(user_id, 7)
+        stats = db.get_summary(user_id, 7)
         
         message = "📈 <b>Отчёт за неделю</b>\n\n"
         message += f"💸 Расходы: {format_currency(stats['total_expenses'])} руб.\n"
@@ -338,4 +318,5 @@ class NotificationManager:
         return message
 
 
-notification_manager = NotificationManager()
\ No newline at end of file
+notification_manager = NotificationManager()
+async_notification_manager = AsyncProxy(notification_manager)
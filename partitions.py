@@ -0,0 +1,465 @@
+"""
+Помесячное секционирование expenses и income по date
+
+Таблицы расходов и доходов секционированы декларативно (PARTITION BY RANGE
+(date)): одна секция на месяц (expenses_p2025_01, ...) плюс секция DEFAULT для
+дат, под которые секции ещё нет. Запросы с условием на date читают только
+нужные месяцы, старые месяцы можно отсоединить (detach), чтобы они не мешали
+вакууму и запросам за последние дни.
+
+    python partitions.py status
+    python partitions.py migrate [--table expenses] [--batch-size 10000]
+    python partitions.py ensure [--months-ahead 3]
+    python partitions.py detach --before 2024-01 [--table expenses]
+    python partitions.py drop-old
+
+migrate переносит существующую несекционированную таблицу онлайн: новая
+таблица заполняется пачками, параллельные записи зеркалируются триггером,
+а подмена имён делается одной короткой транзакцией. Небольшие таблицы
+(до PARTITION_OFFLINE_MAX_ROWS строк) переносит сама миграция 0003.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import re
+import sys
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+from psycopg2.extras import execute_values
+
+from database import get_database
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ('expenses', 'income')
+MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+OFFLINE_MAX_ROWS = int(os.getenv("PARTITION_OFFLINE_MAX_ROWS", "100000"))
+
+_maintenance_task: Optional[asyncio.Task] = None
+
+
+def _month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    """Имя секции месяца: expenses_p2025_01"""
+    return f"{table}_p{month:%Y_%m}"
+
+
+def _partition_month(table: str, name: str) -> Optional[date]:
+    match = re.fullmatch(rf"{table}_p(\d{{4}})_(\d{{2}})", name)
+    if not match:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def is_partitioned(cursor, table: str) -> bool:
+    cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))",
+        (table,)
+    )
+    return cursor.fetchone()[0]
+
+
+def _list_partition_names(cursor, parent: str) -> List[str]:
+    cursor.execute("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+        ORDER BY c.relname
+    """, (parent,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _create_month_partition(cursor, parent: str, table: str, month: date) -> bool:
+    """
+    Создать секцию месяца, если её нет
+
+    Строки этого месяца, уже попавшие в DEFAULT, переносятся в новую секцию
+    в той же транзакции (иначе PostgreSQL не даст создать секцию).
+    """
+    name = partition_name(table, month)
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+    if cursor.fetchone()[0]:
+        return False
+
+    month_from, month_to = month, _add_months(month, 1)
+    default = f"{table}_default"
+    moved = []
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (default,))
+    if cursor.fetchone()[0]:
+        cursor.execute(
+            f"DELETE FROM {default} WHERE date >= %s AND date < %s RETURNING *",
+            (month_from, month_to)
+        )
+        moved = cursor.fetchall()
+
+    cursor.execute(
+        f"CREATE TABLE {name} PARTITION OF {parent} FOR VALUES FROM (%s) TO (%s)",
+        (month_from, month_to)
+    )
+    if moved:
+        execute_values(cursor, f"INSERT INTO {parent} VALUES %s", moved)
+        logger.info(f"Moved {len(moved)} rows from {default} to {name}")
+    return True
+
+
+def _create_partitioned_table(cursor, table: str, new_name: str, first_month: date, months_ahead: int):
+    """Пустая секционированная копия table с секциями от first_month до текущего месяца + months_ahead"""
+    cursor.execute(f"CREATE TABLE {new_name} (LIKE {table} INCLUDING DEFAULTS) PARTITION BY RANGE (date)")
+    cursor.execute(f"ALTER TABLE {new_name} ALTER COLUMN date SET NOT NULL")
+    cursor.execute(f"ALTER TABLE {new_name} ADD PRIMARY KEY (id, date)")
+    cursor.execute(f"ALTER TABLE {new_name} ADD FOREIGN KEY (user_id) REFERENCES users (user_id)")
+    cursor.execute(f"CREATE INDEX ON {new_name} (user_id, date DESC)")
+    cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {new_name} DEFAULT")
+
+    last_month = _add_months(_month_start(datetime.now()), months_ahead)
+    month = min(first_month, last_month)
+    while month <= last_month:
+        _create_month_partition(cursor, new_name, table, month)
+        month = _add_months(month, 1)
+
+
+def _first_month(cursor, table: str) -> date:
+    cursor.execute(f"SELECT MIN(date) FROM {table}")
+    first = cursor.fetchone()[0]
+    return _month_start(first or datetime.now())
+
+
+def _check_no_null_dates(cursor, table: str):
+    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {table} WHERE date IS NULL)")
+    if cursor.fetchone()[0]:
+        raise RuntimeError(f"{table} has rows with NULL date; fix them before partitioning")
+
+
+def _swap_tables(cursor, table: str, new_name: str):
+    """
+    Подменить table секционированной new_name (в транзакции вызывающего)
+
+    Внешние ключи на table.id (expense_tags, income_tags) снимаются: ссылаться
+    на секционированную таблицу можно только по ключу, включающему date.
+    Связи удаляет сам Database при удалении операций.
+    """
+    cursor.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+    cursor.execute("""
+        SELECT conrelid::regclass::text, conname
+        FROM pg_constraint
+        WHERE contype = 'f' AND confrelid = to_regclass(%s)
+    """, (table,))
+    for referencing, constraint in cursor.fetchall():
+        cursor.execute(f'ALTER TABLE {referencing} DROP CONSTRAINT "{constraint}"')
+
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table,))
+    sequence = cursor.fetchone()[0]
+    cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned")
+    cursor.execute(f"ALTER TABLE {new_name} RENAME TO {table}")
+    if sequence:
+        cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+
+
+def convert_offline(cursor, table: str, months_ahead: int = MONTHS_AHEAD):
+    """
+    Секционировать таблицу одной транзакцией (для пустых и небольших таблиц)
+
+    Запись в таблицу заблокирована до конца транзакции вызывающего.
+    """
+    cursor.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+    _check_no_null_dates(cursor, table)
+    new_name = f"{table}_new"
+    _create_partitioned_table(cursor, table, new_name, _first_month(cursor, table), months_ahead)
+    cursor.execute(f"INSERT INTO {new_name} SELECT * FROM {table}")
+    _swap_tables(cursor, table, new_name)
+    cursor.execute(f"DROP TABLE {table}_unpartitioned")
+
+
+_MIRROR_FUNCTION = """
+    CREATE OR REPLACE FUNCTION partition_migration_mirror() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            EXECUTE format('DELETE FROM %I WHERE id = $1 AND date = $2', TG_TABLE_NAME || '_new')
+            USING OLD.id, OLD.date;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            EXECUTE format('INSERT INTO %I SELECT ($1).* ON CONFLICT DO NOTHING', TG_TABLE_NAME || '_new')
+            USING NEW;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+
+def migrate_online(table: str, batch_size: int = 10000, months_ahead: int = MONTHS_AHEAD, db=None):
+    """
+    Онлайн-перенос несекционированной таблицы
+
+    1. Создаётся {table}_new с секциями и триггер, зеркалирующий в неё все
+       INSERT/UPDATE/DELETE старой таблицы.
+    2. Существующие строки копируются пачками по id (каждая пачка - своя
+       транзакция, строки пачки блокируются FOR SHARE, чтобы параллельное
+       удаление не оставило копию).
+    3. Под короткой эксклюзивной блокировкой сверяются количество и сумма id,
+       таблицы меняются именами. Старая остаётся как {table}_unpartitioned
+       (удалить: drop-old).
+    """
+    db = db or get_database()
+    new_name = f"{table}_new"
+
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        if is_partitioned(cursor, table):
+            logger.info(f"{table} is already partitioned")
+            return
+        _check_no_null_dates(cursor, table)
+
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (new_name,))
+        if not cursor.fetchone()[0]:
+            _create_partitioned_table(cursor, table, new_name, _first_month(cursor, table), months_ahead)
+        cursor.execute(_MIRROR_FUNCTION)
+        cursor.execute(f"DROP TRIGGER IF EXISTS partition_migration_mirror ON {table}")
+        cursor.execute(f"""
+            CREATE TRIGGER partition_migration_mirror
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION partition_migration_mirror()
+        """)
+        conn.commit()
+        logger.info(f"{new_name} created, mirroring writes from {table}")
+
+        # После коммита триггера все новые строки зеркалируются, копируем то, что было до него
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+        max_id = cursor.fetchone()[0]
+        conn.commit()
+
+        last_id = 0
+        copied = 0
+        while last_id < max_id:
+            cursor.execute(f"""
+                SELECT MAX(id) FROM (
+                    SELECT id FROM {table} WHERE id > %s AND id <= %s ORDER BY id LIMIT %s
+                ) AS batch
+            """, (last_id, max_id, batch_size))
+            upper = cursor.fetchone()[0]
+            if upper is None:
+                break
+            cursor.execute(f"""
+                INSERT INTO {new_name}
+                SELECT * FROM {table} WHERE id > %s AND id <= %s FOR SHARE
+                ON CONFLICT DO NOTHING
+            """, (last_id, upper))
+            copied += cursor.rowcount
+            conn.commit()
+            last_id = upper
+            logger.info(f"{table}: copied up to id {last_id}/{max_id} ({copied} rows)")
+
+        cursor.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"SELECT COUNT(*), COALESCE(SUM(id), 0) FROM {table}")
+        old_check = cursor.fetchone()
+        cursor.execute(f"SELECT COUNT(*), COALESCE(SUM(id), 0) FROM {new_name}")
+        new_check = cursor.fetchone()
+        if old_check != new_check:
+            raise RuntimeError(
+                f"{table}: copy mismatch (rows, sum(id)) {old_check} != {new_check}; "
+                f"mirror trigger left in place, run migrate again"
+            )
+        cursor.execute(f"DROP TRIGGER partition_migration_mirror ON {table}")
+        _swap_tables(cursor, table, new_name)
+        conn.commit()
+        logger.info(f"{table} is now partitioned ({old_check[0]} rows); old table kept as {table}_unpartitioned")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        db.return_connection(conn)
+
+
+def ensure_partitions(months_ahead: int = MONTHS_AHEAD, db=None) -> List[str]:
+    """
+    Создать недостающие секции с текущего месяца на months_ahead вперёд
+
+    Месяцы, строки которых лежат в DEFAULT (операции задним числом, массовый
+    импорт истории), тоже получают свои секции, и строки переезжают туда.
+    """
+    db = db or get_database()
+    created = []
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        this_month = _month_start(datetime.now())
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(cursor, table):
+                continue
+            months = {_add_months(this_month, offset) for offset in range(months_ahead + 1)}
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (f"{table}_default",))
+            if cursor.fetchone()[0]:
+                cursor.execute(f"SELECT DISTINCT date_trunc('month', date) FROM {table}_default")
+                months.update(_month_start(row[0]) for row in cursor.fetchall())
+            for month in sorted(months):
+                if _create_month_partition(cursor, table, table, month):
+                    created.append(partition_name(table, month))
+        conn.commit()
+        if created:
+            logger.info(f"Created partitions: {', '.join(created)}")
+        return created
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error creating partitions: {e}")
+        raise
+    finally:
+        cursor.close()
+        db.return_connection(conn)
+
+
+def detach_partitions(before: date, tables=PARTITIONED_TABLES, db=None) -> List[str]:
+    """
+    Отсоединить секции месяцев раньше before
+
+    Секции остаются обычными таблицами (их можно выгрузить pg_dump и удалить
+    или подключить обратно через ATTACH PARTITION). Строки из них пропадают из
+    выборок операций, но остаются в дневных итогах daily_totals; rollups.py
+    rebuild/verify после detach их уже не учитывает.
+    """
+    db = db or get_database()
+    detached = []
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        for table in tables:
+            if not is_partitioned(cursor, table):
+                continue
+            for name in _list_partition_names(cursor, table):
+                month = _partition_month(table, name)
+                if month and month < before:
+                    cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+                    detached.append(name)
+        conn.commit()
+        return detached
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        db.return_connection(conn)
+
+
+def drop_old_tables(db=None) -> List[str]:
+    """Удалить {table}_unpartitioned, оставшиеся после migrate"""
+    db = db or get_database()
+    dropped = []
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        for table in PARTITIONED_TABLES:
+            name = f"{table}_unpartitioned"
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+            if cursor.fetchone()[0]:
+                cursor.execute(f"DROP TABLE {name}")
+                dropped.append(name)
+        conn.commit()
+        return dropped
+    finally:
+        cursor.close()
+        db.return_connection(conn)
+
+
+def get_status(db=None) -> Dict[str, List[Dict]]:
+    """Секции каждой таблицы с оценкой числа строк"""
+    db = db or get_database()
+    conn = db.get_connection()
+    try:
+        cursor = conn.cursor()
+        status = {}
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(cursor, table):
+                status[table] = []
+                continue
+            cursor.execute("""
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), GREATEST(c.reltuples, 0)::bigint
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = to_regclass(%s)
+                ORDER BY c.relname
+            """, (table,))
+            status[table] = [
+                {'name': name, 'bounds': bounds, 'rows': rows}
+                for name, bounds, rows in cursor.fetchall()
+            ]
+        return status
+    finally:
+        conn.rollback()
+        cursor.close()
+        db.return_connection(conn)
+
+
+async def partition_maintenance(interval_hours: float = 24):
+    """Фоновая задача бота: раз в interval_hours создаёт секции наперёд"""
+    from async_db import run_sync
+
+    while True:
+        try:
+            await run_sync(ensure_partitions)
+        except Exception as e:
+            logger.error(f"Partition maintenance failed: {e}")
+        await asyncio.sleep(interval_hours * 3600)
+
+
+def start_partition_maintenance():
+    """Запустить partition_maintenance в текущем event loop (один раз на процесс)"""
+    global _maintenance_task
+    if _maintenance_task is None or _maintenance_task.done():
+        _maintenance_task = asyncio.get_running_loop().create_task(partition_maintenance())
+    return _maintenance_task
+
+
+def main():
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("status", "migrate", "ensure", "detach", "drop-old"))
+    parser.add_argument("--table", choices=PARTITIONED_TABLES, default=None)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD)
+    parser.add_argument("--before", help="YYYY-MM: detach отсоединяет месяцы раньше этого")
+    args = parser.parse_args()
+    tables = (args.table,) if args.table else PARTITIONED_TABLES
+
+    db = get_database()
+    try:
+        if args.command == "migrate":
+            for table in tables:
+                migrate_online(table, args.batch_size, args.months_ahead, db)
+        elif args.command == "ensure":
+            print(f"Создано секций: {len(ensure_partitions(args.months_ahead, db))}")
+        elif args.command == "detach":
+            if not args.before:
+                parser.error("detach requires --before YYYY-MM")
+            before = datetime.strptime(args.before, "%Y-%m").date()
+            for name in detach_partitions(before, tables, db):
+                print(f"  отсоединена {name}")
+        elif args.command == "drop-old":
+            for name in drop_old_tables(db):
+                print(f"  удалена {name}")
+
+        for table, partitions in get_status(db).items():
+            if not partitions:
+                print(f"{table}: не секционирована")
+                continue
+            print(f"{table}: {len(partitions)} секций")
+            for part in partitions:
+                print(f"  {part['name']:<24} ~{part['rows']:>10} строк  {part['bounds']}")
+    finally:
+        db.close_all_connections()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""
+Периоды для статистики, бюджетов и аналитики
+
+Period - полуинтервал [date_from, date_to), None - граница не ограничена.
+Бывают скользящие (последние N дней до текущего момента), календарные (день,
+неделя с понедельника, месяц) и произвольные. Database, BudgetManager и
+аналитика принимают Period там, где раньше было days; число дней и None по-
+прежнему работают (Period.coerce).
+
+plan() - планировщик запроса: полные дни периода читаются из дневных итогов
+daily_totals, строки expenses/income - только для неполных крайних дней.
+"""
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple, Union
+
+MONTH_NAMES = [
+    "январь", "февраль", "март", "апрель", "май", "июнь",
+    "июль", "август", "сентябрь", "октябрь", "ноябрь", "декабрь"
+]
+
+
+def day_start(day: date) -> datetime:
+    """Полночь, с которой начинается день"""
+    return datetime.combine(day, datetime.min.time())
+
+
+def day_ceil(moment: datetime) -> date:
+    """Первый полный день, начинающийся не раньше moment"""
+    if moment == day_start(moment.date()):
+        return moment.date()
+    return moment.date() + timedelta(days=1)
+
+
+def days_label(days: int) -> str:
+    """"1 день", "3 дня", "30 дней\""""
+    if days % 10 == 1 and days % 100 != 11:
+        return f"{days} день"
+    if 2 <= days % 10 <= 4 and not 12 <= days % 100 <= 14:
+        return f"{days} дня"
+    return f"{days} дней"
+
+
+class Period:
+    """
+    Полуинтервал времени [date_from, date_to)
+
+    kind - 'day', 'week', 'month' для календарных периодов (от них зависит
+    previous()), 'rolling' для последних N дней, None для остальных.
+    label - подпись для сообщений и отчётов ("30 дней", "октябрь 2025").
+    """
+
+    def __init__(self, date_from: datetime = None, date_to: datetime = None,
+                 label: str = None, kind: str = None):
+        if date_from is not None and date_to is not None and date_from > date_to:
+            raise ValueError("date_from is after date_to")
+        self.date_from = date_from
+        self.date_to = date_to
+        self.kind = kind
+        self.label = label or self._default_label()
+
+    def _default_label(self) -> str:
+        if self.date_from is None and self.date_to is None:
+            return "все время"
+        if self.date_to is None:
+            return f"с {self.date_from:%d.%m.%Y}"
+        last = self.date_to - timedelta(microseconds=1)
+        if self.date_from is None:
+            return f"до {last:%d.%m.%Y}"
+        return f"{self.date_from:%d.%m.%Y} - {last:%d.%m.%Y}"
+
+    def __repr__(self) -> str:
+        return f"Period({self.date_from!r}, {self.date_to!r}, {self.label!r})"
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, Period)
+            and (self.date_from, self.date_to) == (other.date_from, other.date_to)
+        )
+
+    def __hash__(self) -> int:
+        return hash((self.date_from, self.date_to))
+
+    @classmethod
+    def all_time(cls) -> 'Period':
+        return cls(label="все время")
+
+    @classmethod
+    def rolling(cls, days: int, now: datetime = None) -> 'Period':
+        """Последние days дней до текущего момента (как прежний параметр days)"""
+        now = now or datetime.now()
+        return cls(now - timedelta(days=days), None, days_label(days), 'rolling')
+
+    @classmethod
+    def between(cls, date_from: datetime, date_to: datetime, label: str = None) -> 'Period':
+        return cls(date_from, date_to, label)
+
+    @classmethod
+    def calendar_day(cls, offset: int = 0, now: datetime = None) -> 'Period':
+        """Календарный день: 0 - сегодня, -1 - вчера"""
+        start = day_start((now or datetime.now()).date() + timedelta(days=offset))
+        label = {0: "сегодня", -1: "вчера"}.get(offset, f"{start:%d.%m.%Y}")
+        return cls(start, start + timedelta(days=1), label, 'day')
+
+    @classmethod
+    def calendar_week(cls, offset: int = 0, now: datetime = None) -> 'Period':
+        """Неделя с понедельника: 0 - текущая, -1 - прошлая"""
+        today = (now or datetime.now()).date()
+        start = day_start(today - timedelta(days=today.weekday()) + timedelta(weeks=offset))
+        label = {0: "эта неделя", -1: "прошлая неделя"}.get(offset, f"неделя с {start:%d.%m.%Y}")
+        return cls(start, start + timedelta(weeks=1), label, 'week')
+
+    @classmethod
+    def calendar_month(cls, offset: int = 0, now: datetime = None) -> 'Period':
+        """Календарный месяц: 0 - текущий, -1 - прошлый"""
+        now = now or datetime.now()
+        index = now.year * 12 + now.month - 1 + offset
+        start = datetime(index // 12, index % 12 + 1, 1)
+        end = datetime((index + 1) // 12, (index + 1) % 12 + 1, 1)
+        return cls(start, end, f"{MONTH_NAMES[start.month - 1]} {start.year}", 'month')
+
+    @classmethod
+    def coerce(cls, value: Union['Period', int, None], now: datetime = None) -> 'Period':
+        """Period из прежних значений: None - всё время, число - последние N дней"""
+        if isinstance(value, Period):
+            return value
+        if value is None:
+            return cls.all_time()
+        return cls.rolling(int(value), now)
+
+    @classmethod
+    def parse(cls, spec: str, now: datetime = None) -> 'Period':
+        """
+        Период из callback_data
+
+        "all", число дней, "today", "yesterday", "week", "prev_week", "month",
+        "prev_month" или "ГГГГ-ММ-ДД:ГГГГ-ММ-ДД" (конец включительно).
+        ValueError, если строку не разобрать.
+        """
+        named = {
+            'all': lambda: cls.all_time(),
+            'today': lambda: cls.calendar_day(0, now),
+            'yesterday': lambda: cls.calendar_day(-1, now),
+            'week': lambda: cls.calendar_week(0, now),
+            'prev_week': lambda: cls.calendar_week(-1, now),
+            'month': lambda: cls.calendar_month(0, now),
+            'prev_month': lambda: cls.calendar_month(-1, now),
+        }
+        if spec in named:
+            return named[spec]()
+        if ':' in spec:
+            first, last = (date.fromisoformat(part) for part in spec.split(':', 1))
+            return cls.between(day_start(first), day_start(last) + timedelta(days=1))
+        days = int(spec)
+        if days <= 0:
+            raise ValueError(f"bad period: {spec}")
+        return cls.rolling(days, now)
+
+    @classmethod
+    def for_budget(cls, period: str, now: datetime = None) -> 'Period':
+        """Текущий период бюджета ('daily', 'weekly', 'monthly'; остальное - как monthly)"""
+        if period == 'daily':
+            return cls.calendar_day(0, now)
+        if period == 'weekly':
+            return cls.calendar_week(0, now)
+        return cls.calendar_month(0, now)
+
+    def previous(self, now: datetime = None) -> 'Period':
+        """
+        Период для сравнения, непосредственно перед этим
+
+        Для календарного - предыдущий день/неделя/месяц; если текущий ещё
+        идёт, берётся столько же времени от начала предыдущего (октябрь по
+        17-е сравнивается с сентябрём по 17-е). Для остальных - отрезок той
+        же длины (у открытого периода длина считается до now).
+        """
+        if self.date_from is None:
+            raise ValueError("all-time period has no previous period")
+        now = now or datetime.now()
+        if self.kind in ('day', 'week', 'month'):
+            previous = {
+                'day': lambda: Period.calendar_day(-1, self.date_from),
+                'week': lambda: Period.calendar_week(-1, self.date_from),
+                'month': lambda: Period.calendar_month(-1, self.date_from),
+            }[self.kind]()
+            if self.date_to <= now:
+                return previous
+            elapsed = max(now - self.date_from, timedelta(0))
+            end = min(previous.date_from + elapsed, previous.date_to)
+            if end == previous.date_to:
+                return previous
+            if self.kind == 'day':
+                label = f"{previous.label} до {end:%H:%M}"
+            else:
+                last = end - timedelta(microseconds=1)
+                label = f"{previous.label} ({previous.date_from:%d.%m}-{last:%d.%m})"
+            return Period(previous.date_from, end, label, self.kind)
+        end = self.date_to or now
+        length = end - self.date_from
+        return Period(self.date_from - length, self.date_from, kind=self.kind)
+
+    def plan(self) -> Tuple[Optional[Tuple[Optional[date], Optional[date]]], List[Tuple[datetime, datetime]]]:
+        """
+        Разложить период на полные дни и неполные края
+
+        Returns:
+            (days, edges): days - дни [первый, после последнего) для daily_totals
+            (None в паре - без границы) или None, если полных дней нет;
+            edges - отрезки [from, to), которые досчитываются по строкам операций.
+        """
+        first_day = day_ceil(self.date_from) if self.date_from else None
+        last_day = self.date_to.date() if self.date_to else None
+
+        days = None
+        if not (first_day and last_day and first_day >= last_day):
+            days = (first_day, last_day)
+
+        edges = []
+        if first_day and last_day and first_day > last_day:
+            # Период целиком внутри одного неполного дня
+            edges.append((self.date_from, self.date_to))
+        else:
+            if self.date_from and self.date_from < day_start(first_day):
+                edges.append((self.date_from, day_start(first_day)))
+            if self.date_to and self.date_to > day_start(last_day):
+                edges.append((day_start(last_day), self.date_to))
+        return days, edges
@@ -0,0 +1,64 @@
+"""
+Обслуживание дневных итогов daily_totals, статистики категорий category_stats
+и счётчиков за всё время user_totals
+
+Все три таблицы обновляются в тех же транзакциях, что и добавление/удаление
+расходов и доходов. Команды ниже нужны для первичного заполнения, ремонта
+после ручных правок в БД и проверки:
+
+    python rollups.py rebuild [--user USER_ID]
+    python rollups.py verify [--user USER_ID]
+"""
+import argparse
+import sys
+
+from database import get_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("rebuild", "verify"))
+    parser.add_argument("--user", type=int, default=None, help="только для этого user_id")
+    args = parser.parse_args()
+
+    db = get_database()
+    try:
+        if args.command == "rebuild":
+            db.rebuild_rollups(args.user)
+            print("daily_totals, category_stats и user_totals пересобраны")
+
+        mismatches = db.verify_rollups(args.user)
+        for row in mismatches[:50]:
+            print(
+                f"user={row['user_id']} day={row['day']} {row['kind']} '{row['category']}': "
+                f"stored={row['stored_total']}/{row['stored_count']} "
+                f"actual={row['actual_total']}/{row['actual_count']}"
+            )
+        stats_mismatches = db.verify_category_stats(args.user)
+        for row in stats_mismatches[:50]:
+            print(
+                f"user={row['user_id']} category_stats '{row['category']}': "
+                f"stored={row['stored_count']}/{row['stored_mean']}/{row['stored_rate']} "
+                f"actual={row['actual_count']}/{row['actual_mean']}/{row['actual_rate']}"
+            )
+        totals_mismatches = db.verify_user_totals(args.user)
+        for row in totals_mismatches[:50]:
+            print(
+                f"user={row['user_id']} user_totals: "
+                f"stored={row['stored_expenses_count']}/{row['stored_income_count']} "
+                f"{row['stored_first_at']}..{row['stored_last_at']} "
+                f"actual={row['actual_expenses_count']}/{row['actual_income_count']} "
+                f"{row['actual_first_at']}..{row['actual_last_at']}"
+            )
+        total = len(mismatches) + len(stats_mismatches) + len(totals_mismatches)
+        if total:
+            print(f"Расхождений: {total}")
+            return 1
+        print("daily_totals, category_stats и user_totals совпадают с expenses/income")
+        return 0
+    finally:
+        db.close_all_connections()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,10 +3,20 @@
 """
 from psycopg2.extras import RealDictCursor
 from datetime import datetime, timedelta
-from typing import Optional, Dict
-from database import Database
+from typing import Optional, Dict, List
+import asyncio
+import logging
+import os
+from database import get_database
+from async_db import AsyncProxy
+from cache import subscription_cache, premium_cache
 
-db = Database()
+db = get_database()
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL = float(os.getenv("PREMIUM_SWEEP_INTERVAL", "600"))
+
+_sweeper_task = None
 
 
 class SubscriptionManager:
@@ -15,6 +25,41 @@ class SubscriptionManager:
     
     def get_subscription(self, user_id: int) -> Dict:
         """Получить информацию о подписке пользователя"""
+        # В кэше лежит строка таблицы, срок действия проверяется на каждый вызов;
+        # истёкшие подписки в БД снимает expire_premiums
+        row = subscription_cache.get_or_load(user_id, lambda: self._load_subscription(user_id))
+        
+        if not row:
+            return {
+                'user_id': user_id,
+                'is_premium': False,
+                'premium_until': None,
+                'stars_paid': 0,
+                'days_left': 0
+            }
+        
+        sub = row
+        
+        if sub['premium_until']:
+            premium_until = sub['premium_until']
+            if isinstance(premium_until, str):
+                premium_until = datetime.fromisoformat(premium_until)
+            now = datetime.now()
+            
+            if premium_until > now:
+                sub['is_premium'] = True
+                sub['days_left'] = (premium_until - now).days
+            else:
+                sub['is_premium'] = False
+                sub['days_left'] = 0
+        else:
+            sub['is_premium'] = False
+            sub['days_left'] = 0
+        
+        return sub
+    
+    def _load_subscription(self, user_id: int) -> Optional[Dict]:
+        """Строка подписки; если её нет - создать и вернуть None"""
         conn = db.get_connection()
         try:
             cursor = conn.cursor(cursor_factory=RealDictCursor)
@@ -28,42 +73,40 @@ class SubscriptionManager:
             
             if not row:
                 self._create_subscription(user_id)
-                return {
-                    'user_id': user_id,
-                    'is_premium': False,
-                    'premium_until': None,
-                    'stars_paid': 0,
-                    'days_left': 0
-                }
-            
-            sub = dict(row)
+                return None
             
-            if sub['premium_until']:
-                premium_until = sub['premium_until']
-                if isinstance(premium_until, str):
-                    premium_until = datetime.fromisoformat(premium_until)
-                now = datetime.now()
-                
-                if premium_until > now:
-                    sub['is_premium'] = True
-                    sub['days_left'] = (premium_until - now).days
-                else:
-                    sub['is_premium'] = False
-                    sub['days_left'] = 0
-                    self._deactivate_premium(user_id)
-            else:
-                sub['is_premium'] = False
-                sub['days_left'] = 0
-            
-            return sub
+            return dict(row)
         finally:
             cursor.close()
             db.return_connection(conn)
     
     def is_premium(self, user_id: int) -> bool:
-        """Проверить, есть ли у пользователя Premium"""
-        sub = self.get_subscription(user_id)
-        return sub['is_premium']
+        """Проверить, есть ли у пользователя Premium (по карте сроков, без запроса к БД)"""
+        premium_until = premium_cache.get_or_load(user_id, lambda: self._load_premium_until(user_id))
+        return premium_until is not None and premium_until > datetime.now()
+    
+    def _load_premium_until(self, user_id: int) -> Optional[datetime]:
+        """Срок Premium для карты; строку подписки не создаёт"""
+        conn = db.get_connection()
+        try:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT premium_until FROM subscriptions
+                WHERE user_id = %s
+            ''', (user_id,))
+            
+            row = cursor.fetchone()
+            if not row or not row[0]:
+                return None
+            
+            premium_until = row[0]
+            if isinstance(premium_until, str):
+                premium_until = datetime.fromisoformat(premium_until)
+            return premium_until
+        finally:
+            cursor.close()
+            db.return_connection(conn)
     
     def _create_subscription(self, user_id: int):
         """Создать запись подписки"""
@@ -78,6 +121,8 @@ class SubscriptionManager:
             ''', (user_id,))
             
             conn.commit()
+            if cursor.rowcount:
+                subscription_cache.invalidate(user_id)
         except Exception as e:
             conn.rollback()
             print(f"Error creating subscription: {e}")
@@ -110,6 +155,10 @@ class SubscriptionManager:
             ''', (new_premium_until, user_id))
             
             conn.commit()
+            subscription_cache.invalidate(user_id)
+            # Другие процессы перечитают срок, этот знает его сразу
+            premium_cache.invalidate(user_id)
+            premium_cache.put(user_id, new_premium_until)
             return True
         except Exception as e:
             conn.rollback()
@@ -119,8 +168,8 @@ class SubscriptionManager:
             cursor.close()
             db.return_connection(conn)
     
-    def _deactivate_premium(self, user_id: int):
-        """Деактивировать Premium (внутренний метод)"""
+    def expire_premiums(self) -> List[int]:
+        """Снять Premium со всех истёкших подписок одним запросом (периодически)"""
         conn = db.get_connection()
         try:
             cursor = conn.cursor()
@@ -128,10 +177,19 @@ class SubscriptionManager:
             cursor.execute('''
                 UPDATE subscriptions
                 SET is_premium = 0
-                WHERE user_id = %s
-            ''', (user_id,))
+                WHERE is_premium = 1 AND premium_until <= %s
+                RETURNING user_id
+            ''', (datetime.now(),))
             
+            expired = [row[0] for row in cursor.fetchall()]
             conn.commit()
+            for user_id in expired:
+                subscription_cache.invalidate(user_id)
+            return expired
+        except Exception as e:
+            conn.rollback()
+            print(f"Error expiring premiums: {e}")
+            return []
         finally:
             cursor.close()
             db.return_connection(conn)
@@ -154,9 +212,15 @@ class SubscriptionManager:
                 UPDATE subscriptions
                 SET stars_paid = stars_paid + %s
                 WHERE user_id = %s
+                RETURNING premium_until
             ''', (stars_amount, user_id))
+            row = cursor.fetchone()
             
             conn.commit()
+            subscription_cache.invalidate(user_id)
+            if row:
+                premium_cache.invalidate(user_id)
+                premium_cache.put(user_id, row[0])
         except Exception as e:
             conn.rollback()
             print(f"Error adding payment: {e}")
@@ -184,4 +248,27 @@ class SubscriptionManager:
             db.return_connection(conn)
 
 
-subscription_manager = SubscriptionManager()
\ No newline at end of file
+subscription_manager = SubscriptionManager()
+async_subscription_manager = AsyncProxy(subscription_manager)
+
+
+async def premium_sweeper(interval_seconds: float = SWEEP_INTERVAL):
+    """Фоновая задача бота: раз в interval_seconds снимает истёкшие подписки"""
+    from async_db import run_sync
+
+    while True:
+        try:
+            expired = await run_sync(subscription_manager.expire_premiums)
+            if expired:
+                logger.info(f"Premium expired for {len(expired)} users")
+        except Exception as e:
+            logger.error(f"Premium sweep failed: {e}")
+        await asyncio.sleep(interval_seconds)
+
+
+def start_premium_sweeper():
+    """Запустить premium_sweeper в текущем event loop (один раз на процесс)"""
+    global _sweeper_task
+    if _sweeper_task is None or _sweeper_task.done():
+        _sweeper_task = asyncio.get_running_loop().create_task(premium_sweeper())
+    return _sweeper_task
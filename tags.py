@@ -3,63 +3,14 @@
 """
 from psycopg2.extras import RealDictCursor
 from typing import List, Dict, Optional
-from database import Database
+from database import get_database
 
-db = Database()
+db = get_database()
 
 
 class TagsManager:
     """Управление тегами для операций"""
     
-    def __init__(self):
-        self._init_tables()
-    
-    def _init_tables(self):
-        """Инициализация таблиц"""
-        conn = db.get_connection()
-        try:
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS tags (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    tag_name TEXT NOT NULL,
-                    color TEXT DEFAULT '#3498db',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user_id, tag_name),
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS expense_tags (
-                    expense_id INTEGER NOT NULL,
-                    tag_id INTEGER NOT NULL,
-                    PRIMARY KEY (expense_id, tag_id),
-                    FOREIGN KEY (expense_id) REFERENCES expenses (id) ON DELETE CASCADE,
-                    FOREIGN KEY (tag_id) REFERENCES tags (id) ON DELETE CASCADE
-                )
-            """)
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS income_tags (
-                    income_id INTEGER NOT NULL,
-                    tag_id INTEGER NOT NULL,
-                    PRIMARY KEY (income_id, tag_id),
-                    FOREIGN KEY (income_id) REFERENCES income (id) ON DELETE CASCADE,
-                    FOREIGN KEY (tag_id) REFERENCES tags (id) ON DELETE CASCADE
-                )
-            """)
-            
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            print(f"Error initializing tags tables: {e}")
-        finally:
-            cursor.close()
-            db.return_connection(conn)
-    
     def create_tag(self, user_id: int, tag_name: str, color: str = '#3498db') -> Optional[int]:
         """Создать новый тег"""
         conn = db.get_connection()
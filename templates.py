@@ -3,49 +3,14 @@
 """
 from psycopg2.extras import RealDictCursor
 from typing import List, Dict, Optional
-from database import Database
+from database import get_database
 
-db = Database()
+db = get_database()
 
 
 class TemplatesManager:
     """Управление шаблонами операций"""
     
-    def __init__(self):
-        self._init_tables()
-    
-    def _init_tables(self):
-        """Инициализация таблиц"""
-        conn = db.get_connection()
-        try:
-            cursor = conn.cursor()
-            
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS transaction_templates (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT NOT NULL,
-                    template_name TEXT NOT NULL,
-                    transaction_type TEXT NOT NULL,
-                    amount REAL NOT NULL,
-                    category TEXT NOT NULL,
-                    description TEXT,
-                    icon TEXT,
-                    use_count INTEGER DEFAULT 0,
-                    is_favorite INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_used TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id)
-                )
-            """)
-            
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            print(f"Error initializing templates tables: {e}")
-        finally:
-            cursor.close()
-            db.return_connection(conn)
-    
     def create_template(self, user_id: int, template_name: str, transaction_type: str,
                        amount: float, category: str, description: str = None, 
                        icon: str = None) -> bool:
@@ -0,0 +1,255 @@
+"""
+Временные ряды расходов пользователя на NumPy
+
+История расходов загружается один раз компактными массивами (время, сумма,
+номер категории), дальше всё считается векторно, без цикла по операциям:
+дневной ряд, скользящие средние и отклонения, необычные траты по z-оценке
+внутри категории и прогноз на конец календарного месяца.
+"""
+import calendar
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from database import ANOMALY_MIN_COUNT, ANOMALY_MIN_SPREAD, ANOMALY_Z, get_database
+
+db = get_database()
+
+# Сколько дней истории загружать для аналитики
+HISTORY_DAYS = int(os.getenv("TIMESERIES_HISTORY_DAYS", "180"))
+# Дневной темп для прогноза: последние RATE_DAYS полных дней, вес вдвое меньше каждые RATE_HALF_LIFE дней
+RATE_DAYS = 28
+RATE_HALF_LIFE = 7
+
+_EPOCH = datetime(1970, 1, 1)
+_DAY = 86400
+_COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+# Строка COPY BINARY из Database.copy_expense_history: число полей, затем (длина, значение)
+_COPY_ROW = np.dtype([
+    ('fields', '>i2'),
+    ('seconds_len', '>i4'), ('seconds', '>i8'),
+    ('amount_len', '>i4'), ('amount', '>f8'),
+    ('code_len', '>i4'), ('code', '>i4')
+])
+
+
+def to_seconds(moment: datetime) -> int:
+    """Секунды от 1970-01-01 по времени записи (как extract(epoch) у timestamp в БД)"""
+    return int((moment - _EPOCH).total_seconds())
+
+
+def from_seconds(seconds) -> datetime:
+    return _EPOCH + timedelta(seconds=int(seconds))
+
+
+def parse_copy_binary(data: bytes):
+    """Разобрать вывод Database.copy_expense_history в массивы (seconds, amounts, codes)"""
+    if not data.startswith(_COPY_SIGNATURE):
+        raise ValueError("not a COPY BINARY stream")
+    start = 19 + int.from_bytes(data[15:19], 'big')
+    # В конце - признак конца данных (-1, два байта)
+    size = len(data) - 2 - start
+    if size % _COPY_ROW.itemsize:
+        raise ValueError("unexpected COPY row layout")
+    rows = np.frombuffer(data, dtype=_COPY_ROW, count=size // _COPY_ROW.itemsize, offset=start)
+    if rows.size and (rows['fields'] != 3).any():
+        raise ValueError("unexpected COPY row layout")
+    return (
+        rows['seconds'].astype(np.int64),
+        rows['amount'].astype(np.float64),
+        rows['code'].astype(np.int32)
+    )
+
+
+def rolling_mean(series: np.ndarray, window: int) -> np.ndarray:
+    """Скользящее среднее по полным окнам (len(series) - window + 1 значений)"""
+    if len(series) < window:
+        return np.empty(0)
+    sums = np.cumsum(np.concatenate(([0.0], series)))
+    return (sums[window:] - sums[:-window]) / window
+
+
+def rolling_std(series: np.ndarray, window: int) -> np.ndarray:
+    """Скользящее стандартное отклонение по полным окнам"""
+    if len(series) < window:
+        return np.empty(0)
+    return sliding_window_view(series, window).std(axis=1)
+
+
+def _leave_one_out(values, count, mean, m2):
+    """
+    Среднее и отклонение группы без самого значения
+
+    count, mean, m2 - размер группы, среднее и сумма квадратов отклонений
+    (по группе каждого значения). Возвращает (среднее, отклонение, размер)
+    остальных значений группы.
+    """
+    others = count - 1
+    delta = values - mean
+    with np.errstate(divide='ignore', invalid='ignore'):
+        others_mean = np.where(others > 0, mean - delta / others, 0.0)
+        others_m2 = m2 - delta * delta * count / others
+        others_std = np.where(others > 1, np.sqrt(np.maximum(others_m2, 0.0) / (others - 1)), 0.0)
+    return others_mean, others_std, others
+
+
+class SpendingHistory:
+    """
+    Расходы пользователя массивами NumPy
+
+    seconds - время операции (to_seconds), amounts - суммы, codes - номера
+    категорий в categories; строки по возрастанию времени.
+    """
+
+    def __init__(self, seconds: np.ndarray, amounts: np.ndarray, codes: np.ndarray,
+                 categories: Sequence[str], now: datetime = None):
+        known = codes >= 0
+        if not known.all():
+            seconds, amounts, codes = seconds[known], amounts[known], codes[known]
+        self.seconds = seconds
+        self.amounts = amounts
+        self.codes = codes
+        self.categories = list(categories)
+        self.now = now or datetime.now()
+        self.days = seconds // _DAY
+        self.today = to_seconds(self.now) // _DAY
+
+    @classmethod
+    def load(cls, user_id: int, days: int = HISTORY_DAYS, now: datetime = None) -> 'SpendingHistory':
+        """Расходы пользователя за последние days дней (с полуночи)"""
+        now = now or datetime.now()
+        since = datetime.combine((now - timedelta(days=days)).date(), datetime.min.time())
+        categories, data = db.copy_expense_history(user_id, since)
+        return cls(*parse_copy_binary(data), categories, now)
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def category_mask(self, filters: Optional[Dict] = None) -> np.ndarray:
+        """Строки, проходящие фильтры категорий (формат CategoryFilter.get_all_filters)"""
+        if filters:
+            included = filters.get('expense_included')
+            excluded = filters.get('expense_excluded')
+            # Как Database._filter_condition: список включённых важнее исключённых
+            if included:
+                return np.isin(self.codes, self._codes_of(included))
+            if excluded:
+                return ~np.isin(self.codes, self._codes_of(excluded))
+        return np.ones(len(self), dtype=bool)
+
+    def _codes_of(self, names) -> np.ndarray:
+        index = {name: code for code, name in enumerate(self.categories)}
+        return np.array([index[name] for name in names if name in index], dtype=np.int32)
+
+    def daily_series(self, days: int, mask: np.ndarray = None) -> np.ndarray:
+        """Суммы расходов по дням за последние days дней, последний элемент - сегодня"""
+        first = self.today - days + 1
+        selected = (self.days >= first) & (self.days <= self.today)
+        if mask is not None:
+            selected &= mask
+        return np.bincount(
+            self.days[selected] - first, weights=self.amounts[selected], minlength=days
+        )[:days]
+
+    def anomalies(self, since: datetime, mask: np.ndarray = None,
+                  z: float = ANOMALY_Z, min_count: int = ANOMALY_MIN_COUNT,
+                  baseline: Dict[str, Dict] = None) -> List[Dict]:
+        """
+        Необычно крупные траты начиная с since, по убыванию z-оценки
+
+        Трата сравнивается со средним и отклонением остальных трат своей
+        категории (без неё самой, иначе крупная трата раздувает отклонение
+        сама); если их меньше min_count - с остальными тратами всех категорий.
+        Статистика категорий берётся из baseline (Database.get_category_stats,
+        вся история) или считается по загруженной истории.
+        """
+        seconds, amounts, codes = self.seconds, self.amounts, self.codes
+        if mask is not None:
+            seconds, amounts, codes = seconds[mask], amounts[mask], codes[mask]
+        candidates = np.flatnonzero(seconds >= to_seconds(since))
+        if not candidates.size:
+            return []
+
+        groups = len(self.categories)
+        if baseline is not None:
+            stored = [baseline.get(name, {}) for name in self.categories]
+            count = np.array([stats.get('count', 0) for stats in stored], dtype=np.float64)
+            mean = np.array([stats.get('mean', 0.0) for stats in stored])
+            m2 = np.array([stats.get('m2', 0.0) for stats in stored])
+        else:
+            count = np.bincount(codes, minlength=groups).astype(np.float64)
+            mean = np.bincount(codes, weights=amounts, minlength=groups) / np.maximum(count, 1)
+            m2 = np.bincount(codes, weights=(amounts - mean[codes]) ** 2, minlength=groups)
+
+        values = amounts[candidates]
+        groups_of = codes[candidates]
+        own_mean, own_std, own_others = _leave_one_out(
+            values, count[groups_of], mean[groups_of], m2[groups_of]
+        )
+        all_mean = amounts.mean()
+        all_mean, all_std, all_others = _leave_one_out(
+            values, float(len(amounts)), all_mean, ((amounts - all_mean) ** 2).sum()
+        )
+
+        own = own_others >= min_count
+        baseline = np.where(own, own_mean, all_mean)
+        spread = np.maximum(np.where(own, own_std, all_std), baseline * ANOMALY_MIN_SPREAD)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = (values - baseline) / spread
+        flagged = np.flatnonzero((own | (all_others >= min_count)) & (spread > 0) & (scores >= z))
+        flagged = flagged[np.argsort(-scores[flagged], kind='stable')]
+
+        return [
+            {
+                'amount': float(values[i]),
+                'category': self.categories[groups_of[i]],
+                'date': from_seconds(seconds[candidates[i]]),
+                'typical': float(baseline[i]),
+                'z': float(scores[i])
+            }
+            for i in flagged
+        ]
+
+    def month_end_projection(self, mask: np.ndarray = None) -> Dict:
+        """
+        Прогноз расходов на конец текущего календарного месяца
+
+        Потрачено с 1-го числа плюс оставшиеся дни месяца, умноженные на
+        дневной темп - взвешенное среднее дневных сумм за последние RATE_DAYS
+        полных дней (но не раньше первой операции в истории). Диапазон -
+        прогноз плюс-минус отклонение дневных сумм за оставшиеся дни.
+        """
+        days_in_month = calendar.monthrange(self.now.year, self.now.month)[1]
+        days_passed = self.now.day
+        days_remaining = days_in_month - days_passed
+
+        series = self.daily_series(max(RATE_DAYS + 1, days_passed), mask)
+        spent = float(series[-days_passed:].sum())
+
+        rate_days = min(RATE_DAYS, int(self.today - self.days[0])) if len(self) else 0
+        if rate_days > 0:
+            window = series[-rate_days - 1:-1]
+            weights = 0.5 ** (np.arange(rate_days)[::-1] / RATE_HALF_LIFE)
+            rate = float(np.average(window, weights=weights))
+            spread = float(np.sqrt(np.average((window - rate) ** 2, weights=weights)))
+        else:
+            rate = spent / days_passed
+            spread = 0.0
+
+        predicted = spent + rate * days_remaining
+        margin = spread * float(np.sqrt(days_remaining))
+        return {
+            'current_expenses': spent,
+            'predicted_total': predicted,
+            'predicted_remaining': predicted - spent,
+            'predicted_low': max(spent, predicted - margin),
+            'predicted_high': predicted + margin,
+            'daily_average': spent / days_passed,
+            'daily_rate': rate,
+            'days_passed': days_passed,
+            'days_remaining': days_remaining,
+            'days_in_month': days_in_month
+        }
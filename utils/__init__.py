@@ -1,4 +1,7 @@
 from .formatters import format_currency, format_date, parse_user_date
+from .pagination import encode_page_cursor, decode_page_cursor
 
-__all__ = ['format_currency', 'format_date', 'parse_user_date']
-
+__all__ = [
+    'format_currency', 'format_date', 'parse_user_date',
+    'encode_page_cursor', 'decode_page_cursor'
+]
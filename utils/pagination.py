@@ -0,0 +1,17 @@
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+# Ключ страницы помещается в callback_data (до 64 байт): дата до микросекунд и id
+_CURSOR_DATE_FORMAT = '%Y%m%d%H%M%S%f'
+
+
+def encode_page_cursor(row: Dict) -> str:
+    return f"{row['date'].strftime(_CURSOR_DATE_FORMAT)}_{row['id']}"
+
+
+def decode_page_cursor(value: str) -> Optional[Tuple[datetime, int]]:
+    try:
+        date_part, id_part = value.split('_')
+        return datetime.strptime(date_part, _CURSOR_DATE_FORMAT), int(id_part)
+    except ValueError:
+        return None